@@ -0,0 +1,267 @@
+"""
+Motor de agenda: detección de choques y búsqueda de horarios libres
+"""
+import bisect
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+import MySQLdb
+
+# Ninguna cita dura más que esto; acota la búsqueda hacia atrás de choques
+DURACION_MAXIMA = timedelta(hours=4)
+DURACION_MAXIMA_MINUTOS = DURACION_MAXIMA // timedelta(minutes=1)
+
+# Citas vigentes de varios doctores en una sola consulta
+QUERY_CITAS_DOCTORES = """
+    SELECT doctor_id, id, fecha_hora, COALESCE(duracion_minutos, %s)
+    FROM citas
+    WHERE doctor_id IN ({marcadores}) AND estado <> 'cancelada' AND fecha_hora >= %s
+"""
+
+# Lectura con bloqueo: en REPEATABLE READ un SELECT normal vería la foto
+# tomada en la primera lectura de la transacción, anterior al bloqueo del
+# doctor, y no las citas que otra petición confirmó mientras se esperaba
+QUERY_CHOQUE = """
+    SELECT id
+    FROM citas
+    WHERE doctor_id = %s AND estado <> 'cancelada'
+      AND fecha_hora >= %s AND fecha_hora < %s
+      AND fecha_hora + INTERVAL COALESCE(duracion_minutos, %s) MINUTE > %s
+    LIMIT 1
+    FOR UPDATE
+"""
+
+QUERY_INSERTAR_CITA = """
+    INSERT INTO citas
+    (paciente_id, doctor_id, fecha_hora, duracion_minutos, motivo, creada_por)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+class ConflictoAgenda(Exception):
+    """El horario pedido se cruza con otra cita del doctor"""
+
+    def __init__(self, cita_id):
+        super().__init__(f'El doctor ya tiene la cita {cita_id} en ese horario')
+        self.cita_id = cita_id
+
+
+class IntervalosDoctor:
+    """
+    Citas de un doctor como intervalos [inicio, fin) ordenados por inicio.
+    Lo comparten los hilos del proceso: las dos listas se modifican y se
+    recorren bajo el mismo lock.
+    """
+
+    def __init__(self):
+        self._inicios = []
+        self._citas = []
+        self.duracion_max = timedelta(0)
+        self._lock = threading.Lock()
+
+    def agregar(self, inicio, fin, cita_id):
+        with self._lock:
+            i = bisect.bisect_right(self._inicios, inicio)
+            self._inicios.insert(i, inicio)
+            self._citas.insert(i, (inicio, fin, cita_id))
+            self.duracion_max = max(self.duracion_max, fin - inicio)
+
+    def quitar(self, cita_id):
+        with self._lock:
+            for i, (_, _, id_) in enumerate(self._citas):
+                if id_ == cita_id:
+                    del self._inicios[i]
+                    del self._citas[i]
+                    return
+
+    def choque(self, inicio, fin):
+        """
+        Devuelve la cita (inicio, fin, id) que se cruza con [inicio, fin)
+        o None. La búsqueda binaria ubica la última cita que empieza antes
+        de `fin`; solo se revisan hacia atrás las que aún podrían seguir en
+        curso según la duración máxima registrada.
+        """
+        with self._lock:
+            i = bisect.bisect_left(self._inicios, fin) - 1
+            while i >= 0 and self._inicios[i] > inicio - self.duracion_max:
+                if self._citas[i][1] > inicio:
+                    return self._citas[i]
+                i -= 1
+        return None
+
+
+class Agenda:
+    """
+    Índice de intervalos por doctor, cargado bajo demanda desde citas y
+    renovado tras `ttl` segundos. La jornada define los horarios en los
+    que se ofrecen turnos libres; `reloj` da la hora actual de la clínica.
+    """
+
+    def __init__(self, reloj, hora_inicio=8, hora_fin=18, dias_laborales=(0, 1, 2, 3, 4),
+                 duracion=30, horizonte_dias=60, ttl=300):
+        self.reloj = reloj
+        self.hora_inicio = hora_inicio
+        self.hora_fin = hora_fin
+        self.dias_laborales = set(dias_laborales)
+        self.duracion = duracion
+        self.horizonte_dias = horizonte_dias
+        self.ttl = ttl
+        self._doctores = {}
+        self._lock = threading.Lock()
+
+    # --- índice ---
+
+    def intervalos(self, doctor_id, obtener_conexion):
+        return self.intervalos_varios([doctor_id], obtener_conexion)[doctor_id]
+
+    def intervalos_varios(self, doctor_ids, obtener_conexion):
+        """
+        {doctor_id: IntervalosDoctor}; los que falten o hayan vencido se
+        cargan juntos con una sola consulta.
+        """
+        ahora = time.monotonic()
+        indices, faltan = {}, []
+        for doctor_id in dict.fromkeys(doctor_ids):
+            entrada = self._doctores.get(doctor_id)
+            if entrada and ahora - entrada[1] < self.ttl:
+                indices[doctor_id] = entrada[0]
+            else:
+                faltan.append(doctor_id)
+        if not faltan:
+            return indices
+
+        cursor = obtener_conexion().cursor()
+        cursor.execute(QUERY_CITAS_DOCTORES.format(marcadores=', '.join(['%s'] * len(faltan))),
+                       (self.duracion, *faltan, self.reloj() - DURACION_MAXIMA))
+        filas = cursor.fetchall()
+        cursor.close()
+
+        nuevos = {doctor_id: IntervalosDoctor() for doctor_id in faltan}
+        for doctor_id, cita_id, inicio, minutos in filas:
+            nuevos[doctor_id].agregar(inicio, inicio + timedelta(minutes=minutos), cita_id)
+        cargado_en = time.monotonic()
+        with self._lock:
+            for doctor_id, indice in nuevos.items():
+                self._doctores[doctor_id] = (indice, cargado_en)
+        indices.update(nuevos)
+        return indices
+
+    def invalidar(self, doctor_id=None):
+        """Olvida el índice de un doctor (o de todos) tras cambios externos"""
+        with self._lock:
+            if doctor_id is None:
+                self._doctores.clear()
+            else:
+                self._doctores.pop(doctor_id, None)
+
+    # --- reservas ---
+
+    def reservar(self, conexion, paciente_id, doctor_id, inicio, motivo, creada_por,
+                 duracion=None):
+        """
+        Agenda la cita si no hay choque. La revisión en memoria descarta
+        rápido los choques conocidos; dentro de la transacción se bloquea
+        la fila del doctor y se confirma contra la tabla citas, por si otro
+        proceso reservó después de cargar el índice. Devuelve el id de la cita.
+        Lanza ValueError si el inicio ya pasó, si la duración no está entre 1
+        y DURACION_MAXIMA o si el doctor o el paciente no existen.
+        """
+        duracion = self.duracion if duracion is None else duracion
+        if inicio < self.reloj():
+            raise ValueError('No se puede agendar una cita en el pasado')
+        if not 1 <= duracion <= DURACION_MAXIMA_MINUTOS:
+            raise ValueError(f'La duración debe estar entre 1 y {DURACION_MAXIMA_MINUTOS} minutos')
+        fin = inicio + timedelta(minutes=duracion)
+        indice = self.intervalos(doctor_id, lambda: conexion)
+
+        choque = indice.choque(inicio, fin)
+        if choque:
+            raise ConflictoAgenda(choque[2])
+
+        cursor = conexion.cursor()
+        try:
+            cursor.execute("SELECT id FROM doctores WHERE id = %s FOR UPDATE", (doctor_id,))
+            if cursor.fetchone() is None:
+                raise ValueError(f'El doctor {doctor_id} no existe')
+            cursor.execute(QUERY_CHOQUE, (doctor_id, inicio - DURACION_MAXIMA, fin,
+                                          self.duracion, inicio))
+            fila = cursor.fetchone()
+            if fila:
+                raise ConflictoAgenda(fila[0])
+
+            try:
+                cursor.execute(QUERY_INSERTAR_CITA, (paciente_id, doctor_id, inicio, duracion,
+                                                     motivo, creada_por))
+            except MySQLdb.IntegrityError:
+                # Llave foránea: el paciente no existe
+                raise ValueError(f'El paciente {paciente_id} no existe') from None
+            cita_id = cursor.lastrowid
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        indice.agregar(inicio, fin, cita_id)
+        return cita_id
+
+    # --- horarios libres ---
+
+    def _apertura(self, dia):
+        return datetime.combine(dia, datetime.min.time()).replace(hour=self.hora_inicio)
+
+    def _cierre(self, dia):
+        return datetime.combine(dia, datetime.min.time()).replace(hour=self.hora_fin)
+
+    def _alinear(self, t):
+        """Primer inicio de turno válido en o después de t"""
+        paso = timedelta(minutes=self.duracion)
+        while True:
+            dia = t.date()
+            if dia.weekday() in self.dias_laborales and t < self._cierre(dia):
+                apertura = self._apertura(dia)
+                if t <= apertura:
+                    return apertura
+                pasos = -((apertura - t) // paso)  # redondeo hacia arriba
+                return apertura + pasos * paso
+            t = self._apertura(dia + timedelta(days=1))
+
+    def _libres_doctor(self, indice, desde, hasta):
+        duracion = timedelta(minutes=self.duracion)
+        t = self._alinear(desde)
+        while t < hasta:
+            fin = t + duracion
+            if fin > self._cierre(t.date()):
+                t = self._alinear(self._apertura(t.date() + timedelta(days=1)))
+                continue
+            choque = indice.choque(t, fin)
+            if choque is None:
+                yield t
+                t = fin
+            else:
+                # Saltar directamente al final de la cita que estorba
+                t = self._alinear(choque[1])
+
+    def _turnos_doctor(self, doctor_id, indice, desde, hasta):
+        for inicio in self._libres_doctor(indice, desde, hasta):
+            yield inicio, doctor_id
+
+    def libres(self, doctor_ids, obtener_conexion, desde=None, cantidad=10):
+        """
+        Próximos `cantidad` turnos libres entre los doctores indicados,
+        ordenados por hora. Devuelve [(inicio, doctor_id), ...].
+        """
+        desde = max(desde or self.reloj(), self.reloj())
+        hasta = desde + timedelta(days=self.horizonte_dias)
+        indices = self.intervalos_varios(doctor_ids, obtener_conexion)
+        generadores = [self._turnos_doctor(doctor_id, indice, desde, hasta)
+                       for doctor_id, indice in indices.items()]
+        resultado = []
+        for turno in heapq.merge(*generadores):
+            resultado.append(turno)
+            if len(resultado) >= cantidad:
+                break
+        return resultado
@@ -0,0 +1,228 @@
+"""
+Citas del día compartidas entre las pantallas abiertas y feed de cambios
+"""
+import threading
+import time
+from collections import deque
+from datetime import date
+
+# Hora de la BD con la que se marca cada revisión
+QUERY_AHORA = "SELECT UNIX_TIMESTAMP(NOW(6))"
+
+# Segundos que cada revisión se solapa con la anterior: cubre las
+# transacciones que confirman un poco después de escribir actualizado_en
+MARGEN = 10
+
+
+def marca_texto(dia, marca):
+    """Marca que ven las pantallas (data-version, id de cada evento): día y hora de la BD"""
+    return f'{dia.isoformat()}_{marca:.6f}'
+
+
+def leer_marca(texto):
+    """(día, marca) de marca_texto(); ValueError si no tiene esa forma"""
+    dia, _, marca = (texto or '').partition('_')
+    return date.fromisoformat(dia), float(marca)
+
+
+class AgendaDelDia:
+    """
+    Foto en memoria de las citas de hoy: una consulta por proceso y no una
+    por pantalla. Cada `intervalo` segundos un solo hilo trae de la BD las
+    citas con actualizado_en posterior a la revisión anterior (menos
+    MARGEN), así lo escrito por cualquier proceso llega a todas las
+    pantallas; cada `ttl` se relee el día completo para notar borrados.
+
+    Las marcas que reciben las pantallas son horas de la BD, no contadores
+    del proceso: al reconectar a otro worker, este envía lo cambiado desde
+    esa hora, o el día completo si su foto empezó después. Dentro de una
+    conexión, `version` (local) despierta a quien espera cambios.
+    crear_cita llama a publicar() para no esperar a la próxima revisión.
+    """
+
+    def __init__(self, reloj, query_dia, query_cambios, ventana,
+                 ttl=60, intervalo=5, historial=1000):
+        self.reloj = reloj
+        self.query_dia = query_dia
+        self.query_cambios = query_cambios
+        self.ventana = ventana
+        self.ttl = ttl
+        self.intervalo = intervalo
+        self.dia = None
+        self.columnas = ()
+        self.version = 0
+        self.marca = None
+        self._filas = {}
+        self._cargada = 0.0
+        self._revisada = 0.0
+        # (versión, marca, cita_id) de los últimos cambios; antes de _base / _base_marca
+        # no se sabe qué cambió y hay que enviar el día completo
+        self._cambios = deque(maxlen=historial)
+        self._base = 0
+        self._base_marca = None
+        # Versión con la que empezó el día: quien espera desde antes debe recargar
+        self._inicio_dia = 0
+        self._cond = threading.Condition()
+        self._carga = threading.Lock()
+
+    def vigente(self):
+        return (self.dia == self.reloj().date() and
+                time.monotonic() - self._revisada < self.intervalo)
+
+    def _al_dia(self, marca_minima):
+        return self.vigente() and (marca_minima is None or self.marca >= marca_minima)
+
+    def cargar(self, conexion):
+        """Lee las citas del día completas y publica las diferencias con la foto anterior"""
+        with self._carga:
+            self._cargar(conexion)
+
+    def revisar(self, obtener_conexion, devolver=None, marca_minima=None):
+        """
+        Pone la foto al día si pasó `intervalo` (o si su marca es anterior a
+        `marca_minima`): relee el día completo si cambió la fecha o venció
+        `ttl`, y si no solo las citas modificadas. Un solo hilo revisa; los
+        demás siguen con la foto actual salvo que no sirva (otro día) o
+        pidan `marca_minima`. `devolver` recibe la conexión al terminar.
+        """
+        if self._al_dia(marca_minima):
+            return
+        bloquear = self.dia != self.reloj().date() or marca_minima is not None
+        if not self._carga.acquire(blocking=bloquear):
+            return
+        try:
+            if self._al_dia(marca_minima):
+                return
+            conexion = obtener_conexion()
+            try:
+                if (self.dia != self.reloj().date()
+                        or time.monotonic() - self._cargada >= self.ttl):
+                    self._cargar(conexion)
+                else:
+                    self._traer_cambios(conexion)
+            finally:
+                if devolver:
+                    devolver(conexion)
+        finally:
+            self._carga.release()
+
+    def _ahora_bd(self, cursor):
+        cursor.execute(QUERY_AHORA)
+        return float(cursor.fetchone()[0])
+
+    def _cargar(self, conexion):
+        """Se llama con _carga tomado"""
+        dia = self.reloj().date()
+        cursor = conexion.cursor()
+        marca = self._ahora_bd(cursor)
+        cursor.execute(self.query_dia, self.ventana(dia))
+        columnas = tuple(col[0] for col in cursor.description)
+        filas = {fila[0]: fila for fila in cursor.fetchall()}
+        cursor.close()
+
+        with self._cond:
+            if dia != self.dia:
+                # Día nuevo: las pantallas con la foto de ayer deben recargarse
+                self.version += 1
+                self._base = self._inicio_dia = self.version
+                self._base_marca = marca
+                self._cambios.clear()
+            else:
+                for cita_id in filas.keys() | self._filas.keys():
+                    if filas.get(cita_id) != self._filas.get(cita_id):
+                        self._registrar(cita_id, marca)
+            self.dia = dia
+            self.columnas = columnas
+            self.marca = marca
+            self._filas = filas
+            self._cargada = self._revisada = time.monotonic()
+            self._cond.notify_all()
+
+    def _traer_cambios(self, conexion):
+        """Se llama con _carga tomado"""
+        cursor = conexion.cursor()
+        marca = self._ahora_bd(cursor)
+        cursor.execute(self.query_cambios, (self.marca - MARGEN,))
+        filas = cursor.fetchall()
+        cursor.close()
+
+        with self._cond:
+            # Lo encontrado en esta revisión lleva su marca
+            self.marca = marca
+            for fila in filas:
+                self._aplicar(fila[0], fila)
+            self._revisada = time.monotonic()
+            self._cond.notify_all()
+
+    def _aplicar(self, cita_id, fila):
+        """Se llama con _cond tomado. Una cita que ya no es de hoy sale de la foto"""
+        if fila[3].date() != self.dia:
+            if self._filas.pop(cita_id, None) is not None:
+                self._registrar(cita_id, self.marca)
+        elif self._filas.get(cita_id) != fila:
+            self._filas[cita_id] = fila
+            self._registrar(cita_id, self.marca)
+
+    def filas(self, obtener_conexion, doctor_id=None):
+        """(marca_texto, citas de hoy ordenadas por hora), opcionalmente de un doctor"""
+        self.revisar(obtener_conexion)
+        with self._cond:
+            filas = [f for f in self._filas.values() if doctor_id is None or f[2] == doctor_id]
+            marca = marca_texto(self.dia, self.marca)
+        return marca, sorted(filas, key=lambda f: (f[3], f[0]))
+
+    def ids_doctor(self, doctor_id):
+        """Ids de las citas del doctor en la foto actual, sin revisar la BD"""
+        with self._cond:
+            return {cita_id for cita_id, fila in self._filas.items() if fila[2] == doctor_id}
+
+    def publicar(self, conexion, fecha_hora):
+        """
+        Tras escribir una cita de hoy revisa los cambios en el momento, sin
+        esperar al intervalo: así la cita queda con la marca de esa revisión
+        como cualquier otra.
+        """
+        if fecha_hora.date() != self.dia:
+            return
+        with self._carga:
+            self._traer_cambios(conexion)
+
+    def desde_marca(self, dia, marca):
+        """
+        Lo que una pantalla con la marca (dia, marca) no ha visto:
+        (versión, filas, ids eliminados, completa). `completa` indica que
+        filas es el día entero y la pantalla debe descartar las suyas;
+        None si la pantalla es de otro día y debe recargarse.
+        """
+        with self._cond:
+            if dia != self.dia:
+                return None
+            if marca - MARGEN < self._base_marca or marca > self.marca:
+                return self.version, list(self._filas.values()), [], True
+            ids = {cita_id for _, cambio, cita_id in self._cambios if cambio > marca - MARGEN}
+            filas = [self._filas[i] for i in ids if i in self._filas]
+            eliminados = [i for i in ids if i not in self._filas]
+            return self.version, filas, eliminados, False
+
+    def esperar(self, desde, timeout):
+        """
+        Bloquea hasta que haya cambios posteriores a la versión local
+        `desde` o pase `timeout`. Devuelve lo mismo que desde_marca().
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > desde, timeout)
+            if desde < self._inicio_dia:
+                return None
+            if desde < self._base:
+                return self.version, list(self._filas.values()), [], True
+            ids = {cita_id for version, _, cita_id in self._cambios if version > desde}
+            filas = [self._filas[i] for i in ids if i in self._filas]
+            eliminados = [i for i in ids if i not in self._filas]
+            return self.version, filas, eliminados, False
+
+    def _registrar(self, cita_id, marca):
+        """Se llama con _cond tomado"""
+        self.version += 1
+        if len(self._cambios) == self._cambios.maxlen:
+            self._base, self._base_marca = self._cambios[0][:2]
+        self._cambios.append((self.version, marca, cita_id))
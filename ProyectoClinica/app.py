@@ -1,19 +1,71 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from flask_mysqldb import MySQL
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, current_app, render_template, request, redirect, url_for, session, flash, jsonify, g, abort, Response, stream_with_context
 from functools import wraps
-from datetime import datetime
+import json
+import threading
+import time
+from datetime import datetime, date
 
-app = Flask(__name__)
-app.secret_key = 'tu_clave_secreta_super_segura_aqui_2024'  # Cambia esto por algo más seguro
+from database.conexion import MySQLPool
+from permisos import CachePermisos
+from identidad import Identidad, RegistroCambios, QUERY_IDENTIDAD, guardar_en_sesion
+from fechas import ahora, ventana_dia, ventana_rango, filtro_ventana
+from paginacion import consultar_pagina
+import indice_nombres
+from agenda import Agenda, ConflictoAgenda
+from agenda_en_vivo import AgendaDelDia, leer_marca, marca_texto
+import estadisticas as est
+from metricas import Metricas
+from recetas import ErrorReceta, validar_receta, validar_medicamentos, crear_receta as guardar_receta, crear_recetas
+from auditoria import EscritorAuditoria, QUERY_INSERTAR as QUERY_AUDITORIA
+from exportacion import FORMATOS, exportar
+from cache_vistas import CacheVistas
+import busqueda_clinica
+from archivo_auditoria import ArchivoAuditoria, COLUMNAS as COLUMNAS_AUDITORIA
+from contrasenas import Contrasenas, ClavesSaturadas
+from reportes import Reportes
+from recursos import Recursos
+from catalogos import Catalogos
+import configuracion
 
-# Configuración de la conexión MySQL
-app.config['MYSQL_HOST'] = 'localhost'
-app.config['MYSQL_USER'] = 'root'
-app.config['MYSQL_PASSWORD'] = ''
-app.config['MYSQL_DB'] = 'clinica_vital'
+class Rutas:
+    """
+    Rutas y ganchos de este módulo; crear_app() los registra en la app que
+    crea. Como un Blueprint, pero con los endpoints sin prefijo, así
+    url_for('login') sigue igual en vistas y plantillas.
+    """
+
+    def __init__(self):
+        self._registros = []
+
+    def route(self, regla, **opciones):
+        def decorador(f):
+            self._registros.append(lambda app: app.add_url_rule(regla, view_func=f, **opciones))
+            return f
+        return decorador
+
+    def before_request(self, f):
+        self._registros.append(lambda app: app.before_request(f))
+        return f
+
+    def registrar(self, app):
+        for registro in self._registros:
+            registro(app)
+
+
+rutas = Rutas()
 
-mysql = MySQL(app)
+# Extensiones: las vistas las usan como decoradores al importar el módulo;
+# crear_app() las inicia con la configuración de la app
+mysql = MySQLPool()
+recursos = Recursos()
+metricas = Metricas()
+mysql.envolver = metricas.envolver
+cache_vistas = CacheVistas(lambda: ahora(current_app.config['CLINICA_ZONA_HORARIA']),
+                           lambda: mysql.lectura)
+
+# Cachés y servicios que dependen de la configuración: los crea crear_app()
+cache_permisos = cambios_identidad = catalogos = contrasenas = reportes = None
+agenda = agenda_hoy = conexiones_en_vivo = estadisticas = escritor_auditoria = None
 
 # =====================================
 # DECORADORES DE PERMISOS
@@ -58,15 +110,9 @@ def permission_required(modulo, accion):
                 flash('Debes iniciar sesión', 'warning')
                 return redirect(url_for('login'))
             
-            cursor = mysql.connection.cursor()
-            query = """
-                SELECT puede_ver, puede_crear, puede_editar, puede_eliminar
-                FROM permisos
-                WHERE rol_id = %s AND modulo = %s
-            """
-            cursor.execute(query, (session['rol_id'], modulo))
-            permiso = cursor.fetchone()
-            cursor.close()
+            # Se responde desde la caché; solo toca MySQL si la matriz expiró
+            permiso = cache_permisos.obtener(session['rol_id'], modulo,
+                                             lambda: mysql.connection)
             
             if not permiso:
                 flash('No tienes permisos para este módulo', 'danger')
@@ -92,50 +138,249 @@ def permission_required(modulo, accion):
 # FUNCIONES DE AYUDA
 # =====================================
 
+def ventana_hoy():
+    """Rango [inicio, fin) del día actual en la zona horaria de la clínica"""
+    return ventana_dia(current_app.config['CLINICA_ZONA_HORARIA'])
+
+def parametros_pagina():
+    """Lee ?cursor= y ?tamano= de la petición"""
+    tamano = request.args.get('tamano', current_app.config['PAGINA_TAMANO'], type=int)
+    tamano = max(1, min(tamano, current_app.config['PAGINA_TAMANO_MAX']))
+    return request.args.get('cursor'), tamano
+
+def pagina(query, params, columna_fecha, columna_id):
+    """Ejecuta una consulta paginada por cursor; responde 400 si el cursor es inválido"""
+    cursor_pagina, tamano = parametros_pagina()
+    cursor = mysql.lectura.cursor()
+    try:
+        return consultar_pagina(cursor, query, params, columna_fecha, columna_id,
+                                cursor_pagina, tamano)
+    except ValueError:
+        abort(400)
+    finally:
+        cursor.close()
+
+def buscar_en_historias():
+    """Página de resultados de ?q=; el cursor es la posición en el ranking"""
+    desplazamiento, tamano = parametros_pagina()
+    desplazamiento = desplazamiento or '0'
+    if not desplazamiento.isdigit():
+        abort(400)
+    espera = current_app.config['BUSQUEDA_PARALELO_ESPERA']
+    historias, hay_mas = busqueda_clinica.buscar(
+        mysql.lectura, g.identidad.doctor_id, request.args.get('q', ''), tamano, int(desplazamiento),
+        paralelo=lambda tareas: mysql.en_paralelo(tareas, espera_max=espera, lectura=True))
+    return historias, str(int(desplazamiento) + tamano) if hay_mas else None
+
+def actualizar_identidad(usuario_id):
+    """
+    Cambiar el rol o desactivar una cuenta ya la marca (actualizado_en). Debe
+    llamarse, antes del commit, al reasignarla sin tocar su fila en usuarios,
+    p. ej. al crear o quitar su registro en doctores o pacientes.
+    """
+    cambios_identidad.marcar(mysql.connection, usuario_id)
+
+def invalidar_permisos():
+    """Debe llamarse después de confirmar cualquier cambio en la tabla permisos"""
+    cache_permisos.invalidar(mysql.connection)
+
+def sello_paciente():
+    return [('paciente', g.identidad.paciente_id)]
+
+def sello_doctor():
+    return [('doctor', g.identidad.doctor_id)]
+
 def registrar_auditoria(usuario_id, accion, modulo, registro_id=None, detalles=None):
-    """Registra acciones en la tabla de auditoría"""
-    cursor = mysql.connection.cursor()
-    ip = request.remote_addr
+    """Registra acciones en la tabla de auditoría, con la hora de la llamada"""
+    fila = escritor_auditoria.fila(usuario_id, accion, modulo, registro_id, detalles,
+                                   request.remote_addr)
     
-    query = """
-        INSERT INTO auditoria (usuario_id, accion, modulo, registro_id, detalles, ip_address)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """
-    cursor.execute(query, (usuario_id, accion, modulo, registro_id, detalles, ip))
+    if current_app.config['AUDITORIA_MODO'] == 'asincrono':
+        escritor_auditoria.registrar(fila)
+        return
+    
+    cursor = mysql.connection.cursor()
+    cursor.execute(QUERY_AUDITORIA, fila)
     mysql.connection.commit()
     cursor.close()
 
+def respuesta_saturada():
+    """503 para logins y registros rechazados por el control de admisión de contraseñas"""
+    flash('Hay muchos inicios de sesión en este momento, intenta de nuevo en unos segundos', 'warning')
+    return render_template('login.html'), 503, {'Retry-After': str(current_app.config['CLAVES_REINTENTAR'])}
+
+def respuesta_exportacion(nombre, query, params, filas_previas=(), columnas=None, auditoria=None):
+    """
+    Descarga en streaming según ?formato=csv|ndjson; ver exportacion.exportar.
+    `auditoria` son los argumentos de registrar_auditoria sin el usuario: se
+    registra al empezar la descarga y no en la vista, que @mysql.en_replica
+    repite en la principal si la réplica falla.
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS:
+        abort(400)
+    al_empezar = None
+    if auditoria is not None:
+        usuario_id = session['usuario_id']
+        al_empezar = lambda: registrar_auditoria(usuario_id, *auditoria)
+    bloques = exportar(mysql.lectura, query, params, formato,
+                       tamano_lote=current_app.config['EXPORTACION_LOTE'],
+                       net_write_timeout=current_app.config['EXPORTACION_NET_WRITE_TIMEOUT'],
+                       al_cortar=mysql.descartar, filas_previas=filas_previas,
+                       columnas=columnas, al_empezar=al_empezar)
+    respuesta = Response(stream_with_context(bloques), mimetype=FORMATOS[formato])
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    # Evita que un proxy delante acumule la respuesta completa
+    respuesta.headers['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+# =====================================
+# CONSULTAS POR DÍA
+# =====================================
+
+# Filtran con rangos semiabiertos para usar idx_citas_fecha e idx_fecha.
+# verificar_indices.py ejecuta EXPLAIN sobre cada una.
+
+SELECT_CITAS = """
+    SELECT c.*, 
+           up.nombre_completo as paciente_nombre,
+           ud.nombre_completo as doctor_nombre,
+           e.nombre as especialidad
+    FROM citas c
+    JOIN pacientes p ON c.paciente_id = p.id
+    JOIN usuarios up ON p.usuario_id = up.id
+    JOIN doctores d ON c.doctor_id = d.id
+    JOIN usuarios ud ON d.usuario_id = ud.id
+    JOIN especialidades e ON d.especialidad_id = e.id
+"""
+
+# Los dashboards de secretaría y doctor leen la foto compartida de agenda_hoy
+QUERY_CITAS_HOY = SELECT_CITAS + """    WHERE """ + filtro_ventana('c.fecha_hora') + """
+    ORDER BY c.fecha_hora
+"""
+
+# Citas de cualquier día modificadas desde una hora de la BD (idx_citas_actualizado)
+QUERY_CITAS_CAMBIADAS = SELECT_CITAS + """    WHERE c.actualizado_en >= FROM_UNIXTIME(%s)
+"""
+
+# Listados paginados por (fecha, id); {filtro_cursor} lo completa paginacion.py
+
+QUERY_HISTORIAS_DOCTOR = """
+    SELECT hc.*, u.nombre_completo as paciente_nombre
+    FROM historias_clinicas hc
+    JOIN pacientes p ON hc.paciente_id = p.id
+    JOIN usuarios u ON p.usuario_id = u.id
+    WHERE hc.doctor_id = %s {filtro_cursor}
+    ORDER BY hc.fecha_consulta DESC, hc.id DESC
+"""
+
+QUERY_HISTORIAS_PACIENTE = """
+    SELECT hc.*, u.nombre_completo as doctor_nombre, e.nombre as especialidad
+    FROM historias_clinicas hc
+    JOIN doctores d ON hc.doctor_id = d.id
+    JOIN usuarios u ON d.usuario_id = u.id
+    JOIN especialidades e ON d.especialidad_id = e.id
+    WHERE hc.paciente_id = %s {filtro_cursor}
+    ORDER BY hc.fecha_consulta DESC, hc.id DESC
+"""
+
+QUERY_RECETAS_PACIENTE = """
+    SELECT r.*, u.nombre_completo as doctor_nombre
+    FROM recetas r
+    JOIN doctores d ON r.doctor_id = d.id
+    JOIN usuarios u ON d.usuario_id = u.id
+    WHERE r.paciente_id = %s AND r.activa = TRUE {filtro_cursor}
+    ORDER BY r.fecha_emision DESC, r.id DESC
+"""
+
+# Exportaciones: se leen con SSCursor, sin paginar
+
+QUERY_EXPORTAR_RECETAS_PACIENTE = """
+    SELECT r.id as receta_id, r.fecha_emision, r.fecha_vencimiento, r.instrucciones_generales,
+           u.nombre_completo as doctor_nombre, m.nombre_medicamento, m.dosis, m.frecuencia,
+           m.duracion, m.instrucciones_especiales
+    FROM recetas r
+    JOIN doctores d ON r.doctor_id = d.id
+    JOIN usuarios u ON d.usuario_id = u.id
+    LEFT JOIN medicamentos_receta m ON m.receta_id = r.id
+    WHERE r.paciente_id = %s AND r.activa = TRUE
+    ORDER BY r.fecha_emision DESC, r.id DESC, m.id
+"""
+
+# Las columnas coinciden con las de los meses archivados (archivo_auditoria.COLUMNAS);
+# {filtros} agrega usuario y/o módulo. El rango de fechas poda las particiones.
+QUERY_EXPORTAR_AUDITORIA = """
+    SELECT a.id, a.fecha_accion, a.usuario_id, u.username, a.accion, a.modulo,
+           a.registro_id, a.detalles, a.ip_address
+    FROM auditoria a
+    LEFT JOIN usuarios u ON a.usuario_id = u.id
+    WHERE """ + filtro_ventana('a.fecha_accion') + """ {filtros}
+    ORDER BY a.fecha_accion, a.id
+"""
+
+@rutas.before_request
+def cargar_identidad():
+    """Expone en g.identidad el usuario en sesión y su doctor_id / paciente_id"""
+    g.identidad = None
+    # Los estáticos no dependen del usuario: sin leer la sesión no llevan Vary: Cookie
+    # y un proxy o CDN puede compartirlos
+    if request.endpoint == 'static' or 'usuario_id' not in session:
+        return
+
+    # Solo se vuelve a la BD si la sesión es antigua o la cuenta cambió desde entonces
+    cambios_identidad.revisar(lambda: mysql.connection)
+    if ('identidad_ts' not in session or
+            cambios_identidad.cambiado_desde(session['usuario_id'], session['identidad_ts'])):
+        cursor = mysql.connection.cursor()
+        cursor.execute(QUERY_IDENTIDAD.format(condicion='u.id = %s'), (session['usuario_id'],))
+        user = cursor.fetchone()
+        cursor.close()
+
+        if not user:
+            session.clear()
+            flash('Tu cuenta ya no está activa', 'warning')
+            return
+        guardar_en_sesion(session, user)
+
+    g.identidad = Identidad.desde_sesion(session)
+
 # =====================================
 # RUTAS PÚBLICAS
 # =====================================
 
-@app.route('/')
+@rutas.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@rutas.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
+        # La misma consulta resuelve doctor_id / paciente_id para toda la sesión
         cursor = mysql.connection.cursor()
-        query = """
-            SELECT u.id, u.username, u.password, u.rol_id, u.nombre_completo, r.nombre as rol
-            FROM usuarios u
-            JOIN roles r ON u.rol_id = r.id
-            WHERE u.username = %s AND u.activo = TRUE
-        """
-        cursor.execute(query, (username,))
+        cursor.execute(QUERY_IDENTIDAD.format(condicion='u.username = %s'), (username,))
         user = cursor.fetchone()
         cursor.close()
+        # No retener una conexión del pool mientras el hash espera turno
+        mysql.liberar()
 
-        if user and check_password_hash(user[2], password):  # user[2] es password
-            session['usuario_id'] = user[0]
-            session['username'] = user[1]
-            session['rol_id'] = user[3]
-            session['nombre_completo'] = user[4]
-            session['rol'] = user[5]
+        try:
+            valida, hash_nuevo = (contrasenas.verificar(user[2], password)  # user[2] es password
+                                  if user else (False, None))
+        except ClavesSaturadas:
+            return respuesta_saturada()
+
+        if valida:
+            if hash_nuevo:
+                # Hash con parámetros anteriores: se reemplaza si nadie cambió la clave entre tanto
+                cursor = mysql.connection.cursor()
+                cursor.execute("UPDATE usuarios SET password = %s WHERE id = %s AND password = %s",
+                               (hash_nuevo, user[0], user[2]))
+                mysql.connection.commit()
+                cursor.close()
+            guardar_en_sesion(session, user)
             
             # Registrar login en auditoría
             registrar_auditoria(user[0], 'login', 'sistema')
@@ -148,18 +393,21 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/register', methods=['POST'])
+@rutas.route('/register', methods=['POST'])
 def register():
     username = request.form['username']
     email = request.form['email']
     password = request.form['password']
     
-    # Por defecto, los usuarios registrados son pacientes (rol_id = 4)
+    # Por defecto, los usuarios registrados son pacientes
     nombre_completo = request.form.get('nombre_completo', username)
-    rol_id = 4  # Paciente
+    rol_id = catalogos.rol_id('paciente', lambda: mysql.connection)
     
-    # Hash de la contraseña
-    password_hash = generate_password_hash(password)
+    # Hash de la contraseña, en el pool de contraseñas
+    try:
+        password_hash = contrasenas.generar(password)
+    except ClavesSaturadas:
+        return respuesta_saturada()
 
     cursor = mysql.connection.cursor()
     
@@ -176,18 +424,23 @@ def register():
         VALUES (%s, %s, %s, %s, %s)
     """
     cursor.execute(query, (username, email, password_hash, rol_id, nombre_completo))
-    mysql.connection.commit()
     usuario_id = cursor.lastrowid
     
-    # Crear registro en tabla pacientes
+    # Crear registro en tabla pacientes y, en la misma transacción, indexar
+    # su nombre para que aparezca de inmediato en el buscador de citas
     cursor.execute("INSERT INTO pacientes (usuario_id) VALUES (%s)", (usuario_id,))
+    paciente_id = cursor.lastrowid
+    indice_nombres.indexar(cursor, indice_nombres.PACIENTE, paciente_id, nombre_completo)
     mysql.connection.commit()
     cursor.close()
+    
+    estadisticas.incrementar(mysql.connection, est.USUARIOS_ACTIVOS,
+                             ahora(current_app.config['CLINICA_ZONA_HORARIA']).date())
 
     flash('Registro exitoso. Por favor inicia sesión', 'success')
     return redirect(url_for('login'))
 
-@app.route('/logout')
+@rutas.route('/logout')
 @login_required
 def logout():
     registrar_auditoria(session['usuario_id'], 'logout', 'sistema')
@@ -199,7 +452,7 @@ def logout():
 # DASHBOARD GENERAL
 # =====================================
 
-@app.route('/dashboard')
+@rutas.route('/dashboard')
 @login_required
 def dashboard():
     rol = session.get('rol')
@@ -220,73 +473,80 @@ def dashboard():
 # DASHBOARD DOCTOR
 # =====================================
 
-@app.route('/doctor/dashboard')
+@rutas.route('/doctor/dashboard')
 @login_required
 @role_required('doctor')
+@cache_vistas.vista(sello_doctor)
 def dashboard_doctor():
-    cursor = mysql.connection.cursor()
-    
-    # Obtener doctor_id
-    cursor.execute("SELECT id FROM doctores WHERE usuario_id = %s", (session['usuario_id'],))
-    doctor = cursor.fetchone()
-    doctor_id = doctor[0] if doctor else None
-    
-    # Obtener citas de hoy
-    query = """
-        SELECT c.*, u.nombre_completo as paciente_nombre
-        FROM citas c
-        JOIN pacientes p ON c.paciente_id = p.id
-        JOIN usuarios u ON p.usuario_id = u.id
-        WHERE c.doctor_id = %s AND DATE(c.fecha_hora) = CURDATE()
-        ORDER BY c.fecha_hora
-    """
-    cursor.execute(query, (doctor_id,))
-    citas_hoy = cursor.fetchall()
+    # Citas de hoy desde la foto compartida; /api/citas/hoy/eventos envía los cambios
+    version, citas_hoy = agenda_hoy.filas(lambda: mysql.connection, g.identidad.doctor_id)
+    cache_vistas.vence(ventana_hoy()[1])
     
-    cursor.close()
-    
-    return render_template('doctor/dashboard.html', citas=citas_hoy)
+    return render_template('doctor/dashboard.html', citas=citas_hoy, version_agenda=version)
 
-@app.route('/doctor/historias-clinicas')
+@rutas.route('/doctor/historias-clinicas')
 @login_required
 @role_required('doctor')
 @permission_required('historias_clinicas', 'ver')
+@mysql.en_replica
 def historias_clinicas():
-    cursor = mysql.connection.cursor()
+    # Obtener historias clínicas del doctor, una página a la vez
+    historias, siguiente = pagina(QUERY_HISTORIAS_DOCTOR, (g.identidad.doctor_id,),
+                                  'hc.fecha_consulta', 'hc.id')
     
-    # Obtener doctor_id
-    cursor.execute("SELECT id FROM doctores WHERE usuario_id = %s", (session['usuario_id'],))
-    doctor = cursor.fetchone()
-    doctor_id = doctor[0] if doctor else None
+    return render_template('doctor/historias_clinicas.html', historias=historias, siguiente=siguiente)
+
+@rutas.route('/doctor/historias-clinicas/mas')
+@login_required
+@role_required('doctor')
+@permission_required('historias_clinicas', 'ver')
+@mysql.en_replica
+def historias_clinicas_mas():
+    # Fragmento para el botón "cargar más"
+    historias, siguiente = pagina(QUERY_HISTORIAS_DOCTOR, (g.identidad.doctor_id,),
+                                  'hc.fecha_consulta', 'hc.id')
     
-    # Obtener historias clínicas del doctor
-    query = """
-        SELECT hc.*, u.nombre_completo as paciente_nombre
-        FROM historias_clinicas hc
-        JOIN pacientes p ON hc.paciente_id = p.id
-        JOIN usuarios u ON p.usuario_id = u.id
-        WHERE hc.doctor_id = %s
-        ORDER BY hc.fecha_consulta DESC
-        LIMIT 50
-    """
-    cursor.execute(query, (doctor_id,))
-    historias = cursor.fetchall()
-    cursor.close()
+    return render_template('doctor/_historias_filas.html', historias=historias, siguiente=siguiente)
+
+@rutas.route('/doctor/historias-clinicas/buscar')
+@login_required
+@role_required('doctor')
+@permission_required('historias_clinicas', 'ver')
+@mysql.en_replica
+def buscar_historias():
+    # ?q= en motivo, síntomas, diagnóstico y observaciones, por relevancia
+    historias, siguiente = buscar_en_historias()
     
-    return render_template('doctor/historias_clinicas.html', historias=historias)
+    return render_template('doctor/historias_clinicas.html', historias=historias, siguiente=siguiente,
+                           busqueda=request.args.get('q', ''))
 
-@app.route('/doctor/historia-clinica/crear/<int:paciente_id>', methods=['GET', 'POST'])
+@rutas.route('/doctor/historias-clinicas/buscar/mas')
+@login_required
+@role_required('doctor')
+@permission_required('historias_clinicas', 'ver')
+@mysql.en_replica
+def buscar_historias_mas():
+    historias, siguiente = buscar_en_historias()
+    
+    return render_template('doctor/_historias_filas.html', historias=historias, siguiente=siguiente)
+
+@rutas.route('/doctor/historias-clinicas/exportar')
+@login_required
+@role_required('doctor')
+@permission_required('historias_clinicas', 'ver')
+@mysql.en_replica
+def exportar_historias_doctor():
+    return respuesta_exportacion('historias_clinicas', QUERY_HISTORIAS_DOCTOR.format(filtro_cursor=''),
+                                 (g.identidad.doctor_id,), auditoria=('exportar', 'historias_clinicas'))
+
+@rutas.route('/doctor/historia-clinica/crear/<int:paciente_id>', methods=['GET', 'POST'])
 @login_required
 @role_required('doctor')
 @permission_required('historias_clinicas', 'crear')
 def crear_historia_clinica(paciente_id):
     if request.method == 'POST':
         cursor = mysql.connection.cursor()
-        
-        # Obtener doctor_id
-        cursor.execute("SELECT id FROM doctores WHERE usuario_id = %s", (session['usuario_id'],))
-        doctor = cursor.fetchone()
-        doctor_id = doctor[0]
+        doctor_id = g.identidad.doctor_id
         
         # Insertar historia clínica
         query = """
@@ -295,17 +555,26 @@ def crear_historia_clinica(paciente_id):
              presion_arterial, temperatura, peso, altura)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
+        campos = {
+            'motivo_consulta': request.form.get('motivo'), 'sintomas': request.form.get('sintomas'),
+            'diagnostico': request.form.get('diagnostico'), 'observaciones': request.form.get('observaciones'),
+        }
         cursor.execute(query, (
             paciente_id, doctor_id,
-            request.form.get('motivo'), request.form.get('sintomas'),
-            request.form.get('diagnostico'), request.form.get('observaciones'),
+            campos['motivo_consulta'], campos['sintomas'],
+            campos['diagnostico'], campos['observaciones'],
             request.form.get('presion'), request.form.get('temperatura'),
             request.form.get('peso'), request.form.get('altura')
         ))
-        mysql.connection.commit()
         historia_id = cursor.lastrowid
+        # La historia y sus términos de búsqueda en la misma transacción
+        busqueda_clinica.indexar(cursor, historia_id, doctor_id, campos)
+        mysql.connection.commit()
         cursor.close()
         
+        estadisticas.incrementar(mysql.connection, est.CONSULTAS,
+                                 ahora(current_app.config['CLINICA_ZONA_HORARIA']).date())
+        cache_vistas.invalidar(mysql.connection, ('paciente', paciente_id), ('doctor', doctor_id))
         registrar_auditoria(session['usuario_id'], 'crear', 'historias_clinicas', historia_id)
         flash('Historia clínica creada exitosamente', 'success')
         return redirect(url_for('historias_clinicas'))
@@ -324,70 +593,103 @@ def crear_historia_clinica(paciente_id):
     
     return render_template('doctor/crear_historia.html', paciente=paciente, paciente_id=paciente_id)
 
-@app.route('/doctor/receta/crear/<int:paciente_id>', methods=['GET', 'POST'])
+@rutas.route('/doctor/receta/crear/<int:paciente_id>', methods=['GET', 'POST'])
 @login_required
 @role_required('doctor')
 @permission_required('recetas', 'crear')
 def crear_receta(paciente_id):
     if request.method == 'POST':
-        cursor = mysql.connection.cursor()
-        
-        # Obtener doctor_id
-        cursor.execute("SELECT id FROM doctores WHERE usuario_id = %s", (session['usuario_id'],))
-        doctor = cursor.fetchone()
-        doctor_id = doctor[0]
-        
-        # Crear receta (sin historia_clinica_id si es receta independiente)
-        query = """
-            INSERT INTO recetas 
-            (historia_clinica_id, paciente_id, doctor_id, instrucciones_generales, fecha_vencimiento)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        historia_id = request.form.get('historia_id') if request.form.get('historia_id') else None
-        cursor.execute(query, (
-            historia_id, paciente_id, doctor_id,
-            request.form.get('instrucciones'), request.form.get('fecha_vencimiento')
-        ))
-        receta_id = cursor.lastrowid
-        
-        # Agregar medicamentos
-        medicamentos = request.form.getlist('medicamento[]')
-        dosis = request.form.getlist('dosis[]')
-        frecuencias = request.form.getlist('frecuencia[]')
-        duraciones = request.form.getlist('duracion[]')
-        
-        for i in range(len(medicamentos)):
-            if medicamentos[i]:  # Solo si hay medicamento
-                query_med = """
-                    INSERT INTO medicamentos_receta 
-                    (receta_id, nombre_medicamento, dosis, frecuencia, duracion)
-                    VALUES (%s, %s, %s, %s, %s)
-                """
-                cursor.execute(query_med, (receta_id, medicamentos[i], dosis[i], frecuencias[i], duraciones[i]))
-        
-        mysql.connection.commit()
-        cursor.close()
+        fecha = ahora(current_app.config['CLINICA_ZONA_HORARIA'])
+        # Validar la receta y todos los medicamentos antes de escribir nada
+        try:
+            _, historia_id, fecha_vencimiento = validar_receta(
+                paciente_id, request.form.get('historia_id'),
+                request.form.get('fecha_vencimiento'), fecha.date()
+            )
+            medicamentos = validar_medicamentos(
+                request.form.getlist('medicamento[]'), request.form.getlist('dosis[]'),
+                request.form.getlist('frecuencia[]'), request.form.getlist('duracion[]')
+            )
+            # Receta, medicamentos y auditoría en una sola transacción
+            # (sin historia_clinica_id si es receta independiente)
+            guardar_receta(mysql.connection, {
+                'paciente_id': paciente_id,
+                'historia_id': historia_id,
+                'instrucciones': request.form.get('instrucciones'),
+                'fecha_vencimiento': fecha_vencimiento,
+                'medicamentos': medicamentos,
+            }, g.identidad.doctor_id, session['usuario_id'], request.remote_addr, fecha)
+        except ErrorReceta as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('crear_receta', paciente_id=paciente_id))
+        cache_vistas.invalidar(mysql.connection, ('paciente', paciente_id),
+                               ('doctor', g.identidad.doctor_id))
         
-        registrar_auditoria(session['usuario_id'], 'crear', 'recetas', receta_id)
         flash('Receta creada exitosamente', 'success')
         return redirect(url_for('dashboard_doctor'))
     
     return render_template('doctor/crear_receta.html', paciente_id=paciente_id)
 
+@rutas.route('/doctor/recetas/lote', methods=['POST'])
+@login_required
+@role_required('doctor')
+@permission_required('recetas', 'crear')
+def crear_recetas_lote():
+    """
+    Emite varias recetas en una petición (p. ej. renovaciones de crónicos).
+    Espera JSON: {"recetas": [{"paciente_id", "historia_id", "instrucciones",
+    "fecha_vencimiento", "medicamentos": [{"nombre", "dosis", "frecuencia", "duracion"}]}]}
+    """
+    datos = request.get_json(silent=True) or {}
+    lote = datos.get('recetas')
+    if not isinstance(lote, list) or not lote:
+        return jsonify({'error': 'Se esperaba una lista "recetas"'}), 400
+    if len(lote) > current_app.config['RECETAS_LOTE_MAX']:
+        return jsonify({'error': f"Máximo {current_app.config['RECETAS_LOTE_MAX']} recetas por lote"}), 400
+    
+    fecha = ahora(current_app.config['CLINICA_ZONA_HORARIA'])
+    recetas = []
+    for i, receta in enumerate(lote):
+        try:
+            paciente_id, historia_id, fecha_vencimiento = validar_receta(
+                receta['paciente_id'], receta.get('historia_id'),
+                receta.get('fecha_vencimiento'), fecha.date()
+            )
+            meds = receta.get('medicamentos') or []
+            recetas.append({
+                'paciente_id': paciente_id,
+                'historia_id': historia_id,
+                'instrucciones': receta.get('instrucciones'),
+                'fecha_vencimiento': fecha_vencimiento,
+                'medicamentos': validar_medicamentos(
+                    [m.get('nombre') for m in meds], [m.get('dosis') for m in meds],
+                    [m.get('frecuencia') for m in meds], [m.get('duracion') for m in meds]
+                ),
+            })
+        except (ErrorReceta, KeyError, TypeError, ValueError, AttributeError) as e:
+            return jsonify({'error': f'Receta {i}: {e}'}), 400
+    
+    try:
+        ids = crear_recetas(mysql.connection, recetas, g.identidad.doctor_id,
+                            session['usuario_id'], request.remote_addr, fecha)
+    except ErrorReceta as e:
+        return jsonify({'error': f'Receta {e.indice}: {e}'}), 400
+    cache_vistas.invalidar(mysql.connection, ('doctor', g.identidad.doctor_id),
+                           *{('paciente', receta['paciente_id']) for receta in recetas})
+    return jsonify({'recetas': ids}), 201
+
 # =====================================
 # DASHBOARD PACIENTE
 # =====================================
 
-@app.route('/paciente/dashboard')
+@rutas.route('/paciente/dashboard')
 @login_required
 @role_required('paciente')
+@mysql.en_replica
+@cache_vistas.vista(sello_paciente)
 def dashboard_paciente():
-    cursor = mysql.connection.cursor()
-    
-    # Obtener paciente_id
-    cursor.execute("SELECT id FROM pacientes WHERE usuario_id = %s", (session['usuario_id'],))
-    paciente = cursor.fetchone()
-    paciente_id = paciente[0] if paciente else None
+    cursor = mysql.lectura.cursor()
+    paciente_id = g.identidad.paciente_id
     
     # Obtener próximas citas
     query = """
@@ -396,173 +698,575 @@ def dashboard_paciente():
         JOIN doctores d ON c.doctor_id = d.id
         JOIN usuarios u ON d.usuario_id = u.id
         JOIN especialidades e ON d.especialidad_id = e.id
-        WHERE c.paciente_id = %s AND c.fecha_hora >= NOW()
+        WHERE c.paciente_id = %s AND c.fecha_hora >= %s
         ORDER BY c.fecha_hora
         LIMIT 5
     """
-    cursor.execute(query, (paciente_id,))
+    cursor.execute(query, (paciente_id, ahora(current_app.config['CLINICA_ZONA_HORARIA'])))
     citas = cursor.fetchall()
     
     cursor.close()
     
+    # La primera cita sale de la lista cuando llega su hora
+    if citas:
+        cache_vistas.vence(citas[0][3])
+    
     return render_template('paciente/dashboard.html', citas=citas)
 
-@app.route('/paciente/mi-historia')
+@rutas.route('/paciente/mi-historia')
 @login_required
 @role_required('paciente')
 @permission_required('mi_historia_clinica', 'ver')
+@mysql.en_replica
 def mi_historia_clinica():
-    cursor = mysql.connection.cursor()
-    
-    cursor.execute("SELECT id FROM pacientes WHERE usuario_id = %s", (session['usuario_id'],))
-    paciente = cursor.fetchone()
-    paciente_id = paciente[0]
+    historias, siguiente = pagina(QUERY_HISTORIAS_PACIENTE, (g.identidad.paciente_id,),
+                                  'hc.fecha_consulta', 'hc.id')
     
-    query = """
-        SELECT hc.*, u.nombre_completo as doctor_nombre, e.nombre as especialidad
-        FROM historias_clinicas hc
-        JOIN doctores d ON hc.doctor_id = d.id
-        JOIN usuarios u ON d.usuario_id = u.id
-        JOIN especialidades e ON d.especialidad_id = e.id
-        WHERE hc.paciente_id = %s
-        ORDER BY hc.fecha_consulta DESC
-    """
-    cursor.execute(query, (paciente_id,))
-    historias = cursor.fetchall()
-    cursor.close()
+    return render_template('paciente/mi_historia.html', historias=historias, siguiente=siguiente)
+
+@rutas.route('/paciente/mi-historia/mas')
+@login_required
+@role_required('paciente')
+@permission_required('mi_historia_clinica', 'ver')
+@mysql.en_replica
+def mi_historia_clinica_mas():
+    historias, siguiente = pagina(QUERY_HISTORIAS_PACIENTE, (g.identidad.paciente_id,),
+                                  'hc.fecha_consulta', 'hc.id')
     
-    return render_template('paciente/mi_historia.html', historias=historias)
+    return render_template('paciente/_historias_filas.html', historias=historias, siguiente=siguiente)
+
+@rutas.route('/paciente/mi-historia/exportar')
+@login_required
+@role_required('paciente')
+@permission_required('mi_historia_clinica', 'ver')
+@mysql.en_replica
+def exportar_mi_historia():
+    return respuesta_exportacion('mi_historia', QUERY_HISTORIAS_PACIENTE.format(filtro_cursor=''),
+                                 (g.identidad.paciente_id,), auditoria=('exportar', 'mi_historia_clinica'))
 
-@app.route('/paciente/mis-recetas')
+@rutas.route('/paciente/mis-recetas')
 @login_required
 @role_required('paciente')
 @permission_required('mis_recetas', 'ver')
+@mysql.en_replica
+@cache_vistas.vista(sello_paciente)
 def mis_recetas():
-    cursor = mysql.connection.cursor()
+    recetas, siguiente = pagina(QUERY_RECETAS_PACIENTE, (g.identidad.paciente_id,),
+                                'r.fecha_emision', 'r.id')
     
-    cursor.execute("SELECT id FROM pacientes WHERE usuario_id = %s", (session['usuario_id'],))
-    paciente = cursor.fetchone()
-    paciente_id = paciente[0]
-    
-    query = """
-        SELECT r.*, u.nombre_completo as doctor_nombre
-        FROM recetas r
-        JOIN doctores d ON r.doctor_id = d.id
-        JOIN usuarios u ON d.usuario_id = u.id
-        WHERE r.paciente_id = %s AND r.activa = TRUE
-        ORDER BY r.fecha_emision DESC
-    """
-    cursor.execute(query, (paciente_id,))
-    recetas = cursor.fetchall()
-    cursor.close()
+    return render_template('paciente/mis_recetas.html', recetas=recetas, siguiente=siguiente)
+
+@rutas.route('/paciente/mis-recetas/mas')
+@login_required
+@role_required('paciente')
+@permission_required('mis_recetas', 'ver')
+@mysql.en_replica
+def mis_recetas_mas():
+    recetas, siguiente = pagina(QUERY_RECETAS_PACIENTE, (g.identidad.paciente_id,),
+                                'r.fecha_emision', 'r.id')
     
-    return render_template('paciente/mis_recetas.html', recetas=recetas)
+    return render_template('paciente/_recetas_filas.html', recetas=recetas, siguiente=siguiente)
+
+@rutas.route('/paciente/mis-recetas/exportar')
+@login_required
+@role_required('paciente')
+@permission_required('mis_recetas', 'ver')
+@mysql.en_replica
+def exportar_mis_recetas():
+    # Una fila por medicamento
+    return respuesta_exportacion('mis_recetas', QUERY_EXPORTAR_RECETAS_PACIENTE,
+                                 (g.identidad.paciente_id,), auditoria=('exportar', 'mis_recetas'))
 
 # =====================================
 # DASHBOARD SECRETARIA
 # =====================================
 
-@app.route('/secretaria/dashboard')
+@rutas.route('/secretaria/dashboard')
 @login_required
 @role_required('secretaria')
 def dashboard_secretaria():
-    cursor = mysql.connection.cursor()
-    
-    # Obtener citas de hoy
-    query = """
-        SELECT c.*, 
-               up.nombre_completo as paciente_nombre,
-               ud.nombre_completo as doctor_nombre,
-               e.nombre as especialidad
-        FROM citas c
-        JOIN pacientes p ON c.paciente_id = p.id
-        JOIN usuarios up ON p.usuario_id = up.id
-        JOIN doctores d ON c.doctor_id = d.id
-        JOIN usuarios ud ON d.usuario_id = ud.id
-        JOIN especialidades e ON d.especialidad_id = e.id
-        WHERE DATE(c.fecha_hora) = CURDATE()
-        ORDER BY c.fecha_hora
-    """
-    cursor.execute(query)
-    citas_hoy = cursor.fetchall()
-    cursor.close()
+    # Citas de hoy desde la foto compartida; /api/citas/hoy/eventos envía los cambios
+    version, citas_hoy = agenda_hoy.filas(lambda: mysql.connection)
     
-    return render_template('secretaria/dashboard.html', citas=citas_hoy)
+    return render_template('secretaria/dashboard.html', citas_hoy=citas_hoy, version_agenda=version)
 
-@app.route('/secretaria/cita/crear', methods=['GET', 'POST'])
+@rutas.route('/secretaria/cita/crear', methods=['GET', 'POST'])
 @login_required
 @role_required('secretaria')
 @permission_required('citas', 'crear')
 def crear_cita():
     if request.method == 'POST':
-        cursor = mysql.connection.cursor()
+        paciente_id = request.form.get('paciente_id', type=int)
+        doctor_id = request.form.get('doctor_id', type=int)
+        if paciente_id is None or doctor_id is None:
+            flash('Elige el paciente y el doctor de la lista', 'danger')
+            return redirect(url_for('crear_cita'))
+        try:
+            fecha_hora = datetime.fromisoformat(request.form.get('fecha_hora', ''))
+            duracion = int(request.form['duracion']) if request.form.get('duracion') else None
+        except ValueError:
+            flash('Fecha, hora o duración inválidas', 'danger')
+            return redirect(url_for('crear_cita'))
         
-        query = """
-            INSERT INTO citas 
-            (paciente_id, doctor_id, fecha_hora, motivo, creada_por)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        cursor.execute(query, (
-            request.form['paciente_id'], request.form['doctor_id'],
-            request.form['fecha_hora'], request.form.get('motivo', ''),
-            session['usuario_id']
-        ))
-        cita_id = cursor.lastrowid
-        mysql.connection.commit()
-        cursor.close()
+        # La agenda rechaza la cita si se cruza con otra del mismo doctor
+        try:
+            cita_id = agenda.reservar(
+                mysql.connection, paciente_id, doctor_id, fecha_hora,
+                request.form.get('motivo', ''), session['usuario_id'], duracion=duracion
+            )
+        except ConflictoAgenda:
+            flash('El doctor ya tiene una cita en ese horario', 'warning')
+            return redirect(url_for('crear_cita'))
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('crear_cita'))
         
+        estadisticas.incrementar(mysql.connection, est.CITAS, fecha_hora.date())
+        agenda_hoy.publicar(mysql.connection, fecha_hora)
+        cache_vistas.invalidar(mysql.connection, ('paciente', paciente_id), ('doctor', doctor_id))
         registrar_auditoria(session['usuario_id'], 'crear', 'citas', cita_id)
         flash('Cita agendada exitosamente', 'success')
         return redirect(url_for('dashboard_secretaria'))
     
-    # GET - Obtener doctores y pacientes
-    cursor = mysql.connection.cursor()
-    cursor.execute("""
-        SELECT d.id, u.nombre_completo, e.nombre as especialidad 
-        FROM doctores d 
-        JOIN usuarios u ON d.usuario_id = u.id 
-        JOIN especialidades e ON d.especialidad_id = e.id
-        WHERE u.activo = TRUE
-    """)
-    doctores = cursor.fetchall()
+    # GET - Doctores y pacientes se buscan bajo demanda en /api/.../buscar;
+    # las especialidades para filtrar doctores salen del catálogo en memoria
+    return render_template('secretaria/crear_cita.html',
+                           especialidades=catalogos.especialidades(lambda: mysql.connection))
+
+@rutas.route('/api/citas/hoy/eventos')
+@login_required
+@role_required('secretaria', 'doctor')
+def eventos_citas_hoy():
+    """
+    Server-sent events con las citas de hoy nuevas o modificadas después de
+    ?desde= (o Last-Event-ID al reconectar), una marca de agenda_en_vivo que
+    sirve en cualquier worker. El navegador reconecta solo cuando el
+    servidor cierra la conexión. Pasado AGENDA_EN_VIVO_MAX conexiones en
+    este proceso, se responde solo con el tiempo de reintento.
+    """
+    try:
+        dia, marca = leer_marca(request.headers.get('Last-Event-ID', request.args.get('desde')))
+    except ValueError:
+        abort(400)
+    doctor_id = g.identidad.doctor_id if session['rol'] == 'doctor' else None
+    vida = current_app.config['AGENDA_EN_VIVO_CONEXION']
+    latido = current_app.config['AGENDA_EN_VIVO_LATIDO']
+
+    if not conexiones_en_vivo.acquire(blocking=False):
+        respuesta = Response(f"retry: {current_app.config['AGENDA_EN_VIVO_REINTENTO'] * 1000}\n\n",
+                             mimetype='text/event-stream')
+        respuesta.headers['Cache-Control'] = 'no-cache'
+        return respuesta
+
+    def revisar(marca_minima=None):
+        # Fuera del contexto de la petición: conexión directa del pool
+        agenda_hoy.revisar(mysql.pool.obtener, mysql.pool.devolver, marca_minima)
+
+    # Citas de hoy que esta pantalla de doctor muestra; None hasta el primer evento
+    propias = None
+
+    def evento(cambios):
+        nonlocal propias
+        version, filas, eliminados, completa = cambios
+        if doctor_id is not None:
+            # Una cita reasignada a otro doctor sale de esta pantalla como eliminada. En
+            # el primer evento no se sabe qué muestra la página: van todas las de otros
+            ajenas = [f[0] for f in filas if f[2] != doctor_id
+                      and (propias is None or f[0] in propias)]
+            filas = [f for f in filas if f[2] == doctor_id]
+            if completa or propias is None:
+                propias = agenda_hoy.ids_doctor(doctor_id)
+            propias.update(f[0] for f in filas)
+            propias.difference_update(eliminados, ajenas)
+            eliminados = eliminados + ajenas
+        if not (filas or eliminados or completa):
+            return None
+        datos = {'citas': [dict(zip(agenda_hoy.columnas, f)) for f in filas],
+                 'eliminadas': eliminados, 'completa': completa}
+        return (f'id: {marca_texto(agenda_hoy.dia, agenda_hoy.marca)}\nevent: citas\n'
+                f'data: {json.dumps(datos, default=str)}\n\n')
+
+    def eventos():
+        fin = time.monotonic() + vida
+        yield 'retry: 3000\n\n'
+        # Este worker debe haber revisado la BD al menos hasta la marca de la pantalla
+        revisar(marca)
+        cambios = agenda_hoy.desde_marca(dia, marca)
+        version = None
+        while cambios is not None:
+            texto = evento(cambios)
+            if texto:
+                yield texto
+            elif cambios[0] == version:
+                yield ': latido\n\n'
+            version = cambios[0]
+            if time.monotonic() >= fin:
+                return
+            # Alguna conexión debe revisar la BD cada intervalo aunque no haya otras peticiones
+            revisar()
+            cambios = agenda_hoy.esperar(version, min(latido, agenda_hoy.intervalo))
+        # La pantalla es de otro día: que recargue la página completa
+        yield 'event: recargar\ndata: {}\n\n'
+
+    respuesta = Response(eventos(), mimetype='text/event-stream')
+    respuesta.call_on_close(conexiones_en_vivo.release)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    respuesta.headers['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+@rutas.route('/api/agenda/libres')
+@login_required
+@role_required('secretaria')
+@permission_required('citas', 'crear')
+def turnos_libres():
+    """Próximos N turnos libres de un doctor (?doctor_id=) o de una especialidad (?especialidad_id=)"""
+    cantidad = max(1, min(request.args.get('n', 10, type=int), 100))
+    desde = request.args.get('desde')
+    try:
+        desde = datetime.fromisoformat(desde) if desde else None
+    except ValueError:
+        return jsonify({'error': 'Parámetro desde inválido'}), 400
     
-    cursor.execute("""
-        SELECT p.id, u.nombre_completo 
-        FROM pacientes p 
-        JOIN usuarios u ON p.usuario_id = u.id
-        WHERE u.activo = TRUE
-    """)
-    pacientes = cursor.fetchall()
-    cursor.close()
+    doctor_id = request.args.get('doctor_id', type=int)
+    especialidad_id = request.args.get('especialidad_id', type=int)
+    if doctor_id:
+        doctor_ids = [doctor_id]
+    elif especialidad_id:
+        if not catalogos.especialidad_activa(especialidad_id, lambda: mysql.connection):
+            return jsonify({'error': 'Especialidad inexistente'}), 404
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT d.id
+            FROM doctores d
+            JOIN usuarios u ON d.usuario_id = u.id
+            WHERE d.especialidad_id = %s AND u.activo = TRUE
+        """, (especialidad_id,))
+        doctor_ids = [fila[0] for fila in cursor.fetchall()]
+        cursor.close()
+    else:
+        return jsonify({'error': 'Indica doctor_id o especialidad_id'}), 400
+    
+    turnos = agenda.libres(doctor_ids, lambda: mysql.connection, desde, cantidad)
+    return jsonify({'turnos': [
+        {'doctor_id': doc_id, 'inicio': inicio.isoformat(timespec='minutes')}
+        for inicio, doc_id in turnos
+    ]})
+
+def parametros_busqueda():
+    """Lee ?q=, ?limite= y ?desde= de la petición"""
+    limite = request.args.get('limite', current_app.config['BUSQUEDA_LIMITE'], type=int)
+    limite = max(1, min(limite, current_app.config['BUSQUEDA_LIMITE_MAX']))
+    desde = max(0, request.args.get('desde', 0, type=int))
+    return request.args.get('q', '').strip(), limite, desde
+
+@rutas.route('/api/pacientes/buscar')
+@login_required
+@role_required('secretaria')
+@permission_required('citas', 'crear')
+def buscar_pacientes():
+    texto, limite, desde = parametros_busqueda()
+    if len(texto) < current_app.config['BUSQUEDA_MIN_CARACTERES']:
+        return jsonify({'resultados': [], 'hay_mas': False})
+    
+    resultados, hay_mas = indice_nombres.buscar(mysql.connection, indice_nombres.PACIENTE,
+                                                texto, limite, desde)
+    return jsonify({
+        'resultados': [{'id': r[0], 'nombre': r[1]} for r in resultados],
+        'hay_mas': hay_mas,
+    })
+
+@rutas.route('/api/doctores/buscar')
+@login_required
+@role_required('secretaria')
+@permission_required('citas', 'crear')
+def buscar_doctores():
+    texto, limite, desde = parametros_busqueda()
+    if len(texto) < current_app.config['BUSQUEDA_MIN_CARACTERES']:
+        return jsonify({'resultados': [], 'hay_mas': False})
+    
+    # Opcionalmente solo doctores de una especialidad
+    especialidad_id = request.args.get('especialidad_id', type=int)
+    if especialidad_id and not catalogos.especialidad_activa(especialidad_id,
+                                                             lambda: mysql.connection):
+        return jsonify({'resultados': [], 'hay_mas': False})
+    filtros = {'d.especialidad_id = %s': especialidad_id} if especialidad_id else None
     
-    return render_template('secretaria/crear_cita.html', doctores=doctores, pacientes=pacientes)
+    resultados, hay_mas = indice_nombres.buscar(mysql.connection, indice_nombres.DOCTOR,
+                                                texto, limite, desde, filtros)
+    return jsonify({
+        'resultados': [{'id': r[0], 'nombre': r[1], 'especialidad': r[2]} for r in resultados],
+        'hay_mas': hay_mas,
+    })
 
 # =====================================
 # DASHBOARD ADMIN
 # =====================================
 
-@app.route('/admin/dashboard')
+@rutas.route('/admin/dashboard')
 @login_required
 @role_required('admin')
+@mysql.en_replica
 def dashboard_admin():
-    cursor = mysql.connection.cursor()
+    # Estadísticas generales, precalculadas en estadisticas_diarias
+    # Se leen de la réplica; si hay que reconciliar, se escribe en la principal
+    # Las consultas de origen de la reconciliación van en paralelo; la que
+    # falle se muestra como '—' y se reintenta en la próxima visita
+    hoy = estadisticas.del_dia(mysql.lectura, obtener_escritura=lambda: mysql.connection)
     
-    # Estadísticas generales
-    cursor.execute("SELECT COUNT(*) FROM usuarios WHERE activo = TRUE")
-    total_usuarios = cursor.fetchone()[0]
+    return render_template('admin/dashboard.html', 
+                         total_usuarios=hoy.get(est.USUARIOS_ACTIVOS, '—'),
+                         citas_hoy=hoy.get(est.CITAS, '—'),
+                         consultas_hoy=hoy.get(est.CONSULTAS, '—'))
+
+@rutas.route('/admin/estadisticas', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+@mysql.en_replica
+def historial_estadisticas():
+    """
+    Contadores por día entre ?desde= y ?hasta= (YYYY-MM-DD), hasta hoy como
+    máximo; POST reconcilia ?fecha=. Los días pasados pendientes los completa
+    python estadisticas.py.
+    """
+    hoy = ahora(current_app.config['CLINICA_ZONA_HORARIA']).date()
+    try:
+        if request.method == 'POST':
+            fecha = date.fromisoformat(request.args.get('fecha', hoy.isoformat()))
+            if fecha > hoy:
+                return jsonify({'error': 'No se reconcilian días futuros'}), 400
+            return jsonify(estadisticas.reconciliar(mysql.connection, fecha))
+        hasta = date.fromisoformat(request.args.get('hasta', hoy.isoformat()))
+        desde = date.fromisoformat(request.args.get('desde', hasta.isoformat()))
+    except ValueError:
+        return jsonify({'error': 'Fecha inválida, usa YYYY-MM-DD'}), 400
+    if desde > hasta:
+        return jsonify({'error': 'desde debe ser anterior a hasta'}), 400
+    
+    dias = estadisticas.historial(mysql.lectura, desde, hasta,
+                                  obtener_escritura=lambda: mysql.connection)
+    return jsonify({fecha.isoformat(): valores for fecha, valores in dias.items()})
+
+@rutas.route('/admin/reportes')
+@login_required
+@role_required('admin')
+def reportes_admin():
+    """Uso de la clínica entre ?desde= y ?hasta= (YYYY-MM-DD), por defecto los últimos 12 meses"""
+    hoy = ahora(current_app.config['CLINICA_ZONA_HORARIA']).date()
+    try:
+        hasta = date.fromisoformat(request.args.get('hasta', hoy.isoformat()))
+        desde = (date.fromisoformat(request.args['desde']) if 'desde' in request.args
+                 else date(hasta.year - 1, hasta.month, 1))
+    except ValueError:
+        return jsonify({'error': 'Fecha inválida, usa YYYY-MM-DD'}), 400
+    if desde > hasta:
+        return jsonify({'error': 'desde debe ser anterior a hasta'}), 400
     
-    cursor.execute("SELECT COUNT(*) FROM citas WHERE DATE(fecha_hora) = CURDATE()")
-    citas_hoy = cursor.fetchone()[0]
+    # Sale de la instantánea en memoria, sin consultar las tablas de la BD
+    informe = reportes.informe(desde, hasta)
+    if informe is None:
+        mensaje = 'Todavía no hay datos para los reportes: ejecuta python reportes.py'
+        if request.args.get('formato') == 'json':
+            return jsonify({'error': mensaje}), 503
+        flash(mensaje, 'warning')
+    elif request.args.get('formato') == 'json':
+        return jsonify(informe)
+    return render_template('admin/reportes.html', informe=informe, desde=desde, hasta=hasta)
+
+@rutas.route('/admin/permisos/cache', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def cache_permisos_admin():
+    # POST fuerza la recarga de la matriz en todos los workers tras editar permisos
+    # directamente en la BD
+    if request.method == 'POST':
+        invalidar_permisos()
+        registrar_auditoria(session['usuario_id'], 'invalidar_cache', 'permisos')
+    return jsonify(cache_permisos.estadisticas())
+
+@rutas.route('/admin/bd/pool')
+@login_required
+@role_required('admin')
+def estado_pool():
+    return jsonify({**mysql.pool.metricas(), 'replicas': mysql.metricas_replicas(),
+                    'paralelo': mysql.metricas_paralelo()})
+
+@rutas.route('/admin/metricas')
+@login_required
+@role_required('admin')
+def metricas_prometheus():
+    texto = metricas.prometheus({
+        'clinica_pool_conexiones': mysql.pool.metricas(),
+        'clinica_mysql_paralelo': mysql.metricas_paralelo(),
+        'clinica_auditoria': escritor_auditoria.estadisticas(),
+        'clinica_cache_permisos': {k: int(v) for k, v in cache_permisos.estadisticas().items()},
+        'clinica_catalogos': catalogos.estadisticas(),
+        'clinica_cache_vistas': cache_vistas.estadisticas(),
+        'clinica_contrasenas': contrasenas.estadisticas(),
+    }) + contrasenas.prometheus()
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
+@rutas.route('/admin/auditoria/exportar')
+@login_required
+@role_required('admin')
+@mysql.en_replica
+def exportar_auditoria():
+    """
+    Registros entre ?desde= y ?hasta= (YYYY-MM-DD), ambos incluidos,
+    opcionalmente de un ?usuario_id= y/o ?modulo=. Incluye los meses ya
+    archivados fuera de la tabla.
+    """
+    hoy = ahora(current_app.config['CLINICA_ZONA_HORARIA']).date()
+    try:
+        hasta = date.fromisoformat(request.args.get('hasta', hoy.isoformat()))
+        desde = date.fromisoformat(request.args.get('desde', hasta.isoformat()))
+    except ValueError:
+        return jsonify({'error': 'Fecha inválida, usa YYYY-MM-DD'}), 400
+    if desde > hasta:
+        return jsonify({'error': 'desde debe ser anterior a hasta'}), 400
     
-    cursor.execute("SELECT COUNT(*) FROM historias_clinicas WHERE DATE(fecha_consulta) = CURDATE()")
-    consultas_hoy = cursor.fetchone()[0]
+    usuario_id = request.args.get('usuario_id', type=int)
+    modulo = request.args.get('modulo') or None
+    filtros, params = '', []
+    if usuario_id is not None:
+        filtros += ' AND a.usuario_id = %s'
+        params.append(usuario_id)
+    if modulo is not None:
+        filtros += ' AND a.modulo = %s'
+        params.append(modulo)
     
-    cursor.close()
+    # Lo anterior al último mes archivado sale de los archivos y el resto de la tabla
+    inicio, fin = ventana_rango(desde, hasta)
+    archivo = ArchivoAuditoria(current_app.config['AUDITORIA_ARCHIVO_DIR'])
+    manifiestos = archivo.manifiestos()
+    corte = archivo.fin(manifiestos)
+    archivadas = ()
+    if corte and inicio < corte:
+        archivadas = archivo.filas(inicio, min(fin, corte), usuario_id, modulo, manifiestos)
+        inicio = min(corte, fin)
     
-    return render_template('admin/dashboard.html', 
-                         total_usuarios=total_usuarios,
-                         citas_hoy=citas_hoy,
-                         consultas_hoy=consultas_hoy)
+    return respuesta_exportacion(f'auditoria_{desde.isoformat()}_{hasta.isoformat()}',
+                                 QUERY_EXPORTAR_AUDITORIA.format(filtros=filtros),
+                                 (inicio, fin, *params), archivadas, COLUMNAS_AUDITORIA,
+                                 auditoria=('exportar', 'auditoria', None,
+                                            f'{desde.isoformat()} a {hasta.isoformat()}'))
+
+@rutas.route('/admin/auditoria/estado')
+@login_required
+@role_required('admin')
+def estado_auditoria():
+    return jsonify(escritor_auditoria.estadisticas())
+
+# =====================================
+# ARRANQUE
+# =====================================
+
+def crear_app(config=None):
+    """
+    Crea la app: configuración por defecto (configuracion.py), luego el
+    archivo de CLINICA_CONFIG, las variables CLINICA_<CLAVE> y por último
+    `config`; inicia las extensiones y registra las rutas. Las cachés y el
+    escritor de auditoría son globales del módulo, así que cada proceso
+    atiende una sola app: llamarla otra vez la reemplaza.
+    """
+    global cache_permisos, cambios_identidad, catalogos, contrasenas, reportes
+    global agenda, agenda_hoy, conexiones_en_vivo, estadisticas, escritor_auditoria
+
+    app = Flask(__name__)
+    app.config.from_object(configuracion)
+    app.config.from_envvar('CLINICA_CONFIG', silent=True)
+    app.config.from_prefixed_env('CLINICA')
+    app.config.update(config or {})
+    app.config.setdefault('MYSQL_ZONA_HORARIA', app.config['CLINICA_ZONA_HORARIA'])
+
+    def reloj():
+        return ahora(app.config['CLINICA_ZONA_HORARIA'])
+
+    mysql.init_app(app)
+    recursos.init_app(app)
+    metricas.init_app(app)
+    cache_vistas.init_app(app)
+    cache_permisos = CachePermisos(ttl=app.config['PERMISOS_CACHE_TTL'])
+    cambios_identidad = RegistroCambios(intervalo=app.config['IDENTIDAD_REVISAR'])
+    catalogos = Catalogos(ttl=app.config['CATALOGOS_TTL'])
+    contrasenas = Contrasenas(app.config['CLAVES_METODO'], hilos=app.config['CLAVES_HILOS'],
+                              pendientes_max=app.config['CLAVES_PENDIENTES_MAX'],
+                              espera_max=app.config['CLAVES_ESPERA_MAX'])
+    reportes = Reportes(app.config['REPORTES_DIR'], reloj,
+                        hora_inicio=app.config['AGENDA_HORA_INICIO'],
+                        hora_fin=app.config['AGENDA_HORA_FIN'],
+                        dias_laborales=app.config['AGENDA_DIAS_LABORALES'],
+                        verificar_cada=app.config['REPORTES_VERIFICAR'])
+
+    agenda = Agenda(reloj,
+                    hora_inicio=app.config['AGENDA_HORA_INICIO'],
+                    hora_fin=app.config['AGENDA_HORA_FIN'],
+                    dias_laborales=app.config['AGENDA_DIAS_LABORALES'],
+                    duracion=app.config['AGENDA_DURACION'],
+                    horizonte_dias=app.config['AGENDA_HORIZONTE_DIAS'],
+                    ttl=app.config['AGENDA_TTL'])
+    agenda_hoy = AgendaDelDia(reloj, QUERY_CITAS_HOY, QUERY_CITAS_CAMBIADAS,
+                              lambda dia: ventana_dia(app.config['CLINICA_ZONA_HORARIA'], dia),
+                              ttl=app.config['AGENDA_EN_VIVO_TTL'],
+                              intervalo=app.config['AGENDA_EN_VIVO_INTERVALO'])
+    conexiones_en_vivo = threading.BoundedSemaphore(app.config['AGENDA_EN_VIVO_MAX'])
+
+    estadisticas = est.Estadisticas(reloj,
+                                    reconciliar_cada=app.config['ESTADISTICAS_RECONCILIAR'],
+                                    historial_max_dias=app.config['ESTADISTICAS_HISTORIAL_MAX_DIAS'],
+                                    paralelo=mysql.en_paralelo)
+
+    # El hilo de auditoría mantiene su propia conexión, fuera del contexto de Flask
+    if escritor_auditoria is not None:
+        escritor_auditoria.detener()
+    escritor_auditoria = EscritorAuditoria(mysql.pool, reloj,
+                                           capacidad=app.config['AUDITORIA_CAPACIDAD'],
+                                           tamano_lote=app.config['AUDITORIA_LOTE'],
+                                           intervalo=app.config['AUDITORIA_INTERVALO'],
+                                           desborde=app.config['AUDITORIA_DESBORDE'])
+
+    rutas.registrar(app)
+    return app
+
+def calentar(app):
+    """
+    Deja el proceso listo antes de aceptar tráfico: compila todas las
+    plantillas, abre el mínimo de conexiones y carga los datos de consulta
+    frecuente (permisos, roles, especialidades, cuentas modificadas, citas
+    de hoy) y la instantánea de reportes.
+    Las cargas van en paralelo. Devuelve los segundos de cada paso.
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    def paso(nombre):
+        nonlocal inicio
+        marca = time.perf_counter()
+        tiempos[nombre] = round(marca - inicio, 4)
+        inicio = marca
+
+    for nombre in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nombre)
+    paso('plantillas')
+
+    # Mapea la instantánea de reportes, si ya existe
+    reportes.instantanea()
+    paso('reportes')
+
+    mysql.pool.llenar()
+    paso('conexiones')
+
+    cargas = {'permisos': cache_permisos.cargar,
+              'catalogos': catalogos.cargar,
+              'identidad': cambios_identidad.cargar,
+              'agenda_hoy': agenda_hoy.cargar}
+    _, errores = mysql.en_paralelo(cargas, espera_max=app.config['CALENTAR_ESPERA'])
+    if errores:
+        raise next(iter(errores.values()))
+    paso('datos')
+    return tiempos
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Servidor de desarrollo; en producción: gunicorn -c gunicorn.conf.py wsgi:app
+    app = crear_app()
+    calentar(app)
+    app.run(debug=True)
@@ -0,0 +1,261 @@
+"""
+Particiones mensuales de la tabla auditoria y archivo de los meses fríos.
+
+La tabla se particiona por mes (database/auditoria.sql deja una sola
+partición p_futuro y asegurar_particiones() la divide en pAAAAMM). Los
+meses más antiguos que AUDITORIA_MESES_CALIENTES se copian a un archivo
+NDJSON comprimido de solo lectura con su manifiesto y la partición se
+elimina. El visor de auditoría lee primero los archivos y después la
+tabla, así que una consulta cubre ambos.
+
+Uso: python archivo_auditoria.py   # conviene correrlo a diario (cron)
+"""
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import date, datetime, time
+
+from MySQLdb.cursors import SSCursor
+
+PARTICION_FUTURO = 'p_futuro'
+
+# Mismas columnas y orden que QUERY_EXPORTAR_AUDITORIA en app.py
+COLUMNAS = ('id', 'fecha_accion', 'usuario_id', 'username', 'accion', 'modulo',
+            'registro_id', 'detalles', 'ip_address')
+
+QUERY_PARTICIONES = """
+    SELECT PARTITION_NAME
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'auditoria' AND PARTITION_NAME IS NOT NULL
+"""
+
+# Sin llave foránea el usuario pudo haberse borrado: LEFT JOIN
+QUERY_LEER_PARTICION = """
+    SELECT a.id, a.fecha_accion, a.usuario_id, u.username, a.accion, a.modulo,
+           a.registro_id, a.detalles, a.ip_address
+    FROM auditoria PARTITION ({particion}) a
+    LEFT JOIN usuarios u ON a.usuario_id = u.id
+    ORDER BY a.fecha_accion, a.id
+"""
+
+_NOMBRE = re.compile(r'^p(\d{4})(\d{2})$')
+_FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+
+def mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def sumar_meses(mes, meses):
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nombre_particion(mes):
+    return f'p{mes:%Y%m}'
+
+
+def mes_de(nombre):
+    """pAAAAMM -> date del primer día del mes; None para p_futuro"""
+    coincidencia = _NOMBRE.match(nombre)
+    return date(int(coincidencia[1]), int(coincidencia[2]), 1) if coincidencia else None
+
+
+def particiones(cursor):
+    """Meses con partición propia, en orden"""
+    cursor.execute(QUERY_PARTICIONES)
+    nombres = [fila[0] for fila in cursor.fetchall()]
+    if PARTICION_FUTURO not in nombres:
+        raise RuntimeError('auditoria no está particionada: aplica database/auditoria.sql')
+    return sorted(filter(None, map(mes_de, nombres)))
+
+
+def asegurar_particiones(conexion, hoy, meses_adelante=3):
+    """
+    Divide p_futuro en particiones mensuales hasta `meses_adelante` meses
+    después de `hoy`. La primera vez empieza por el mes de la fila más
+    antigua, así que también reparte los datos existentes.
+    Devuelve los nombres de las particiones creadas.
+    """
+    cursor = conexion.cursor()
+    meses = particiones(cursor)
+    if meses:
+        desde = mes_siguiente(meses[-1])
+    else:
+        cursor.execute("SELECT MIN(fecha_accion) FROM auditoria")
+        minimo = cursor.fetchone()[0] or hoy
+        desde = date(minimo.year, minimo.month, 1)
+
+    nuevos = []
+    mes = desde
+    while mes <= sumar_meses(hoy, meses_adelante):
+        nuevos.append(mes)
+        mes = mes_siguiente(mes)
+    if nuevos:
+        # Los límites son constantes: MySQL los evalúa con la zona horaria de esta sesión
+        definiciones = ', '.join(
+            f"PARTITION {nombre_particion(m)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{mes_siguiente(m).isoformat()} 00:00:00'))"
+            for m in nuevos
+        )
+        cursor.execute(f"""
+            ALTER TABLE auditoria REORGANIZE PARTITION {PARTICION_FUTURO} INTO (
+                {definiciones}, PARTITION {PARTICION_FUTURO} VALUES LESS THAN MAXVALUE
+            )
+        """)
+    cursor.close()
+    return [nombre_particion(m) for m in nuevos]
+
+
+def archivar(conexion, directorio, hoy, meses_calientes=6, tamano_lote=1000):
+    """Archiva y elimina las particiones anteriores a `meses_calientes` meses; devuelve los meses"""
+    corte = sumar_meses(hoy, -meses_calientes)
+    cursor = conexion.cursor()
+    frios = [mes for mes in particiones(cursor) if mes < corte]
+    cursor.close()
+    os.makedirs(directorio, exist_ok=True)
+    for mes in frios:
+        archivar_mes(conexion, directorio, mes, tamano_lote)
+    return frios
+
+
+def archivar_mes(conexion, directorio, mes, tamano_lote=1000):
+    """
+    Copia la partición del mes a auditoria_AAAA-MM.ndjson.gz, escribe el
+    manifiesto y solo entonces elimina la partición. Si el proceso se
+    interrumpe se puede repetir: el visor no lee de la tabla los meses que
+    ya tienen manifiesto.
+    """
+    particion = nombre_particion(mes)
+    ruta = ruta_mes(directorio, mes)
+    manifiesto = ruta_manifiesto(directorio, mes)
+
+    if not os.path.exists(manifiesto):
+        resumen = {'mes': f'{mes:%Y-%m}', 'columnas': COLUMNAS, 'filas': 0,
+                   'usuario_min': None, 'usuario_max': None, 'modulos': set()}
+        temporal = ruta + '.tmp'
+        cursor = conexion.cursor(SSCursor)
+        cursor.execute(QUERY_LEER_PARTICION.format(particion=particion))
+        with gzip.open(temporal, 'wt', encoding='utf-8') as archivo:
+            while True:
+                filas = cursor.fetchmany(tamano_lote)
+                if not filas:
+                    break
+                for fila in filas:
+                    archivo.write(json.dumps(fila, default=str, ensure_ascii=False))
+                    archivo.write('\n')
+                    _resumir(resumen, fila)
+        cursor.close()
+
+        cursor = conexion.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM auditoria PARTITION ({particion})")
+        en_tabla = cursor.fetchone()[0]
+        cursor.close()
+        if en_tabla != resumen['filas']:
+            os.remove(temporal)
+            raise RuntimeError(f'{particion}: se copiaron {resumen["filas"]} de {en_tabla} filas')
+
+        os.replace(temporal, ruta)
+        os.chmod(ruta, 0o444)
+        resumen['sha256'] = _sha256(ruta)
+        resumen['modulos'] = sorted(resumen['modulos'])
+        with open(manifiesto + '.tmp', 'w', encoding='utf-8') as archivo:
+            json.dump(resumen, archivo, ensure_ascii=False, indent=2)
+        os.replace(manifiesto + '.tmp', manifiesto)
+        os.chmod(manifiesto, 0o444)
+
+    cursor = conexion.cursor()
+    cursor.execute(f"ALTER TABLE auditoria DROP PARTITION {particion}")
+    cursor.close()
+
+
+def _resumir(resumen, fila):
+    usuario_id = fila[2]
+    resumen['filas'] += 1
+    resumen['modulos'].add(fila[5])
+    if resumen['usuario_min'] is None or usuario_id < resumen['usuario_min']:
+        resumen['usuario_min'] = usuario_id
+    if resumen['usuario_max'] is None or usuario_id > resumen['usuario_max']:
+        resumen['usuario_max'] = usuario_id
+
+
+def _sha256(ruta):
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def ruta_mes(directorio, mes):
+    return os.path.join(directorio, f'auditoria_{mes:%Y-%m}.ndjson.gz')
+
+
+def ruta_manifiesto(directorio, mes):
+    return os.path.join(directorio, f'auditoria_{mes:%Y-%m}.json')
+
+
+class ArchivoAuditoria:
+    """Consulta de los meses archivados en `directorio`"""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+
+    def manifiestos(self):
+        """Manifiestos de los meses archivados, del más antiguo al más reciente"""
+        resultado = []
+        for ruta in sorted(glob.glob(os.path.join(self.directorio, 'auditoria_*.json'))):
+            with open(ruta, encoding='utf-8') as archivo:
+                resultado.append(json.load(archivo))
+        return resultado
+
+    def fin(self, manifiestos=None):
+        """Primer instante que ya no está archivado (lo siguiente está en la tabla), o None"""
+        manifiestos = self.manifiestos() if manifiestos is None else manifiestos
+        if not manifiestos:
+            return None
+        ultimo = datetime.strptime(manifiestos[-1]['mes'], '%Y-%m').date()
+        return datetime.combine(mes_siguiente(ultimo), time.min)
+
+    def filas(self, desde, hasta, usuario_id=None, modulo=None, manifiestos=None):
+        """
+        Filas archivadas en [desde, hasta) con los filtros opcionales, en
+        orden de fecha. Solo se abren los meses que pueden contenerlas.
+        """
+        manifiestos = self.manifiestos() if manifiestos is None else manifiestos
+        inicio, fin = desde.strftime(_FORMATO_FECHA), hasta.strftime(_FORMATO_FECHA)
+        for manifiesto in manifiestos:
+            mes = datetime.strptime(manifiesto['mes'], '%Y-%m').date()
+            if (not manifiesto['filas'] or
+                    datetime.combine(mes_siguiente(mes), time.min) <= desde or
+                    datetime.combine(mes, time.min) >= hasta or
+                    (modulo is not None and modulo not in manifiesto['modulos']) or
+                    (usuario_id is not None and not
+                     manifiesto['usuario_min'] <= usuario_id <= manifiesto['usuario_max'])):
+                continue
+            with gzip.open(ruta_mes(self.directorio, mes), 'rt', encoding='utf-8') as archivo:
+                for linea in archivo:
+                    fila = json.loads(linea)
+                    if fila[1] < inicio:
+                        continue
+                    if fila[1] >= fin:
+                        break
+                    if ((usuario_id is None or fila[2] == usuario_id) and
+                            (modulo is None or fila[5] == modulo)):
+                        yield fila
+
+
+if __name__ == '__main__':
+    from app import crear_app, mysql, ahora
+
+    app = crear_app()
+
+    with app.app_context():
+        hoy = ahora(app.config['CLINICA_ZONA_HORARIA']).date()
+        creadas = asegurar_particiones(mysql.connection, hoy, app.config['AUDITORIA_MESES_ADELANTE'])
+        archivados = archivar(mysql.connection, app.config['AUDITORIA_ARCHIVO_DIR'], hoy,
+                              app.config['AUDITORIA_MESES_CALIENTES'])
+        print(f"🗂️  {len(creadas)} particiones nuevas, {len(archivados)} meses archivados")
@@ -0,0 +1,180 @@
+"""
+Escritura de la tabla auditoria en segundo plano y por lotes
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# fecha_accion va explícita: es la hora del registro y no la de escritura del lote,
+# que puede caer en otro mes (otra partición) si la cola se atrasa
+QUERY_INSERTAR = """
+    INSERT INTO auditoria (usuario_id, accion, modulo, registro_id, detalles, ip_address, fecha_accion)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Qué hacer cuando la cola está llena
+DESBORDE_BLOQUEAR = 'bloquear'    # esperar hasta `espera_desborde` y luego escribir en línea
+DESBORDE_DESCARTAR = 'descartar'  # perder la fila y contarla
+DESBORDE_SINCRONO = 'sincrono'    # escribir en línea de inmediato
+
+
+class EscritorAuditoria:
+    """
+    Cola acotada en memoria vaciada por un hilo que inserta filas
+    de auditoría en lotes multi-fila, al llenarse el lote o al
+    cumplirse el intervalo, lo que ocurra primero.
+
+    El hilo mantiene su propia conexión, abierta con la fábrica de `pool`;
+    las escrituras en línea por desborde usan una conexión del pool. `reloj`
+    da la hora de la clínica con la que se fecha cada fila al registrarla.
+    Las filas que no se pueden escribir se registran completas en el log.
+    """
+
+    def __init__(self, pool, reloj, capacidad=10000, tamano_lote=100, intervalo=1.0,
+                 desborde=DESBORDE_BLOQUEAR, espera_desborde=0.5):
+        self.pool = pool
+        self.reloj = reloj
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.desborde = desborde
+        self.espera_desborde = espera_desborde
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.encoladas = 0
+        self.escritas = 0
+        self.descartadas = 0
+        self.en_linea = 0
+        self.lotes = 0
+        self.fallidas = 0
+        self._conexion = None
+        self._hilo = None
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        """Arranca el hilo escritor; se llama solo en el primer registro"""
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._ciclo, name='auditoria', daemon=True)
+            self._hilo.start()
+            atexit.register(self.detener)
+
+    def fila(self, usuario_id, accion, modulo, registro_id=None, detalles=None, ip=None):
+        """Fila para QUERY_INSERTAR con la hora actual (sin microsegundos, como la guarda MySQL)"""
+        return (usuario_id, accion, modulo, registro_id, detalles, ip,
+                self.reloj().replace(microsecond=0))
+
+    def registrar(self, fila):
+        """Encola una fila armada con fila()"""
+        self.iniciar()
+        try:
+            if self.desborde == DESBORDE_BLOQUEAR:
+                self.cola.put(fila, timeout=self.espera_desborde)
+            else:
+                self.cola.put_nowait(fila)
+            self.encoladas += 1
+        except queue.Full:
+            if self.desborde == DESBORDE_DESCARTAR:
+                self.descartadas += 1
+                logger.warning('Cola de auditoría llena, fila descartada: %s', _json(fila))
+            else:
+                self.en_linea += 1
+                self._escribir_en_linea(fila)
+
+    def _escribir_en_linea(self, fila):
+        try:
+            conexion = self.pool.obtener()
+        except Exception:
+            logger.exception('Sin conexión para escribir la auditoría en línea')
+            self._perder([fila])
+            return
+        descartar = not self._escribir([fila], conexion=conexion)
+        self.pool.devolver(conexion, descartar=descartar)
+
+    def detener(self, timeout=10):
+        """Vacía la cola y detiene el hilo; se registra con atexit"""
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join(timeout)
+        self._hilo = None
+        self._detener.clear()
+
+    def _ciclo(self):
+        while not self._detener.is_set() or not self.cola.empty():
+            lote = self._tomar_lote()
+            if lote:
+                self._escribir(lote)
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+
+    def _tomar_lote(self):
+        """Espera la primera fila y acumula hasta tamano_lote o intervalo"""
+        lote = []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamano_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self, lote, conexion=None):
+        """Inserta el lote; devuelve False si no se pudo escribir"""
+        propia = conexion is not None
+        for intento in range(2):
+            try:
+                if not propia and self._conexion is None:
+                    self._conexion = self.pool.conectar()
+                destino = conexion if propia else self._conexion
+                cursor = destino.cursor()
+                # executemany agrupa los VALUES en un único INSERT multi-fila
+                cursor.executemany(QUERY_INSERTAR, lote)
+                destino.commit()
+                cursor.close()
+                self.escritas += len(lote)
+                self.lotes += 1
+                return True
+            except Exception:
+                logger.exception('Error escribiendo %d filas de auditoría', len(lote))
+                if propia or intento == 1:
+                    self._perder(lote)
+                    return False
+                # Reintentar una vez con una conexión nueva
+                try:
+                    self._conexion.close()
+                except Exception:
+                    pass
+                self._conexion = None
+        return False
+
+    def _perder(self, lote):
+        """Deja en el log las filas que no llegaron a la tabla, para poder recuperarlas"""
+        self.fallidas += len(lote)
+        for fila in lote:
+            logger.error('Fila de auditoría no escrita: %s', _json(fila))
+
+    def estadisticas(self):
+        return {
+            'pendientes': self.cola.qsize(),
+            'encoladas': self.encoladas,
+            'escritas': self.escritas,
+            'lotes': self.lotes,
+            'descartadas': self.descartadas,
+            'en_linea': self.en_linea,
+            'fallidas': self.fallidas,
+        }
+
+
+def _json(fila):
+    return json.dumps(dict(zip(('usuario_id', 'accion', 'modulo', 'registro_id', 'detalles',
+                                'ip_address', 'fecha_accion'), fila)), default=str)
@@ -0,0 +1,502 @@
+"""
+Benchmark HTTP reproducible de ClinicaVital.
+
+Levanta un MySQL/MariaDB local en un directorio temporal (o usa uno
+existente con --host), crea el esquema, lo llena con datos del tamaño
+indicado, arranca la app en un servidor WSGI local y genera tráfico
+concurrente mezclando los cuatro roles. Escribe un reporte JSON con
+latencias (p50/p90/p99) y throughput por ruta y, si se indica --base,
+lo compara con un reporte guardado y falla ante regresiones.
+
+Uso:
+    python benchmark.py --pacientes 5000 --doctores 50 --citas 50000 --duracion 60
+    python benchmark.py --guardar-base benchmark_base.json
+    python benchmark.py --base benchmark_base.json --tolerancia 0.2
+    python benchmark.py --replica    # primaria + réplica local, lecturas en la réplica
+    python benchmark.py --simulada   # sin MySQL, solo para probar el arnés
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import MySQLdb
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from archivo_auditoria import asegurar_particiones
+from busqueda_clinica import reconstruir as indexar_historias
+from crear_usuarios_prueba import CLAVE_SINTETICA, crear_demo, generar
+from indice_nombres import reconstruir as indexar_nombres
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+ARCHIVOS_ESQUEMA = ('database.sql', 'indices.sql', 'estadisticas.sql', 'busqueda.sql', 'auditoria.sql',
+                    'sincronizacion.sql')
+
+# Peso de cada rol en el tráfico y acciones (etiqueta, método, ruta, peso) por rol
+MEZCLA_ROLES = {'paciente': 0.40, 'doctor': 0.30, 'secretaria': 0.25, 'admin': 0.05}
+ACCIONES = {
+    'doctor': [
+        ('dashboard_doctor', 'GET', '/doctor/dashboard', 5),
+        ('historias_clinicas', 'GET', '/doctor/historias-clinicas', 3),
+        ('buscar_historias', 'GET', '/doctor/historias-clinicas/buscar?q=dolor', 2),
+        ('crear_historia_clinica', 'POST', '/doctor/historia-clinica/crear/{paciente_id}', 1),
+        ('crear_receta', 'POST', '/doctor/receta/crear/{paciente_id}', 1),
+    ],
+    'paciente': [
+        ('dashboard_paciente', 'GET', '/paciente/dashboard', 5),
+        ('mi_historia_clinica', 'GET', '/paciente/mi-historia', 3),
+        ('mis_recetas', 'GET', '/paciente/mis-recetas', 2),
+    ],
+    'secretaria': [
+        ('dashboard_secretaria', 'GET', '/secretaria/dashboard', 5),
+        ('crear_cita_form', 'GET', '/secretaria/cita/crear', 1),
+        ('crear_cita', 'POST', '/secretaria/cita/crear', 2),
+        ('buscar_pacientes', 'GET', '/api/pacientes/buscar?q=ana', 2),
+    ],
+    'admin': [
+        ('dashboard_admin', 'GET', '/admin/dashboard', 1),
+    ],
+}
+
+
+# =====================================
+# BASE DE DATOS LOCAL
+# =====================================
+
+class MySQLLocal:
+    """Instancia desechable de mysqld/mariadbd en un directorio temporal"""
+
+    def __init__(self, conservar=False, opciones=()):
+        self.directorio = tempfile.mkdtemp(prefix='clinica_bench_')
+        self.opciones = list(opciones)
+        self.socket = os.path.join(self.directorio, 'mysql.sock')
+        self.puerto = puerto_libre()
+        self.conservar = conservar
+        self.proceso = None
+        self.replica = None
+
+    def iniciar(self):
+        datos = os.path.join(self.directorio, 'datos')
+        servidor = shutil.which('mariadbd') or shutil.which('mysqld')
+        if not servidor:
+            raise RuntimeError('No se encontró mysqld ni mariadbd en el PATH')
+
+        instalador = shutil.which('mariadb-install-db') or shutil.which('mysql_install_db')
+        if instalador:
+            subprocess.run([instalador, f'--datadir={datos}', '--auth-root-authentication-method=normal',
+                            '--skip-test-db'], check=True, capture_output=True)
+        else:
+            subprocess.run([servidor, '--initialize-insecure', f'--datadir={datos}'],
+                           check=True, capture_output=True)
+
+        self.proceso = subprocess.Popen([
+            servidor, '--no-defaults', f'--datadir={datos}', f'--socket={self.socket}',
+            f'--port={self.puerto}', '--bind-address=127.0.0.1',
+            f'--pid-file={os.path.join(self.directorio, "mysqld.pid")}',
+            '--innodb-buffer-pool-size=256M', '--max-connections=500', *self.opciones,
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        limite = time.monotonic() + 60
+        while time.monotonic() < limite:
+            try:
+                MySQLdb.connect(unix_socket=self.socket, user='root').close()
+                return
+            except MySQLdb.Error:
+                time.sleep(0.5)
+        raise RuntimeError('El servidor MySQL local no respondió en 60 segundos')
+
+    def config(self):
+        return {'MYSQL_HOST': 'localhost', 'MYSQL_USER': 'root', 'MYSQL_PASSWORD': '',
+                'MYSQL_UNIX_SOCKET': self.socket}
+
+    def detener(self):
+        if self.replica:
+            self.replica.detener()
+        if self.proceso:
+            self.proceso.terminate()
+            self.proceso.wait(30)
+        if not self.conservar:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+
+
+def replicar(primaria, replica):
+    """Configura `replica` para replicar desde `primaria` (ambas recién creadas y vacías)"""
+    conexion = MySQLdb.connect(unix_socket=primaria.socket, user='root')
+    cursor = conexion.cursor()
+    cursor.execute("CREATE USER 'replicacion'@'%' IDENTIFIED BY 'replicacion'")
+    cursor.execute("GRANT REPLICATION SLAVE ON *.* TO 'replicacion'@'%'")
+    conexion.close()
+
+    conexion = MySQLdb.connect(unix_socket=replica.socket, user='root')
+    cursor = conexion.cursor()
+    try:
+        # MySQL 8.0.23+
+        cursor.execute(f"""
+            CHANGE REPLICATION SOURCE TO SOURCE_HOST='127.0.0.1', SOURCE_PORT={primaria.puerto},
+            SOURCE_USER='replicacion', SOURCE_PASSWORD='replicacion', GET_SOURCE_PUBLIC_KEY=1
+        """)
+        cursor.execute("START REPLICA")
+    except MySQLdb.Error:
+        # MariaDB y MySQL anteriores
+        cursor.execute(f"""
+            CHANGE MASTER TO MASTER_HOST='127.0.0.1', MASTER_PORT={primaria.puerto},
+            MASTER_USER='replicacion', MASTER_PASSWORD='replicacion'
+        """)
+        cursor.execute("START SLAVE")
+    conexion.close()
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def conectar(config, db=None):
+    extra = {'unix_socket': config['MYSQL_UNIX_SOCKET']} if config.get('MYSQL_UNIX_SOCKET') else {}
+    if config.get('MYSQL_PORT'):
+        extra['port'] = config['MYSQL_PORT']
+    if db:
+        extra['db'] = db
+    return MySQLdb.connect(host=config['MYSQL_HOST'], user=config['MYSQL_USER'],
+                           passwd=config['MYSQL_PASSWORD'], charset='utf8mb4', **extra)
+
+
+def crear_esquema(config, nombre_db):
+    """Crea la base desde cero y aplica los archivos SQL de database/"""
+    conexion = conectar(config)
+    cursor = conexion.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{nombre_db}`")
+    cursor.execute(f"CREATE DATABASE `{nombre_db}` CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci")
+    cursor.execute(f"USE `{nombre_db}`")
+    for archivo in ARCHIVOS_ESQUEMA:
+        with open(os.path.join(DIRECTORIO, 'database', archivo), encoding='utf-8') as f:
+            lineas = [l for l in f.read().splitlines() if not l.strip().startswith('--')]
+        for sentencia in '\n'.join(lineas).split(';'):
+            if sentencia.strip():
+                cursor.execute(sentencia)
+    conexion.commit()
+    cursor.close()
+    conexion.close()
+
+
+def sembrar(config, nombre_db, args):
+    """Usuarios de demostración más el volumen sintético pedido"""
+    conexion = conectar(config, nombre_db)
+    crear_demo(conexion.cursor())
+    conexion.commit()
+    generar(conexion, doctores=args.doctores, secretarias=args.secretarias,
+            pacientes=args.pacientes, citas=args.citas, historias=args.historias,
+            recetas=args.recetas, semilla=args.semilla)
+    indexar_historias(conexion)
+    indexar_nombres(conexion)
+    asegurar_particiones(conexion, datetime.now().date())
+    conexion.close()
+
+
+# =====================================
+# CARGA
+# =====================================
+
+class Cliente:
+    """Sesión HTTP de un usuario virtual; no sigue redirecciones"""
+
+    def __init__(self, puerto):
+        self.puerto = puerto
+        self.cookie = None
+        self.redireccion = None
+
+    def pedir(self, metodo, ruta, datos=None):
+        conexion = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=30)
+        cabeceras = {'Cookie': self.cookie} if self.cookie else {}
+        cuerpo = None
+        if datos is not None:
+            cuerpo = urlencode(datos, doseq=True)
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            conexion.request(metodo, ruta, cuerpo, cabeceras)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            self.redireccion = respuesta.getheader('Location')
+            galleta = respuesta.getheader('Set-Cookie')
+            if galleta:
+                self.cookie = galleta.split(';', 1)[0]
+            return respuesta.status
+        finally:
+            conexion.close()
+
+
+class Mediciones:
+    def __init__(self):
+        self.latencias = {}
+        self.errores = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, etiqueta, segundos, ok):
+        with self._lock:
+            self.latencias.setdefault(etiqueta, []).append(segundos)
+            if not ok:
+                self.errores[etiqueta] = self.errores.get(etiqueta, 0) + 1
+
+
+def datos_post(etiqueta, rnd, args):
+    if etiqueta == 'crear_cita':
+        inicio = datetime.now() + timedelta(days=rnd.randint(1, 60))
+        return {'paciente_id': rnd.randint(1, args.pacientes), 'doctor_id': rnd.randint(1, args.doctores),
+                'fecha_hora': inicio.replace(hour=rnd.randint(8, 17), minute=rnd.choice((0, 30))).strftime('%Y-%m-%dT%H:%M'),
+                'motivo': 'Control'}
+    if etiqueta == 'crear_historia_clinica':
+        return {'motivo': 'Control', 'sintomas': 'Ninguno', 'diagnostico': 'Sano',
+                'observaciones': '', 'presion': '120/80', 'temperatura': '36.5',
+                'peso': '70', 'altura': '170'}
+    if etiqueta == 'crear_receta':
+        return {'instrucciones': 'Tomar con agua', 'fecha_vencimiento': '',
+                'medicamento[]': ['Acetaminofén'], 'dosis[]': ['500 mg'],
+                'frecuencia[]': ['Cada 8 horas'], 'duracion[]': ['5 días']}
+    return None
+
+
+def usuario_virtual(indice, puerto, args, mediciones, medir, detener):
+    rnd = random.Random(args.semilla * 1000 + indice)
+    roles, pesos = zip(*MEZCLA_ROLES.items())
+    while not detener.is_set():
+        rol = rnd.choices(roles, pesos)[0]
+        if rol == 'admin':
+            credenciales = {'username': 'admin', 'password': 'admin123'}
+        else:
+            cantidad = {'secretaria': args.secretarias, 'doctor': args.doctores,
+                        'paciente': args.pacientes}[rol]
+            credenciales = {'username': f'{rol}{rnd.randint(1, cantidad)}', 'password': CLAVE_SINTETICA}
+        cliente = Cliente(puerto)
+        inicio = time.perf_counter()
+        estado = cliente.pedir('POST', '/login', credenciales)
+        if medir.is_set():
+            exito = estado == 302 and not (cliente.redireccion or '').endswith('/login')
+            mediciones.registrar('login', time.perf_counter() - inicio, exito)
+
+        acciones = ACCIONES[rol]
+        for _ in range(args.peticiones_por_sesion):
+            if detener.is_set():
+                break
+            etiqueta, metodo, ruta, _ = rnd.choices(acciones, [a[3] for a in acciones])[0]
+            ruta = ruta.format(paciente_id=rnd.randint(1, args.pacientes))
+            inicio = time.perf_counter()
+            estado = cliente.pedir(metodo, ruta, datos_post(etiqueta, rnd, args))
+            if medir.is_set():
+                mediciones.registrar(etiqueta, time.perf_counter() - inicio, estado < 400)
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    k = (len(ordenados) - 1) * p
+    bajo = int(k)
+    alto = min(bajo + 1, len(ordenados) - 1)
+    return ordenados[bajo] + (ordenados[alto] - ordenados[bajo]) * (k - bajo)
+
+
+def reporte(mediciones, args, duracion):
+    rutas = {}
+    for etiqueta, valores in sorted(mediciones.latencias.items()):
+        valores.sort()
+        rutas[etiqueta] = {
+            'peticiones': len(valores),
+            'errores': mediciones.errores.get(etiqueta, 0),
+            'rps': round(len(valores) / duracion, 2),
+            'media_ms': round(sum(valores) / len(valores) * 1000, 2),
+            'p50_ms': round(percentil(valores, 0.50) * 1000, 2),
+            'p90_ms': round(percentil(valores, 0.90) * 1000, 2),
+            'p99_ms': round(percentil(valores, 0.99) * 1000, 2),
+            'max_ms': round(valores[-1] * 1000, 2),
+        }
+    total = sum(r['peticiones'] for r in rutas.values())
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'maquina': {'python': platform.python_version(), 'cpus': os.cpu_count(),
+                    'sistema': platform.platform()},
+        'parametros': {k: getattr(args, k) for k in (
+            'pacientes', 'doctores', 'secretarias', 'citas', 'historias', 'recetas', 'concurrencia',
+            'duracion', 'calentamiento', 'peticiones_por_sesion', 'semilla', 'simulada', 'replica')},
+        'total': {'peticiones': total, 'rps': round(total / duracion, 2)},
+        'rutas': rutas,
+    }
+
+
+def comparar(actual, base, tolerancia):
+    """Devuelve la lista de regresiones de p99 o throughput frente a la base"""
+    regresiones = []
+    for etiqueta, medida in actual['rutas'].items():
+        anterior = base['rutas'].get(etiqueta)
+        if not anterior:
+            continue
+        if medida['p99_ms'] > anterior['p99_ms'] * (1 + tolerancia):
+            regresiones.append(f"{etiqueta}: p99 {anterior['p99_ms']} -> {medida['p99_ms']} ms")
+        if medida['rps'] < anterior['rps'] * (1 - tolerancia):
+            regresiones.append(f"{etiqueta}: rps {anterior['rps']} -> {medida['rps']}")
+        if medida['errores'] > anterior['errores']:
+            regresiones.append(f"{etiqueta}: errores {anterior['errores']} -> {medida['errores']}")
+    return regresiones
+
+
+# =====================================
+# PRINCIPAL
+# =====================================
+
+def argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pacientes', type=int, default=2000)
+    parser.add_argument('--doctores', type=int, default=40)
+    parser.add_argument('--secretarias', type=int, default=5)
+    parser.add_argument('--citas', type=int, default=20000)
+    parser.add_argument('--historias', type=int, default=20000)
+    parser.add_argument('--recetas', type=int, default=10000)
+    parser.add_argument('--concurrencia', type=int, default=16)
+    parser.add_argument('--duracion', type=float, default=30, help='segundos medidos')
+    parser.add_argument('--calentamiento', type=float, default=5, help='segundos sin medir')
+    parser.add_argument('--peticiones-por-sesion', type=int, default=20)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', default='benchmark_resultado.json')
+    parser.add_argument('--base', help='reporte previo contra el cual comparar')
+    parser.add_argument('--guardar-base', help='guarda el reporte también como base')
+    parser.add_argument('--tolerancia', type=float, default=0.2)
+    parser.add_argument('--host', help='usar un MySQL existente en vez de levantar uno')
+    parser.add_argument('--puerto-mysql', type=int, default=3306)
+    parser.add_argument('--usuario', default='root')
+    parser.add_argument('--clave', default='')
+    parser.add_argument('--conservar', action='store_true', help='no borrar la BD temporal')
+    parser.add_argument('--replica', action='store_true',
+                        help='levantar también una réplica local y leer de ella en las vistas en_replica')
+    parser.add_argument('--simulada', action='store_true',
+                        help='usar la BD simulada en memoria (prueba el arnés, no mide MySQL)')
+    return parser.parse_args()
+
+
+def preparar_app(args):
+    """Devuelve (módulo app, app, servidor_mysql) ya apuntando a la base de benchmark"""
+    import app as aplicacion
+    import configuracion
+
+    servidor = None
+    bd = None
+    nombre_db = 'clinica_vital_bench'
+    # Una conexión por cliente más las de las lecturas en paralelo
+    config = {'MYSQL_POOL_MAX': max(args.concurrencia + configuracion.MYSQL_PARALELO_HILOS,
+                                    configuracion.MYSQL_POOL_MAX)}
+    if args.simulada:
+        from verificar_presupuestos import base_simulada
+        bd = base_simulada()
+        hashes = {'admin': generate_password_hash('admin123'),
+                  None: generate_password_hash(CLAVE_SINTETICA)}
+        roles = {'admin': 1, 'doctor': 2, 'secretaria': 3, 'paciente': 4}
+
+        def identidad(query, params):
+            rol = params[0].rstrip('0123456789')
+            return [(1, params[0], hashes.get(params[0], hashes[None]), roles[rol], 'Usuario Simulado', rol, 1, 1,
+                     time.time())]
+        bd.agregar_regla(r'FROM usuarios u\s+JOIN roles', identidad)
+    else:
+        if args.host:
+            conexion = {'MYSQL_HOST': args.host, 'MYSQL_USER': args.usuario,
+                        'MYSQL_PASSWORD': args.clave, 'MYSQL_PORT': args.puerto_mysql}
+        else:
+            opciones = ['--server-id=1', '--log-bin=binlog'] if args.replica else []
+            servidor = MySQLLocal(args.conservar, opciones)
+            print(f"🗄️  Levantando MySQL local en {servidor.directorio}...")
+            servidor.iniciar()
+            conexion = servidor.config()
+            if args.replica:
+                replica = MySQLLocal(args.conservar, ['--server-id=2', '--read-only'])
+                print(f"🗄️  Levantando réplica en {replica.directorio}...")
+                replica.iniciar()
+                replicar(servidor, replica)
+                servidor.replica = replica
+        print("📐 Creando esquema...")
+        crear_esquema(conexion, nombre_db)
+        print("🌱 Sembrando datos...")
+        inicio = time.perf_counter()
+        sembrar(conexion, nombre_db, args)
+        print(f"   listo en {time.perf_counter() - inicio:.1f}s")
+        config.update(conexion, MYSQL_DB=nombre_db)
+        if servidor and servidor.replica:
+            config['MYSQL_REPLICAS'] = [{'unix_socket': servidor.replica.socket}]
+
+    app = aplicacion.crear_app(config)
+    if bd is not None:
+        aplicacion.mysql.pool.conectar = bd.conectar
+    return aplicacion, app, servidor
+
+
+def main():
+    args = argumentos()
+    aplicacion, app, servidor_mysql = preparar_app(args)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    puerto = puerto_libre()
+    servidor = make_server('127.0.0.1', puerto, app, threaded=True)
+    hilo_servidor = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo_servidor.start()
+
+    try:
+        mediciones = Mediciones()
+        medir = threading.Event()
+        detener = threading.Event()
+        hilos = [threading.Thread(target=usuario_virtual,
+                                  args=(i, puerto, args, mediciones, medir, detener), daemon=True)
+                 for i in range(args.concurrencia)]
+        print(f"🚦 {args.concurrencia} usuarios virtuales, {args.calentamiento}s de calentamiento "
+              f"y {args.duracion}s medidos...")
+        for hilo in hilos:
+            hilo.start()
+        time.sleep(args.calentamiento)
+        medir.set()
+        inicio = time.perf_counter()
+        time.sleep(args.duracion)
+        medir.clear()
+        duracion = time.perf_counter() - inicio
+        detener.set()
+        for hilo in hilos:
+            hilo.join(30)
+    finally:
+        servidor.shutdown()
+        aplicacion.escritor_auditoria.detener()
+        if servidor_mysql:
+            servidor_mysql.detener()
+
+    resultado = reporte(mediciones, args, duracion)
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    if args.guardar_base:
+        shutil.copyfile(args.salida, args.guardar_base)
+
+    print(f"\n{'ruta':<26}{'pet.':>8}{'rps':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'err':>6}")
+    for etiqueta, r in resultado['rutas'].items():
+        print(f"{etiqueta:<26}{r['peticiones']:>8}{r['rps']:>9}{r['p50_ms']:>9}"
+              f"{r['p90_ms']:>9}{r['p99_ms']:>9}{r['errores']:>6}")
+    print(f"📄 Reporte: {args.salida}")
+
+    if args.base:
+        with open(args.base, encoding='utf-8') as f:
+            regresiones = comparar(resultado, json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"\n❌ Regresiones frente a {args.base}:")
+            for linea in regresiones:
+                print(f"   {linea}")
+            return 1
+        print(f"\n✅ Sin regresiones frente a {args.base} (tolerancia {args.tolerancia:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
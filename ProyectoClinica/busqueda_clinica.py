@@ -0,0 +1,224 @@
+"""
+Búsqueda de texto en historias clínicas con índice invertido en MySQL.
+
+Cada historia se parte en términos (minúsculas, sin acentos ni palabras
+vacías, reducidos a su raíz) que se guardan en historias_terminos con un
+peso según el campo donde aparecen. crear_historia_clinica indexa en la
+misma transacción en que inserta; para datos cargados por fuera:
+
+Uso: python busqueda_clinica.py   # reconstruye el índice completo
+"""
+import math
+import re
+
+from indice_nombres import normalizar
+
+# Columna de historias_clinicas -> peso de un término que aparece en ella
+CAMPOS = {
+    'diagnostico': 4,
+    'motivo_consulta': 3,
+    'sintomas': 2,
+    'observaciones': 1,
+}
+
+# Repeticiones de un término dentro de un mismo campo que suman al peso
+REPETICIONES_MAX = 3
+TERMINO_LARGO_MAX = 40
+TERMINOS_CONSULTA_MAX = 8
+
+PALABRAS_VACIAS = frozenset("""
+    a al algo algun alguna algunas alguno algunos ante antes aun bajo bien cada como con contra
+    cual cuando de del desde donde dos el ella ellas ello ellos en entre era es esa esas ese eso
+    esos esta estaba estan estas este esto estos fue fueron ha hace hacia han hasta hay la las le
+    les lo los mas me mi muy nada ni no nos o otra otras otro otros para pero poco por porque que
+    se segun ser si sin sobre son su sus tambien tan tiene tras tu un una uno unos unas y ya
+""".split())
+
+# Sufijos derivativos, del más largo al más corto
+SUFIJOS = ('amientos', 'imientos', 'aciones', 'uciones', 'amiento', 'imiento', 'idades',
+           'mente', 'acion', 'ucion', 'ables', 'ibles', 'istas', 'ismos', 'idad',
+           'able', 'ible', 'ista', 'ismo', 'osas', 'osos', 'osa', 'oso')
+
+_PALABRA = re.compile(r'[a-z0-9]+')
+
+
+def raiz(palabra):
+    """
+    Raíz aproximada de una palabra ya normalizada, suficiente para que
+    singular/plural, masculino/femenino y derivados comunes coincidan:
+    'dolores' -> 'dolor', 'inflamaciones' -> 'inflam', 'cronica' -> 'cronic'.
+    """
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= 4:
+            palabra = palabra[:-len(sufijo)]
+            break
+    else:
+        if len(palabra) > 4 and palabra.endswith('ces'):
+            palabra = palabra[:-3] + 'z'
+        elif len(palabra) > 4 and palabra.endswith('es') and palabra[-3] not in 'aeiou':
+            palabra = palabra[:-2]
+        elif len(palabra) > 3 and palabra.endswith('s'):
+            palabra = palabra[:-1]
+    if len(palabra) > 4 and palabra[-1] in 'aeo':
+        palabra = palabra[:-1]
+    return palabra
+
+
+def terminos(texto):
+    """Raíces de las palabras significativas del texto, en orden y con repeticiones"""
+    return [raiz(palabra)[:TERMINO_LARGO_MAX]
+            for palabra in _PALABRA.findall(normalizar(texto))
+            if palabra not in PALABRAS_VACIAS and len(palabra) > 1]
+
+
+def pesos_historia(campos):
+    """{término: peso} de una historia; `campos` mapea columna -> texto"""
+    pesos = {}
+    for columna, peso in CAMPOS.items():
+        conteo = {}
+        for termino in terminos(campos.get(columna)):
+            conteo[termino] = conteo.get(termino, 0) + 1
+        for termino, veces in conteo.items():
+            pesos[termino] = pesos.get(termino, 0) + peso * min(veces, REPETICIONES_MAX)
+    return pesos
+
+
+QUERY_INSERTAR = """
+    INSERT INTO historias_terminos (doctor_id, termino, historia_id, peso)
+    VALUES (%s, %s, %s, %s)
+"""
+
+
+def filas_indice(historia_id, doctor_id, campos):
+    return [(doctor_id, termino, historia_id, peso)
+            for termino, peso in pesos_historia(campos).items()]
+
+
+def indexar(cursor, historia_id, doctor_id, campos):
+    """Agrega la historia al índice; el commit lo hace quien llama"""
+    filas = filas_indice(historia_id, doctor_id, campos)
+    if filas:
+        cursor.executemany(QUERY_INSERTAR, filas)
+
+
+QUERY_FRECUENCIAS = """
+    SELECT termino, COUNT(*)
+    FROM historias_terminos
+    WHERE doctor_id = %s AND termino IN ({marcadores})
+    GROUP BY termino
+"""
+
+QUERY_TOTAL_DOCTOR = "SELECT COUNT(*) FROM historias_clinicas WHERE doctor_id = %s"
+
+# Ranking dentro del índice y solo después se leen las historias de la página
+QUERY_BUSCAR = """
+    SELECT hc.*, u.nombre_completo as paciente_nombre
+    FROM (
+        SELECT historia_id, SUM(peso * CASE termino {casos} END) as puntaje
+        FROM historias_terminos
+        WHERE doctor_id = %s AND termino IN ({marcadores})
+        GROUP BY historia_id
+        HAVING COUNT(*) = %s
+        ORDER BY puntaje DESC, historia_id DESC
+        LIMIT %s OFFSET %s
+    ) t
+    JOIN historias_clinicas hc ON hc.id = t.historia_id
+    JOIN pacientes p ON hc.paciente_id = p.id
+    JOIN usuarios u ON p.usuario_id = u.id
+    ORDER BY t.puntaje DESC, t.historia_id DESC
+"""
+
+
+def _leer(query, args, una_fila=False):
+    """Tarea de lectura para en_paralelo(): ejecuta `query` en la conexión que recibe"""
+    def leer(conexion):
+        cursor = conexion.cursor()
+        try:
+            cursor.execute(query, args)
+            return cursor.fetchone() if una_fila else cursor.fetchall()
+        finally:
+            cursor.close()
+    return leer
+
+
+def buscar(conexion, doctor_id, texto, limite=20, desplazamiento=0, paralelo=None):
+    """
+    Devuelve ([historia, ...], hay_mas) con las historias del doctor que
+    contienen todos los términos buscados, de mayor a menor relevancia
+    (peso por campo multiplicado por la rareza del término, estilo BM25).
+    Las filas tienen la forma de QUERY_HISTORIAS_DOCTOR: hc.* + paciente_nombre.
+
+    Las frecuencias de los términos y el total de historias no dependen
+    entre sí: con `paralelo` (mysql.en_paralelo con la espera ya fijada) se
+    leen a la vez, y la que falle o no termine a tiempo se repite en
+    `conexion` antes de calcular el ranking.
+    """
+    consulta = list(dict.fromkeys(terminos(texto)))[:TERMINOS_CONSULTA_MAX]
+    if not consulta:
+        return [], False
+    marcadores = ', '.join(['%s'] * len(consulta))
+
+    lecturas = {
+        'frecuencias': _leer(QUERY_FRECUENCIAS.format(marcadores=marcadores), (doctor_id, *consulta)),
+        'total': _leer(QUERY_TOTAL_DOCTOR, (doctor_id,), una_fila=True),
+    }
+    resultados, errores = paralelo(lecturas) if paralelo else ({}, lecturas)
+    for nombre in errores:
+        resultados[nombre] = lecturas[nombre](conexion)
+    frecuencias = dict(resultados['frecuencias'])
+    # Algún término no aparece en ninguna historia del doctor: no hay resultados
+    if len(frecuencias) < len(consulta):
+        return [], False
+    total = resultados['total'][0]
+
+    cursor = conexion.cursor()
+    try:
+        casos, params = [], []
+        for termino in consulta:
+            df = frecuencias[termino]
+            casos.append('WHEN %s THEN %s')
+            params += [termino, math.log(1 + (total - df + 0.5) / (df + 0.5))]
+
+        cursor.execute(QUERY_BUSCAR.format(casos=' '.join(casos), marcadores=marcadores),
+                       (*params, doctor_id, *consulta, len(consulta), limite + 1, desplazamiento))
+        historias = cursor.fetchall()
+    finally:
+        cursor.close()
+    return historias[:limite], len(historias) > limite
+
+
+def reconstruir(conexion, lote=1000):
+    """Vacía historias_terminos y vuelve a indexar todas las historias, de a `lote`"""
+    columnas = list(CAMPOS)
+    cursor = conexion.cursor()
+    cursor.execute("TRUNCATE TABLE historias_terminos")
+    ultimo, total = 0, 0
+    while True:
+        cursor.execute(f"""
+            SELECT id, doctor_id, {', '.join(columnas)}
+            FROM historias_clinicas
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (ultimo, lote))
+        filas = cursor.fetchall()
+        if not filas:
+            break
+        indice = [termino for fila in filas
+                  for termino in filas_indice(fila[0], fila[1], dict(zip(columnas, fila[2:])))]
+        if indice:
+            cursor.executemany(QUERY_INSERTAR, indice)
+        conexion.commit()
+        ultimo = filas[-1][0]
+        total += len(filas)
+    cursor.close()
+    return total
+
+
+if __name__ == '__main__':
+    from app import crear_app, mysql
+
+    app = crear_app()
+
+    with app.app_context():
+        print(f"🔎 {reconstruir(mysql.connection)} historias indexadas")
@@ -0,0 +1,138 @@
+"""
+Caché por usuario de páginas renderizadas, con validación ETag / Last-Modified
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request, session, make_response
+
+import versiones
+
+
+def clave_sello(sello):
+    """Clave en la tabla versiones de un sello: ('paciente', 7) -> 'vista:paciente:7'"""
+    return 'vista:' + ':'.join(map(str, sello))
+
+
+class CacheVistas:
+    """
+    Guarda el HTML de vistas personales (dashboards, recetas) por usuario y
+    URL. Cada entrada depende de sellos de versión como ('paciente', 7) que
+    las escrituras incrementan con invalidar(). Mientras los sellos no
+    cambien la página se sirve sin más consultas que la de los sellos y, si
+    el navegador ya la tiene (If-None-Match / If-Modified-Since), con un
+    304 sin cuerpo.
+
+    Los sellos están en la tabla versiones, así lo escrito desde cualquier
+    proceso invalida las páginas de todos; `conexion()` da la conexión con
+    la que se leen en cada petición.
+    """
+
+    def __init__(self, reloj, conexion, ttl=60, maximo=2000):
+        self.reloj = reloj
+        self.conexion = conexion
+        self.ttl = ttl
+        self.maximo = maximo
+        self.aciertos = 0
+        self.fallos = 0
+        self.no_modificadas = 0
+        # (endpoint, usuario_id, url) -> (versión, creada, modificada, vence, etag, mimetype, cuerpo)
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('VISTAS_CACHE_TTL', self.ttl)
+        app.config.setdefault('VISTAS_CACHE_MAX', self.maximo)
+        self.ttl = app.config['VISTAS_CACHE_TTL']
+        self.maximo = app.config['VISTAS_CACHE_MAX']
+        self.vaciar()
+
+    def invalidar(self, conexion, *sellos):
+        """Debe llamarse después de confirmar algo que muestran las páginas con esos sellos"""
+        versiones.incrementar(conexion, *map(clave_sello, sellos))
+
+    def vaciar(self):
+        """Olvida todas las páginas guardadas, como en un proceso recién arrancado"""
+        with self._lock:
+            self._entradas.clear()
+
+    def vence(self, momento):
+        """Desde la vista: la página deja de valer en `momento` (hora de la clínica)"""
+        # Sin g.cache_vence la vista no se guarda (p. ej. con mensajes flash)
+        if g.get('cache_vence') is None or momento < g.cache_vence:
+            g.cache_vence = momento
+
+    def vista(self, sellos):
+        """Decorador; `sellos()` devuelve los sellos de los que depende la página"""
+        def decorador(f):
+            @wraps(f)
+            def envoltura(*args, **kwargs):
+                # Con mensajes flash pendientes la página es única: no se guarda
+                if session.get('_flashes'):
+                    return f(*args, **kwargs)
+
+                clave = (request.endpoint, session['usuario_id'], request.full_path)
+                version = self._version(sellos())
+                entrada = self._vigente(clave, version)
+                if entrada is None:
+                    g.cache_vence = None
+                    respuesta = make_response(f(*args, **kwargs))
+                    if respuesta.status_code != 200 or respuesta.is_streamed:
+                        return respuesta
+                    cuerpo = respuesta.get_data()
+                    # La versión se tomó antes de leer la BD: una escritura durante
+                    # el renderizado deja la entrada vieja y se vuelve a generar
+                    entrada = (version, time.monotonic(), time.time(), g.cache_vence,
+                               hashlib.sha1(cuerpo).hexdigest(), respuesta.mimetype, cuerpo)
+                    self._guardar(clave, entrada)
+
+                respuesta = make_response(entrada[6])
+                respuesta.mimetype = entrada[5]
+                respuesta.set_etag(entrada[4])
+                respuesta.last_modified = entrada[2]
+                # El navegador guarda la página pero siempre pregunta si cambió
+                respuesta.cache_control.private = True
+                respuesta.cache_control.no_cache = True
+                respuesta.vary.add('Cookie')
+                respuesta.make_conditional(request)
+                if respuesta.status_code == 304:
+                    self.no_modificadas += 1
+                return respuesta
+            return envoltura
+        return decorador
+
+    def _version(self, sellos):
+        claves = [clave_sello(sello) for sello in sellos]
+        valores = versiones.leer(self.conexion(), claves)
+        return tuple(valores[clave] for clave in claves)
+
+    def _vigente(self, clave, version):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if (entrada is None or entrada[0] != version or
+                    time.monotonic() - entrada[1] >= self.ttl or
+                    (entrada[3] is not None and self.reloj() >= entrada[3])):
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def _guardar(self, clave, entrada):
+        with self._lock:
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def estadisticas(self):
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'no_modificadas': self.no_modificadas,
+            'entradas': len(self._entradas),
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,69 @@
+"""
+Caché en memoria de las tablas de consulta que casi no cambian: roles y especialidades
+"""
+import threading
+import time
+
+QUERY_ROLES = "SELECT id, nombre FROM roles"
+
+QUERY_ESPECIALIDADES = """
+    SELECT id, nombre
+    FROM especialidades
+    WHERE activo = 1
+    ORDER BY nombre
+"""
+
+
+class Catalogos:
+    """
+    Roles por nombre y especialidades activas. Se cargan al arrancar y se
+    releen cuando pasan `ttl` segundos: un rol o una especialidad nueva
+    aparece en todos los workers a lo sumo en ese tiempo.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.recargas = 0
+        self._roles = {}
+        self._especialidades = []
+        self._cargado_en = None
+        self._lock = threading.Lock()
+
+    def cargar(self, conexion):
+        cursor = conexion.cursor()
+        cursor.execute(QUERY_ROLES)
+        roles = {nombre: rol_id for rol_id, nombre in cursor.fetchall()}
+        cursor.execute(QUERY_ESPECIALIDADES)
+        especialidades = list(cursor.fetchall())
+        cursor.close()
+
+        with self._lock:
+            self._roles = roles
+            self._especialidades = especialidades
+            self._cargado_en = time.monotonic()
+            self.recargas += 1
+
+    def _vigente(self, obtener_conexion):
+        if self._cargado_en is None or time.monotonic() - self._cargado_en >= self.ttl:
+            self.cargar(obtener_conexion())
+
+    def rol_id(self, nombre, obtener_conexion):
+        """Id del rol `nombre`; KeyError si no existe"""
+        self._vigente(obtener_conexion)
+        return self._roles[nombre]
+
+    def especialidades(self, obtener_conexion):
+        """[(id, nombre), ...] de las especialidades activas, por nombre"""
+        self._vigente(obtener_conexion)
+        return self._especialidades
+
+    def especialidad_activa(self, especialidad_id, obtener_conexion):
+        return any(e[0] == especialidad_id for e in self.especialidades(obtener_conexion))
+
+    def estadisticas(self):
+        return {
+            'roles': len(self._roles),
+            'especialidades': len(self._especialidades),
+            'recargas': self.recargas,
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,152 @@
+"""
+Configuración por defecto de la app (app.crear_app la carga con from_object).
+
+crear_app() aplica encima, en este orden, el archivo Python indicado en
+CLINICA_CONFIG, las variables CLINICA_<CLAVE> con valores JSON
+(CLINICA_MYSQL_POOL_MAX=20, CLINICA_MYSQL_REPLICAS='[{"host": "10.0.0.2"}]')
+y el dict que reciba. Solo se leen los nombres en mayúsculas.
+"""
+import os
+
+raiz = os.path.dirname(os.path.abspath(__file__))
+
+# Solo para desarrollo: wsgi.py no arranca si no se reemplaza (CLINICA_SECRET_KEY)
+CLAVE_DESARROLLO = 'tu_clave_secreta_super_segura_aqui_2024'
+SECRET_KEY = CLAVE_DESARROLLO
+
+# Configuración de la conexión MySQL
+MYSQL_HOST = 'localhost'
+MYSQL_USER = 'root'
+MYSQL_PASSWORD = ''
+MYSQL_DB = 'clinica_vital'
+
+# Pool de conexiones: tamaño, espera máxima al pedir conexión y reciclado por inactividad
+MYSQL_POOL_MIN = 2
+MYSQL_POOL_MAX = 10
+MYSQL_POOL_TIMEOUT = 5.0
+MYSQL_POOL_RECICLAR = 300
+MYSQL_POOL_PING = True
+
+# Réplicas de lectura para las vistas marcadas con @mysql.en_replica, p. ej.
+# [{'host': '127.0.0.1', 'port': 3307}]. Se vuelve a la principal si una réplica
+# falla o se atrasa más de MYSQL_REPLICA_RETRASO_MAX segundos, y durante
+# MYSQL_REPLICA_PEGAJOSO segundos después de que la sesión escribe.
+MYSQL_REPLICAS = []
+MYSQL_REPLICA_RETRASO_MAX = 5
+MYSQL_REPLICA_PEGAJOSO = 10
+
+# Lecturas en paralelo (mysql.en_paralelo): hilos por proceso y espera máxima por defecto.
+# Cada lectura en curso ocupa además una conexión del pool: MYSQL_POOL_MAX debe dejar
+# MYSQL_PARALELO_HILOS conexiones libres por encima de las peticiones simultáneas.
+MYSQL_PARALELO_HILOS = 8
+MYSQL_PARALELO_ESPERA = 2.0
+
+# Zona horaria en la que se definen "hoy" y los rangos de fechas, p. ej. 'America/Bogota'.
+# None usa la del servidor, como el CURDATE() original (la app y MySQL en la misma zona).
+# Con una zona, cada conexión del pool hace SET time_zone para que las columnas
+# TIMESTAMP se lean y escriban en ella; MySQL necesita sus tablas de zonas horarias
+# (mysql_tzinfo_to_sql) para aceptar nombres como 'America/Bogota'.
+CLINICA_ZONA_HORARIA = None
+
+# Tamaño de página de historias y recetas (el cliente puede pedir hasta el máximo)
+PAGINA_TAMANO = 20
+PAGINA_TAMANO_MAX = 100
+
+# Máximo de recetas por petición en /doctor/recetas/lote
+RECETAS_LOTE_MAX = 200
+
+# Buscadores de pacientes y doctores para agendar citas
+BUSQUEDA_MIN_CARACTERES = 2
+BUSQUEDA_LIMITE = 20
+BUSQUEDA_LIMITE_MAX = 50
+# Búsqueda en historias: segundos que se esperan las lecturas en paralelo antes de
+# repetir en la conexión de la vista la que no haya terminado
+BUSQUEDA_PARALELO_ESPERA = 1.0
+
+# Jornada en la que se ofrecen turnos y duración por defecto de una cita (minutos)
+AGENDA_HORA_INICIO = 8
+AGENDA_HORA_FIN = 18
+AGENDA_DIAS_LABORALES = (0, 1, 2, 3, 4)  # lunes a viernes
+AGENDA_DURACION = 30
+AGENDA_HORIZONTE_DIAS = 60
+AGENDA_TTL = 300
+
+# Citas de hoy en vivo: recarga completa de la foto compartida, revisión de cambios en
+# la BD, vida de cada conexión SSE y latido (segundos).
+AGENDA_EN_VIVO_TTL = 60
+AGENDA_EN_VIVO_INTERVALO = 5
+AGENDA_EN_VIVO_CONEXION = 300
+AGENDA_EN_VIVO_LATIDO = 15
+# Cada pantalla abierta ocupa un hilo del servidor mientras dura su conexión: máximo de
+# conexiones SSE por proceso (gunicorn.conf.py lo ajusta a sus hilos). Las que sobran
+# reciben solo la orden de reintentar más tarde.
+AGENDA_EN_VIVO_MAX = 8
+AGENDA_EN_VIVO_REINTENTO = 30
+
+# Páginas personales en caché (dashboards, recetas): vida de cada entrada y máximo en memoria.
+# Las escrituras de cualquier proceso las invalidan al instante (tabla versiones).
+VISTAS_CACHE_TTL = 60
+VISTAS_CACHE_MAX = 2000
+
+# Contadores del dashboard admin: cada cuánto se reconcilian con las tablas de origen
+ESTADISTICAS_RECONCILIAR = 900
+ESTADISTICAS_HISTORIAL_MAX_DIAS = 90
+
+# Consultas más lentas que esto se registran en el log 'clinica.consultas_lentas'
+METRICAS_CONSULTA_LENTA_MS = 200
+# Directorio compartido por los workers para sumar sus histogramas (None: cada
+# proceso exporta solo los suyos, con la etiqueta pid) y segundos entre volcados
+METRICAS_DIR = None
+METRICAS_VOLCADO = 5
+
+# Contraseñas: método de werkzeug (los hashes con otros parámetros se actualizan al
+# iniciar sesión), hilos dedicados (None: núcleos - 1), hashes en curso o en cola antes
+# de responder 503 (None: 4 por hilo) y segundos máximos de espera por un hash
+CLAVES_METODO = 'scrypt:32768:8:1'
+CLAVES_HILOS = None
+CLAVES_PENDIENTES_MAX = None
+CLAVES_ESPERA_MAX = 5.0
+CLAVES_REINTENTAR = 2
+
+# Cada cuántos segundos cada worker relee qué cuentas cambiaron (usuarios.actualizado_en)
+# para que las sesiones de una cuenta desactivada o con otro rol se vuelvan a resolver
+IDENTIDAD_REVISAR = 5
+
+# La matriz de permisos vive en memoria; cada cuántos segundos se compara su versión
+# con la de la BD. Es lo que tarda un cambio de permisos en llegar a todos los workers.
+PERMISOS_CACHE_TTL = 5
+
+# Roles y especialidades en memoria (catalogos.py): cada cuántos segundos se releen
+CATALOGOS_TTL = 300
+
+# Auditoría: 'asincrono' (cola + lotes) o 'sincrono' (commit en la petición, para cumplimiento estricto)
+AUDITORIA_MODO = 'asincrono'
+AUDITORIA_CAPACIDAD = 10000
+AUDITORIA_LOTE = 100
+AUDITORIA_INTERVALO = 1.0
+AUDITORIA_DESBORDE = 'bloquear'  # 'bloquear', 'descartar' o 'sincrono'
+
+# Retención de auditoría (archivo_auditoria.py): meses que quedan en la tabla,
+# particiones mensuales que se crean por adelantado y dónde van los meses archivados
+AUDITORIA_MESES_CALIENTES = 6
+AUDITORIA_MESES_ADELANTE = 3
+AUDITORIA_ARCHIVO_DIR = os.path.join(raiz, 'archivo_auditoria')
+
+# Exportaciones: filas por fetchmany y segundos que MySQL espera a un cliente lento
+EXPORTACION_LOTE = 1000
+EXPORTACION_NET_WRITE_TIMEOUT = 600
+
+# Informes de uso (reportes.py): dónde vive la instantánea columnar, días hacia atrás
+# cuyas citas se releen en cada refresco, cada cuántos días se copia todo de nuevo
+# y cada cuántos segundos los workers revisan si hay una versión nueva
+REPORTES_DIR = os.path.join(raiz, 'reportes')
+REPORTES_VENTANA_CAMBIOS = 30
+REPORTES_RECONSTRUIR_DIAS = 7
+REPORTES_VERIFICAR = 30
+
+# Recursos estáticos con huella (python recursos.py): el nombre cambia con el
+# contenido, así que el navegador los guarda un año sin volver a preguntar
+RECURSOS_MAX_AGE = 365 * 24 * 3600
+
+# Arranque: segundos máximos para las cargas de calentar()
+CALENTAR_ESPERA = 60
@@ -0,0 +1,125 @@
+"""
+Hash y verificación de contraseñas fuera del hilo de la petición
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TimeoutFuturo
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from metricas import Histograma
+
+# Límites superiores (segundos) de los buckets de cómputo y de espera en cola
+BUCKETS_HASH = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class ClavesSaturadas(Exception):
+    """Hay demasiados hashes pendientes; el cliente debe reintentar más tarde"""
+
+
+class Contrasenas:
+    """
+    Pool acotado de hilos para generate_password_hash / check_password_hash.
+    hashlib suelta el GIL mientras calcula scrypt o pbkdf2, así que los
+    hilos usan núcleos reales; limitarlos deja CPU libre para el resto de
+    las peticiones. Si ya hay `pendientes_max` hashes en curso o en cola,
+    se lanza ClavesSaturadas en vez de encolar más (control de admisión).
+
+    `metodo` sigue el formato de werkzeug ('scrypt:32768:8:1',
+    'pbkdf2:sha256:600000'); los hashes guardados con otros parámetros
+    se reconocen con necesita_rehash().
+    """
+
+    def __init__(self, metodo='scrypt:32768:8:1', hilos=None, pendientes_max=None, espera_max=5.0):
+        self.metodo = metodo
+        self.hilos = hilos or max(1, (os.cpu_count() or 2) - 1)
+        self.pendientes_max = pendientes_max or self.hilos * 4
+        self.espera_max = espera_max
+        # Prefijo que werkzeug escribe para este método, con los parámetros por defecto completos
+        self.prefijo = generate_password_hash('', metodo).split('$', 1)[0]
+        self.pendientes = 0
+        self.verificaciones = 0
+        self.generados = 0
+        self.rechazadas = 0
+        self.rehash = 0
+        self.tiempo_hash = Histograma(BUCKETS_HASH)
+        self.tiempo_espera = Histograma(BUCKETS_HASH)
+        self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='contrasenas')
+        self._lock = threading.Lock()
+
+    def generar(self, clave):
+        """Hash de `clave` con el método configurado"""
+        self.generados += 1
+        return self._ejecutar(generate_password_hash, clave, self.metodo)
+
+    def verificar(self, hash_guardado, clave):
+        """
+        (válida, hash_nuevo). hash_nuevo no es None cuando la clave es
+        válida pero el hash guardado usa otros parámetros: quien llama debe
+        guardarlo. Si el pool se satura al recalcularlo, queda para el
+        próximo login.
+        """
+        self.verificaciones += 1
+        if not self._ejecutar(check_password_hash, hash_guardado, clave):
+            return False, None
+        if not self.necesita_rehash(hash_guardado):
+            return True, None
+        try:
+            nuevo = self._ejecutar(generate_password_hash, clave, self.metodo)
+        except ClavesSaturadas:
+            return True, None
+        self.rehash += 1
+        return True, nuevo
+
+    def necesita_rehash(self, hash_guardado):
+        return hash_guardado.split('$', 1)[0] != self.prefijo
+
+    def _ejecutar(self, funcion, *args):
+        with self._lock:
+            if self.pendientes >= self.pendientes_max:
+                self.rechazadas += 1
+                raise ClavesSaturadas()
+            self.pendientes += 1
+        encolado = time.perf_counter()
+
+        def tarea():
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args)
+            finally:
+                fin = time.perf_counter()
+                with self._lock:
+                    self.pendientes -= 1
+                    self.tiempo_espera.observar(inicio - encolado)
+                    self.tiempo_hash.observar(fin - inicio)
+
+        futuro = self._pool.submit(tarea)
+        try:
+            return futuro.result(timeout=self.espera_max)
+        except TimeoutFuturo:
+            # La tarea sigue ocupando su lugar hasta terminar
+            raise ClavesSaturadas() from None
+
+    def estadisticas(self):
+        return {
+            'hilos': self.hilos,
+            'pendientes': self.pendientes,
+            'pendientes_max': self.pendientes_max,
+            'verificaciones': self.verificaciones,
+            'generados': self.generados,
+            'rehash': self.rehash,
+            'rechazadas': self.rechazadas,
+        }
+
+    def prometheus(self):
+        """Histogramas de cómputo y de espera en formato de exposición de Prometheus"""
+        lineas = []
+        with self._lock:
+            for nombre, histograma, ayuda in (
+                    ('clinica_hash_segundos', self.tiempo_hash, 'Tiempo de cálculo de cada hash'),
+                    ('clinica_hash_espera_segundos', self.tiempo_espera, 'Espera en cola antes de calcular')):
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} histogram')
+                lineas.extend(histograma.prometheus(nombre, f'metodo="{self.metodo}",pid="{os.getpid()}"'))
+        return '\n'.join(lineas) + '\n'
@@ -1,6 +1,31 @@
+"""
+Genera datos de prueba para clinica_vital.
+
+Sin argumentos crea los cuatro usuarios de demostración y una cita. Con
+volúmenes (--doctores, --pacientes, --citas, ...) agrega además datos
+sintéticos con llaves foráneas consistentes, usando inserciones multi-fila
+por lotes y una semilla fija para que el resultado sea reproducible.
+Los usuarios sintéticos comparten un mismo hash de contraseña.
+Las historias y los usuarios generados no pasan por la aplicación: después
+de cargarlos hay que reconstruir los índices de búsqueda con
+busqueda_clinica.py e indice_nombres.py.
+
+Uso:
+    python crear_usuarios_prueba.py
+    python crear_usuarios_prueba.py --doctores 2000 --pacientes 1000000 \\
+        --citas 2000000 --historias 1000000 --recetas 800000 --auditoria 2000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
 from werkzeug.security import generate_password_hash
-import mysql.connector
-from mysql.connector import Error # Importar la clase Error
+import MySQLdb
+from MySQLdb import Error # Importar la clase Error
+
+from database.conexion import PoolConexiones
+import indice_nombres
 
 # --- CONFIGURACIÓN DE LA BASE DE DATOS ---
 DB_HOST = 'localhost'
@@ -9,123 +34,387 @@ DB_PASSWORD = ''  # Reemplaza con tu contraseña real
 DB_DATABASE = 'clinica_vital'
 # ----------------------------------------
 
-conn = None
-cursor = None
-
-try:
-    # Conectar a la base de datos
-    print("Attempting connection to the database...")
-    conn = mysql.connector.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_DATABASE
+# Contraseña de todos los usuarios sintéticos (doctor1, paciente1, secretaria1, ...)
+CLAVE_SINTETICA = 'clave123'
+
+NOMBRES = ('Ana', 'Carlos', 'María', 'José', 'Lucía', 'Andrés', 'Sofía', 'Julián', 'Valentina',
+           'Mateo', 'Camila', 'Santiago', 'Daniela', 'Felipe', 'Laura', 'Sebastián', 'Paula',
+           'Diego', 'Isabella', 'Nicolás', 'Gabriela', 'Alejandro', 'Mariana', 'David')
+APELLIDOS = ('García', 'Rodríguez', 'López', 'Martínez', 'Gómez', 'Pérez', 'Díaz', 'Ramírez',
+             'Torres', 'Hernández', 'Vargas', 'Castro', 'Rojas', 'Moreno', 'Jiménez', 'Ortiz',
+             'Suárez', 'Romero', 'Herrera', 'Medina', 'Aguilar', 'Cárdenas', 'Ríos', 'Mejía')
+TIPOS_SANGRE = ('O+', 'O+', 'O+', 'A+', 'A+', 'B+', 'AB+', 'O-', 'A-', 'B-')
+MOTIVOS = ('Consulta general', 'Control', 'Dolor de cabeza', 'Fiebre', 'Dolor abdominal',
+           'Chequeo anual', 'Control de presión', 'Tos persistente', 'Revisión de exámenes')
+DIAGNOSTICOS = ('Sin hallazgos', 'Hipertensión arterial', 'Infección respiratoria alta',
+                'Gastritis', 'Migraña', 'Lumbalgia', 'Dermatitis', 'Diabetes tipo 2 controlada')
+MEDICAMENTOS = (('Acetaminofén', '500 mg'), ('Ibuprofeno', '400 mg'), ('Amoxicilina', '500 mg'),
+                ('Losartán', '50 mg'), ('Omeprazol', '20 mg'), ('Loratadina', '10 mg'),
+                ('Metformina', '850 mg'), ('Naproxeno', '250 mg'))
+FRECUENCIAS = ('Cada 8 horas', 'Cada 12 horas', 'Cada 24 horas', 'Cada 6 horas')
+ACCIONES_AUDITORIA = (('login', 'sistema'), ('crear_cita', 'citas'),
+                      ('crear_historia', 'historias_clinicas'), ('crear_receta', 'recetas'))
+
+# Columnas de cada tabla en el orden en que se generan las filas
+COLUMNAS = {
+    'usuarios': ('id', 'username', 'email', 'password', 'rol_id', 'nombre_completo',
+                 'telefono', 'fecha_nacimiento'),
+    'doctores': ('id', 'usuario_id', 'especialidad_id', 'numero_licencia', 'anos_experiencia'),
+    'pacientes': ('id', 'usuario_id', 'tipo_sangre', 'contacto_emergencia', 'telefono_emergencia'),
+    'citas': ('id', 'paciente_id', 'doctor_id', 'fecha_hora', 'duracion_minutos', 'motivo',
+              'estado', 'creada_por'),
+    'historias_clinicas': ('id', 'paciente_id', 'doctor_id', 'fecha_consulta', 'motivo_consulta',
+                           'sintomas', 'diagnostico', 'observaciones', 'presion_arterial',
+                           'temperatura', 'peso', 'altura'),
+    'recetas': ('id', 'historia_clinica_id', 'paciente_id', 'doctor_id', 'fecha_emision',
+                'fecha_vencimiento', 'instrucciones_generales'),
+    'medicamentos_receta': ('receta_id', 'nombre_medicamento', 'dosis', 'frecuencia', 'duracion'),
+    'auditoria': ('usuario_id', 'accion', 'modulo', 'registro_id', 'detalles', 'ip_address',
+                  'fecha_accion'),
+}
+
+
+class Lotes:
+    """Acumula filas por tabla y las inserta en sentencias multi-fila"""
+
+    def __init__(self, cursor, conexion, tamano):
+        self.cursor = cursor
+        self.conexion = conexion
+        self.tamano = tamano
+        self.pendientes = {}
+        self.insertadas = {}
+
+    def agregar(self, tabla, fila):
+        pendientes = self.pendientes.setdefault(tabla, [])
+        pendientes.append(fila)
+        if len(pendientes) >= self.tamano:
+            self._insertar(tabla)
+
+    def _insertar(self, tabla):
+        filas = self.pendientes.pop(tabla, None)
+        if not filas:
+            return
+        columnas = COLUMNAS[tabla]
+        self.cursor.executemany(
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})",
+            filas)
+        self.conexion.commit()
+        self.insertadas[tabla] = self.insertadas.get(tabla, 0) + len(filas)
+
+    def vaciar(self):
+        for tabla in list(self.pendientes):
+            self._insertar(tabla)
+
+
+def crear_demo(cursor):
+    """
+    Los cuatro usuarios de demostración y una cita para hoy; devuelve el id
+    del admin. Si ya existen (una corrida anterior) no crea nada.
+    """
+    cursor.execute("SELECT id FROM usuarios WHERE username = 'admin'")
+    fila = cursor.fetchone()
+    if fila:
+        print("👤 Los usuarios de demostración ya existen")
+        return fila[0]
+
+    print("👤 Creando Administrador...")
+    password_admin = generate_password_hash('admin123')
+    cursor.execute("""
+        INSERT INTO usuarios (username, email, password, rol_id, nombre_completo, activo)
+        VALUES ('admin', 'admin@clinica.com', %s, 1, 'Administrador del Sistema', TRUE)
+    """, (password_admin,))
+    admin_id = cursor.lastrowid
+
+    print("👨‍⚕️ Creando Doctor...")
+    password_doctor = generate_password_hash('doctor123')
+    cursor.execute("""
+        INSERT INTO usuarios (username, email, password, rol_id, nombre_completo, activo)
+        VALUES ('doctor', 'doctor@clinica.com', %s, 2, 'Dr. Juan García', TRUE)
+    """, (password_doctor,))
+    cursor.execute("""
+        INSERT INTO doctores (usuario_id, especialidad_id, numero_licencia, anos_experiencia)
+        VALUES (%s, 1, 'LIC-12345', 10)
+    """, (cursor.lastrowid,))
+    doctor_id = cursor.lastrowid
+    indice_nombres.indexar(cursor, indice_nombres.DOCTOR, doctor_id, 'Dr. Juan García')
+
+    print("👩‍💼 Creando Secretaria...")
+    password_secretaria = generate_password_hash('secretaria123')
+    cursor.execute("""
+        INSERT INTO usuarios (username, email, password, rol_id, nombre_completo, activo)
+        VALUES ('secretaria', 'secretaria@clinica.com', %s, 3, 'María López', TRUE)
+    """, (password_secretaria,))
+
+    print("🧑‍🦱 Creando Paciente...")
+    password_paciente = generate_password_hash('paciente123')
+    cursor.execute("""
+        INSERT INTO usuarios (username, email, password, rol_id, nombre_completo, fecha_nacimiento, activo)
+        VALUES ('paciente', 'paciente@clinica.com', %s, 4, 'Carlos Rodríguez', '1990-05-15', TRUE)
+    """, (password_paciente,))
+    cursor.execute("""
+        INSERT INTO pacientes (usuario_id, tipo_sangre, contacto_emergencia, telefono_emergencia)
+        VALUES (%s, 'O+', 'Ana Rodríguez', '555-1234')
+    """, (cursor.lastrowid,))
+    paciente_id = cursor.lastrowid
+    indice_nombres.indexar(cursor, indice_nombres.PACIENTE, paciente_id, 'Carlos Rodríguez')
+
+    print("📅 Creando cita de prueba...")
+    cursor.execute("""
+        INSERT INTO citas (paciente_id, doctor_id, fecha_hora, motivo, estado, creada_por)
+        VALUES (%s, %s, NOW() + INTERVAL 2 HOUR, 'Consulta general', 'programada', %s)
+    """, (paciente_id, doctor_id, admin_id))
+    return admin_id
+
+
+def siguiente_id(cursor, tabla):
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabla}")
+    return cursor.fetchone()[0]
+
+
+def siguiente_numero(cursor, prefijo):
+    """
+    Primer número libre para usernames `prefijo<n>`: continúa desde el mayor
+    sufijo existente para no repetir los de una corrida anterior.
+    """
+    cursor.execute("""
+        SELECT COALESCE(MAX(CAST(SUBSTRING(username, %s) AS UNSIGNED)), 0) + 1
+        FROM usuarios
+        WHERE username LIKE %s AND username REGEXP %s
+    """, (len(prefijo) + 1, f'{prefijo}%', f'^{prefijo}[0-9]+$'))
+    return cursor.fetchone()[0]
+
+
+def ids(cursor, tabla, condicion='TRUE'):
+    cursor.execute(f"SELECT id FROM {tabla} WHERE {condicion}")
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def repartir(total, partes):
+    """Divide `total` en `partes` enteros que difieren como mucho en uno"""
+    base, resto = divmod(total, partes)
+    return [base + (1 if i < resto else 0) for i in range(partes)]
+
+
+def generar(conexion, doctores=0, secretarias=0, pacientes=0, citas=0, historias=0,
+            recetas=0, auditoria=0, semilla=42, lote=5000, dias_pasados=365, dias_futuros=60,
+            ahora=None):
+    """
+    Inserta los volúmenes pedidos sobre lo que ya exista en la base.
+    Citas, historias, recetas y auditoría se reparten entre todos los
+    doctores, pacientes y usuarios presentes, no solo los nuevos.
+    Devuelve {tabla: filas insertadas}.
+    """
+    rnd = random.Random(semilla)
+    ahora = (ahora or datetime.now()).replace(second=0, microsecond=0)
+    cursor = conexion.cursor()
+    # Las llaves foráneas se cumplen por construcción; los índices únicos se
+    # siguen revisando porque username y email pueden chocar con datos previos
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    lotes = Lotes(cursor, conexion, lote)
+    hash_comun = generate_password_hash(CLAVE_SINTETICA)
+
+    def nombre():
+        return f'{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}'
+
+    def telefono():
+        return f'3{rnd.randint(0, 99):02d}{rnd.randint(0, 9999999):07d}'
+
+    def usuario(uid, prefijo, numero, rol_id, nacimiento=None):
+        username = f'{prefijo}{numero}'
+        lotes.agregar('usuarios', (uid, username, f'{username}@clinica.test', hash_comun, rol_id,
+                                   nombre(), telefono(), nacimiento))
+
+    # --- usuarios, doctores y pacientes ---
+    uid = siguiente_id(cursor, 'usuarios')
+    numero = siguiente_numero(cursor, 'secretaria')
+    for i in range(numero, numero + secretarias):
+        usuario(uid, 'secretaria', i, 3)
+        uid += 1
+
+    doc_id = siguiente_id(cursor, 'doctores')
+    numero = siguiente_numero(cursor, 'doctor')
+    for i in range(numero, numero + doctores):
+        usuario(uid, 'doctor', i, 2)
+        lotes.agregar('doctores', (doc_id, uid, rnd.randint(1, 6), f'LIC-{doc_id:07d}',
+                                   rnd.randint(1, 35)))
+        uid += 1
+        doc_id += 1
+
+    pac_id = siguiente_id(cursor, 'pacientes')
+    numero = siguiente_numero(cursor, 'paciente')
+    for i in range(numero, numero + pacientes):
+        nacimiento = ahora.date() - timedelta(days=rnd.randint(365, 90 * 365))
+        usuario(uid, 'paciente', i, 4, nacimiento)
+        lotes.agregar('pacientes', (pac_id, uid, rnd.choice(TIPOS_SANGRE), nombre(), telefono()))
+        uid += 1
+        pac_id += 1
+    lotes.vaciar()
+    if doctores or pacientes or secretarias:
+        print(f"👥 {secretarias} secretarias, {doctores} doctores y {pacientes} pacientes")
+
+    ids_doctores = ids(cursor, 'doctores')
+    ids_pacientes = ids(cursor, 'pacientes')
+    ids_personal = ids(cursor, 'usuarios', 'rol_id IN (1, 3)')
+    if (citas or historias or recetas) and not (ids_doctores and ids_pacientes):
+        raise ValueError('Se necesitan doctores y pacientes para generar citas, historias o recetas')
+
+    # --- citas: turnos de 30 min sin solapes por doctor, lunes a viernes de 8 a 18 ---
+    if citas:
+        if not ids_personal:
+            raise ValueError('Se necesita al menos un admin o secretaria para crear citas')
+        dias = [d for d in ((ahora - timedelta(days=dias_pasados)).date() + timedelta(days=n)
+                            for n in range(dias_pasados + dias_futuros)) if d.weekday() < 5]
+        turnos_por_dia = 20
+        cita_id = siguiente_id(cursor, 'citas')
+        ocupados = set()
+        if cita_id > 1:
+            cursor.execute("SELECT doctor_id, fecha_hora FROM citas WHERE fecha_hora >= %s",
+                           (datetime.combine(dias[0], datetime.min.time()),))
+            ocupados = set(cursor.fetchall())
+        for doctor_id, cantidad in zip(ids_doctores, repartir(citas, len(ids_doctores))):
+            cantidad = min(cantidad, len(dias) * turnos_por_dia)
+            for turno in sorted(rnd.sample(range(len(dias) * turnos_por_dia), cantidad)):
+                dia, indice = divmod(turno, turnos_por_dia)
+                inicio = datetime.combine(dias[dia], datetime.min.time()) + \
+                    timedelta(hours=8, minutes=30 * indice)
+                if (doctor_id, inicio) in ocupados:
+                    continue
+                if inicio < ahora:
+                    estado = rnd.choices(('completada', 'cancelada', 'programada'), (85, 12, 3))[0]
+                else:
+                    estado = rnd.choices(('programada', 'confirmada', 'cancelada'), (60, 30, 10))[0]
+                lotes.agregar('citas', (cita_id, rnd.choice(ids_pacientes), doctor_id, inicio, 30,
+                                        rnd.choice(MOTIVOS), estado, rnd.choice(ids_personal)))
+                cita_id += 1
+        lotes.vaciar()
+        print(f"📅 {lotes.insertadas.get('citas', 0)} citas")
+
+    # --- historias, con sus recetas y medicamentos ---
+    if historias or recetas:
+        historia_id = siguiente_id(cursor, 'historias_clinicas')
+        receta_id = siguiente_id(cursor, 'recetas')
+
+        def receta(historia, paciente_id, doctor_id, emision):
+            nonlocal receta_id
+            lotes.agregar('recetas', (receta_id, historia, paciente_id, doctor_id, emision,
+                                      (emision + timedelta(days=rnd.choice((30, 60, 90)))).date(),
+                                      'Tomar con abundante agua'))
+            for medicamento, dosis in rnd.sample(MEDICAMENTOS, rnd.randint(1, 3)):
+                lotes.agregar('medicamentos_receta', (receta_id, medicamento, dosis,
+                                                      rnd.choice(FRECUENCIAS), f'{rnd.randint(3, 15)} días'))
+            receta_id += 1
+
+        # Las recetas se reparten entre las historias; las que sobran quedan sin historia
+        por_historia = min(recetas, historias) / historias if historias else 0
+        acumulado = 0.0
+        for _ in range(historias):
+            paciente_id, doctor_id = rnd.choice(ids_pacientes), rnd.choice(ids_doctores)
+            fecha = ahora - timedelta(days=rnd.randint(0, dias_pasados), minutes=rnd.randint(0, 600))
+            lotes.agregar('historias_clinicas', (
+                historia_id, paciente_id, doctor_id, fecha, rnd.choice(MOTIVOS), 'Refiere malestar general',
+                rnd.choice(DIAGNOSTICOS), None, f'{rnd.randint(100, 150)}/{rnd.randint(60, 95)}',
+                round(rnd.uniform(36.0, 38.5), 1), round(rnd.uniform(45, 110), 1), round(rnd.uniform(150, 195), 1)))
+            acumulado += por_historia
+            if acumulado >= 1:
+                acumulado -= 1
+                receta(historia_id, paciente_id, doctor_id, fecha)
+            historia_id += 1
+        for _ in range(recetas - min(recetas, historias)):
+            receta(None, rnd.choice(ids_pacientes), rnd.choice(ids_doctores),
+                   ahora - timedelta(days=rnd.randint(0, dias_pasados)))
+        lotes.vaciar()
+        print(f"📋 {lotes.insertadas.get('historias_clinicas', 0)} historias y "
+              f"{lotes.insertadas.get('recetas', 0)} recetas")
+
+    # --- auditoría ---
+    if auditoria:
+        ids_usuarios = ids(cursor, 'usuarios')
+        segundos = dias_pasados * 86400
+        for _ in range(auditoria):
+            accion, modulo = rnd.choice(ACCIONES_AUDITORIA)
+            lotes.agregar('auditoria', (rnd.choice(ids_usuarios), accion, modulo,
+                                        None if accion == 'login' else rnd.randint(1, 10 ** 6), None,
+                                        f'10.0.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}',
+                                        ahora - timedelta(seconds=rnd.randint(0, segundos))))
+        lotes.vaciar()
+        print(f"🗂️  {lotes.insertadas.get('auditoria', 0)} registros de auditoría")
+
+    cursor.execute("SET SESSION foreign_key_checks = 1")
+    cursor.close()
+    return lotes.insertadas
+
+
+def argumentos():
+    parser = argparse.ArgumentParser(description='Genera datos de prueba para clinica_vital')
+    for nombre in ('doctores', 'secretarias', 'pacientes', 'citas', 'historias', 'recetas', 'auditoria'):
+        parser.add_argument(f'--{nombre}', type=int, default=0)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--lote', type=int, default=5000, help='filas por INSERT')
+    parser.add_argument('--sin-demo', action='store_true',
+                        help='no crear los cuatro usuarios de demostración')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = argumentos()
+
+    # Mismo pool que usa la aplicación, con una sola conexión
+    pool = PoolConexiones(
+        lambda: MySQLdb.connect(host=DB_HOST, user=DB_USER, passwd=DB_PASSWORD,
+                                db=DB_DATABASE, charset='utf8mb4'),
+        minimo=1, maximo=1
     )
-    
-    if conn.is_connected():
+
+    conn = None
+    cursor = None
+
+    try:
+        # Conectar a la base de datos
+        print("Attempting connection to the database...")
+        conn = pool.obtener()
         cursor = conn.cursor()
         print("✅ Connection successful.")
-        
-        print("🚀 Creando usuarios de prueba...\n")
-
-        # 1. CREAR ADMIN
-        print("👤 Creando Administrador...")
-        password_admin = generate_password_hash('admin123')
-        cursor.execute("""
-            INSERT INTO usuarios (username, email, password, rol_id, nombre_completo, activo)
-            VALUES ('admin', 'admin@clinica.com', %s, 1, 'Administrador del Sistema', TRUE)
-        """, (password_admin,))
-        admin_id = cursor.lastrowid
-        print(f"✅ Admin creado - Usuario: admin | Contraseña: admin123")
-
-        # 2. CREAR DOCTOR
-        print("\n👨‍⚕️ Creando Doctor...")
-        password_doctor = generate_password_hash('doctor123')
-        cursor.execute("""
-            INSERT INTO usuarios (username, email, password, rol_id, nombre_completo, activo)
-            VALUES ('doctor', 'doctor@clinica.com', %s, 2, 'Dr. Juan García', TRUE)
-        """, (password_doctor,))
-        doctor_user_id = cursor.lastrowid
-
-        # Crear registro en tabla doctores
-        cursor.execute("""
-            INSERT INTO doctores (usuario_id, especialidad_id, numero_licencia, anos_experiencia)
-            VALUES (%s, 1, 'LIC-12345', 10)
-        """, (doctor_user_id,))
-        print(f"✅ Doctor creado - Usuario: doctor | Contraseña: doctor123")
-
-        # 3. CREAR SECRETARIA
-        print("\n👩‍💼 Creando Secretaria...")
-        password_secretaria = generate_password_hash('secretaria123')
-        cursor.execute("""
-            INSERT INTO usuarios (username, email, password, rol_id, nombre_completo, activo)
-            VALUES ('secretaria', 'secretaria@clinica.com', %s, 3, 'María López', TRUE)
-        """, (password_secretaria,))
-        print(f"✅ Secretaria creada - Usuario: secretaria | Contraseña: secretaria123")
-
-        # 4. CREAR PACIENTE
-        print("\n🧑‍🦱 Creando Paciente...")
-        password_paciente = generate_password_hash('paciente123')
-        cursor.execute("""
-            INSERT INTO usuarios (username, email, password, rol_id, nombre_completo, fecha_nacimiento, activo)
-            VALUES ('paciente', 'paciente@clinica.com', %s, 4, 'Carlos Rodríguez', '1990-05-15', TRUE)
-        """, (password_paciente,))
-        paciente_user_id = cursor.lastrowid
-
-        # Crear registro en tabla pacientes
-        cursor.execute("""
-            INSERT INTO pacientes (usuario_id, tipo_sangre, contacto_emergencia, telefono_emergencia)
-            VALUES (%s, 'O+', 'Ana Rodríguez', '555-1234')
-        """, (paciente_user_id,))
-        print(f"✅ Paciente creado - Usuario: paciente | Contraseña: paciente123")
-
-        # 5. CREAR CITA DE PRUEBA
-        print("\n📅 Creando cita de prueba...")
-        # Obtener el ID del doctor en la tabla doctores
-        cursor.execute("SELECT id FROM doctores WHERE usuario_id = %s", (doctor_user_id,))
-        doctor_id = cursor.fetchone()[0]
-
-        # Obtener el ID del paciente en la tabla pacientes
-        cursor.execute("SELECT id FROM pacientes WHERE usuario_id = %s", (paciente_user_id,))
-        paciente_id = cursor.fetchone()[0]
-
-        # Insertar la cita
-        cursor.execute("""
-            INSERT INTO citas (paciente_id, doctor_id, fecha_hora, motivo, estado, creada_por)
-            VALUES (%s, %s, NOW() + INTERVAL 2 HOUR, 'Consulta general', 'programada', %s)
-        """, (paciente_id, doctor_id, admin_id))
-        print(f"✅ Cita creada para hoy")
-
-        # Confirmar todos los cambios
-        conn.commit()
-        
+
+        if not args.sin_demo:
+            print("🚀 Creando usuarios de prueba...\n")
+            crear_demo(cursor)
+            conn.commit()
+
+        inicio = time.perf_counter()
+        volumenes = {k: getattr(args, k) for k in (
+            'doctores', 'secretarias', 'pacientes', 'citas', 'historias', 'recetas', 'auditoria')}
+        if any(volumenes.values()):
+            print("\n🏭 Generando datos sintéticos...")
+            insertadas = generar(conn, semilla=args.semilla, lote=args.lote, **volumenes)
+            total = sum(insertadas.values())
+            print(f"✅ {total} filas en {time.perf_counter() - inicio:.1f}s")
+
         # Resumen final
         print("\n" + "="*50)
-        print("✨ ¡USUARIOS CREADOS EXITOSAMENTE! ✨")
-        print("="*50)
-        print("\n📋 CREDENCIALES DE ACCESO:\n")
-        print("👤 ADMINISTRADOR:\n   Usuario: admin\n   Contraseña: admin123\n")
-        print("👨‍⚕️ DOCTOR:\n   Usuario: doctor\n   Contraseña: doctor123\n")
-        print("👩‍💼 SECRETARIA:\n   Usuario: secretaria\n   Contraseña: secretaria123\n")
-        print("🧑‍🦱 PACIENTE:\n   Usuario: paciente\n   Contraseña: paciente123\n")
+        print("📋 CREDENCIALES DE ACCESO:\n")
+        if not args.sin_demo:
+            print("👤 ADMINISTRADOR:\n   Usuario: admin\n   Contraseña: admin123\n")
+            print("👨‍⚕️ DOCTOR:\n   Usuario: doctor\n   Contraseña: doctor123\n")
+            print("👩‍💼 SECRETARIA:\n   Usuario: secretaria\n   Contraseña: secretaria123\n")
+            print("🧑‍🦱 PACIENTE:\n   Usuario: paciente\n   Contraseña: paciente123\n")
+        if any(volumenes.values()):
+            print(f"🤖 SINTÉTICOS:\n   Usuario: doctor1, paciente1, secretaria1, ...\n"
+                  f"   Contraseña: {CLAVE_SINTETICA}\n")
         print("="*50)
         print("🌐 Accede a: http://localhost:5000/login")
         print("="*50)
 
-    else:
-        print("❌ Failed to connect to MySQL database.")
-
-except Error as e:
-    # Rollback en caso de error para no dejar la base de datos a medias
-    if conn and conn.is_connected():
-        conn.rollback() 
-    print(f"\n❌ OCURRIÓ UN ERROR: {e}")
-    print("⚠️ ¡Se realizó un rollback! Ningún cambio fue guardado.")
-
-finally:
-    # Cerrar el cursor y la conexión
-    if cursor is not None:
-        cursor.close()
-    if conn is not None and conn.is_connected():
-        conn.close()
-        print("\nDatabase connection closed.")
\ No newline at end of file
+    except (Error, ValueError) as e:
+        # Rollback en caso de error; los lotes ya confirmados se conservan
+        if conn is not None:
+            conn.rollback()
+        print(f"\n❌ OCURRIÓ UN ERROR: {e}")
+        print("⚠️ Se realizó un rollback del lote en curso.")
+
+    finally:
+        # Cerrar el cursor y la conexión
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            pool.devolver(conn, descartar=True)
+            print("\nDatabase connection closed.")
@@ -0,0 +1,19 @@
+-- Auditoría particionada por mes (archivo_auditoria.py).
+-- Deja una sola partición p_futuro; asegurar_particiones() la divide en
+-- particiones mensuales y archivar() elimina las de meses fríos.
+-- MySQL no admite llaves foráneas en tablas particionadas y exige que la
+-- llave primaria incluya la columna de partición. Sobre una tabla con
+-- datos, el PARTITION BY copia la tabla completa: aplicarlo en mantenimiento.
+ALTER TABLE auditoria DROP FOREIGN KEY auditoria_ibfk_1;
+
+-- Consultas del visor por usuario o módulo dentro de un rango de fechas
+ALTER TABLE auditoria
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (id, fecha_accion),
+  DROP INDEX idx_auditoria_usuario,
+  ADD INDEX idx_auditoria_usuario_fecha (usuario_id, fecha_accion),
+  ADD INDEX idx_auditoria_modulo_fecha (modulo, fecha_accion);
+
+ALTER TABLE auditoria PARTITION BY RANGE (UNIX_TIMESTAMP(fecha_accion)) (
+  PARTITION p_futuro VALUES LESS THAN MAXVALUE
+);
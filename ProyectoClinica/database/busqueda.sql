@@ -0,0 +1,21 @@
+-- Índice invertido de la búsqueda en historias clínicas (busqueda_clinica.py).
+-- Un término por historia; la llave empieza por doctor_id porque cada
+-- doctor solo busca en sus propias historias.
+CREATE TABLE historias_terminos (
+  doctor_id INT NOT NULL,
+  termino VARCHAR(40) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+  historia_id INT NOT NULL,
+  peso SMALLINT NOT NULL,
+  PRIMARY KEY (doctor_id, termino, historia_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Palabras de los nombres de pacientes y doctores (indice_nombres.py) para
+-- los buscadores del formulario de citas: cada prefijo es un rango de la
+-- llave primaria.
+CREATE TABLE nombres_palabras (
+  entidad ENUM('paciente', 'doctor') NOT NULL,
+  palabra VARCHAR(60) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+  registro_id INT NOT NULL,
+  PRIMARY KEY (entidad, palabra, registro_id),
+  KEY idx_nombres_palabras_registro (entidad, registro_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,551 @@
+"""
+Pool de conexiones MySQL para la aplicación y los scripts
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import wraps
+
+import MySQLdb
+from flask import g, request, session, has_request_context
+
+logger = logging.getLogger(__name__)
+
+# Errores de una conexión que se cayó o se cortó a mitad de la consulta
+ERRORES_CONEXION = (MySQLdb.OperationalError, MySQLdb.InterfaceError)
+
+# ER_SPECIFIC_ACCESS_DENIED_ERROR: al usuario le falta REPLICATION CLIENT (o SUPER)
+SIN_PRIVILEGIO = 1227
+
+
+class ErrorPool(Exception):
+    """No se pudo obtener una conexión dentro del tiempo de espera"""
+
+
+class SinPrivilegioReplica(Exception):
+    """El usuario de la réplica no puede leer el estado de la replicación"""
+
+
+class PoolConexiones:
+    """
+    Pool acotado de conexiones MySQLdb.
+    - minimo / maximo: conexiones abiertas garantizadas y tope absoluto
+    - timeout: segundos que se espera una conexión libre antes de fallar
+    - reciclar: segundos de inactividad tras los que una conexión se cierra
+    - verificar: hace ping a la conexión antes de entregarla
+    """
+
+    def __init__(self, conectar, minimo=2, maximo=10, timeout=5.0, reciclar=300, verificar=True):
+        self.conectar = conectar
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.reciclar = reciclar
+        self.verificar = verificar
+        self._libres = deque()
+        self._total = 0
+        self._cond = threading.Condition()
+        # Métricas
+        self.creadas = 0
+        self.recicladas = 0
+        self.fallos_ping = 0
+        self.timeouts = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def llenar(self):
+        """Abre conexiones hasta alcanzar el mínimo"""
+        while True:
+            with self._cond:
+                if self._total >= self.minimo:
+                    return
+                self._total += 1
+            self._devolver_nueva()
+
+    def obtener(self):
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        conexion = None
+        with self._cond:
+            while conexion is None:
+                if self._libres:
+                    candidata, ultimo_uso = self._libres.pop()
+                    if time.monotonic() - ultimo_uso > self.reciclar and self._total > self.minimo:
+                        self._cerrar(candidata)
+                        self.recicladas += 1
+                        continue
+                    conexion = candidata
+                elif self._total < self.maximo:
+                    self._total += 1
+                    break
+                else:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.timeouts += 1
+                        raise ErrorPool(f'Sin conexiones libres tras {self.timeout}s '
+                                        f'({self._total}/{self.maximo} en uso)')
+                    self._cond.wait(restante)
+        self._registrar_espera(time.monotonic() - inicio)
+
+        if conexion is None:
+            return self._crear()
+        if self.verificar and not self._viva(conexion):
+            # Se reutiliza el hueco de la conexión muerta para abrir otra
+            self.fallos_ping += 1
+            try:
+                conexion.close()
+            except MySQLdb.Error:
+                pass
+            return self._crear()
+        return conexion
+
+    def devolver(self, conexion, descartar=False):
+        """Regresa la conexión al pool, deshaciendo lo que no se haya confirmado"""
+        if not descartar:
+            try:
+                conexion.rollback()
+            except MySQLdb.Error:
+                descartar = True
+        with self._cond:
+            if descartar:
+                self._cerrar(conexion)
+            else:
+                self._libres.append((conexion, time.monotonic()))
+            self._cond.notify()
+
+    def metricas(self):
+        with self._cond:
+            libres = len(self._libres)
+            total = self._total
+        return {
+            'total': total,
+            'libres': libres,
+            'en_uso': total - libres,
+            'minimo': self.minimo,
+            'maximo': self.maximo,
+            'creadas': self.creadas,
+            'recicladas': self.recicladas,
+            'fallos_ping': self.fallos_ping,
+            'timeouts': self.timeouts,
+            'esperas': self.esperas,
+            'espera_total_s': round(self.espera_total, 6),
+            'espera_max_s': round(self.espera_max, 6),
+        }
+
+    def _crear(self):
+        """Abre una conexión para un hueco ya reservado en _total"""
+        try:
+            conexion = self.conectar()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        self.creadas += 1
+        return conexion
+
+    def _devolver_nueva(self):
+        conexion = self._crear()
+        with self._cond:
+            self._libres.appendleft((conexion, time.monotonic()))
+            self._cond.notify()
+
+    def _cerrar(self, conexion):
+        """Cierra una conexión y libera su hueco; se llama con _cond tomado"""
+        self._total -= 1
+        try:
+            conexion.close()
+        except MySQLdb.Error:
+            pass
+
+    def _viva(self, conexion):
+        try:
+            conexion.ping()
+            return True
+        except MySQLdb.Error:
+            return False
+
+    def _registrar_espera(self, segundos):
+        self.esperas += 1
+        self.espera_total += segundos
+        self.espera_max = max(self.espera_max, segundos)
+
+
+def retraso_replica(conexion):
+    """
+    Segundos de retraso de una réplica; None si no replica o la replicación
+    está detenida. SinPrivilegioReplica si el usuario no tiene REPLICATION CLIENT.
+    """
+    cursor = conexion.cursor()
+    try:
+        # SHOW REPLICA STATUS desde MySQL 8.0.22 / MariaDB 10.5.1; antes solo SLAVE
+        denegado = None
+        for sentencia in ('SHOW REPLICA STATUS', 'SHOW SLAVE STATUS'):
+            try:
+                cursor.execute(sentencia)
+                break
+            except MySQLdb.Error as error:
+                if error.args and error.args[0] == SIN_PRIVILEGIO:
+                    denegado = error
+                continue
+        else:
+            if denegado is not None:
+                raise SinPrivilegioReplica(str(denegado)) from denegado
+            return None
+        fila = cursor.fetchone()
+        if fila is None:
+            return None
+        estado = dict(zip((col[0] for col in cursor.description), fila))
+        return estado.get('Seconds_Behind_Source', estado.get('Seconds_Behind_Master'))
+    finally:
+        cursor.close()
+
+
+class Replica:
+    """Pool de una réplica con su último retraso medido"""
+
+    def __init__(self, nombre, pool):
+        self.nombre = nombre
+        self.pool = pool
+        self.retraso = None
+        self.medido_en = None
+        self.caida_hasta = 0.0
+        # El aviso de que no se puede medir el retraso se registra una sola vez
+        self.sin_privilegio = False
+        # Métricas
+        self.lecturas = 0
+        self.fallos = 0
+        self.reintentos = 0
+        self.rechazos_retraso = 0
+
+    def metricas(self):
+        return {
+            'nombre': self.nombre,
+            'retraso_s': self.retraso,
+            'caida': self.caida_hasta > time.monotonic(),
+            'lecturas': self.lecturas,
+            'fallos': self.fallos,
+            'reintentos': self.reintentos,
+            'sin_privilegio': self.sin_privilegio,
+            'rechazos_retraso': self.rechazos_retraso,
+            'pool': self.pool.metricas(),
+        }
+
+
+class MySQLPool:
+    """
+    Reemplazo de flask_mysqldb.MySQL respaldado por PoolConexiones.
+    `mysql.connection` entrega una conexión del pool por contexto de
+    aplicación y la devuelve al cerrarse el contexto.
+
+    Con MYSQL_REPLICAS configuradas, `mysql.lectura` entrega una conexión
+    a una réplica en las vistas marcadas con @mysql.en_replica, salvo que
+    la sesión haya escrito hace menos de MYSQL_REPLICA_PEGAJOSO segundos
+    (para leer lo recién escrito) o que ninguna réplica esté disponible
+    con retraso aceptable; en esos casos es la misma conexión principal.
+    Si la réplica se cae a mitad de la vista, esta se repite una vez en la
+    principal.
+
+    `mysql.en_paralelo()` ejecuta lecturas independientes a la vez, cada
+    una con su propia conexión, para que la vista tarde lo que la más lenta.
+    Como cada tarea pide su conexión mientras la petición retiene la suya,
+    el pool necesita MYSQL_PARALELO_HILOS conexiones por encima de los
+    hilos que atienden peticiones.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        self.replicas = []
+        self._turno = itertools.count()
+        self._paralelo = None
+        # Métricas de en_paralelo()
+        self.tareas_paralelas = 0
+        self.tareas_fallidas = 0
+        self.tareas_vencidas = 0
+        # Función opcional que envuelve cada conexión entregada (p. ej. para instrumentarla)
+        self.envolver = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        config.setdefault('MYSQL_CHARSET', 'utf8mb4')
+        # Zona de la sesión MySQL (SET time_zone); None deja la del servidor
+        config.setdefault('MYSQL_ZONA_HORARIA', None)
+        config.setdefault('MYSQL_POOL_MIN', 2)
+        config.setdefault('MYSQL_POOL_MAX', 10)
+        config.setdefault('MYSQL_POOL_TIMEOUT', 5.0)
+        config.setdefault('MYSQL_POOL_RECICLAR', 300)
+        config.setdefault('MYSQL_POOL_PING', True)
+        # Cada réplica es un dict con las claves que cambian respecto de la principal:
+        # {'host': ..., 'port': ..., 'unix_socket': ..., 'user': ..., 'password': ...}
+        config.setdefault('MYSQL_REPLICAS', [])
+        config.setdefault('MYSQL_REPLICA_RETRASO_MAX', 5)  # None: no se mide el retraso
+        config.setdefault('MYSQL_REPLICA_VERIFICAR', 10)
+        config.setdefault('MYSQL_REPLICA_REINTENTO', 30)
+        config.setdefault('MYSQL_REPLICA_PEGAJOSO', 10)
+        config.setdefault('MYSQL_PARALELO_HILOS', 8)
+        config.setdefault('MYSQL_PARALELO_ESPERA', 2.0)
+
+        def fabrica(servidor):
+            def conectar():
+                extra = {}
+                # Igual que flask_mysqldb: puerto y socket solo si se configuran
+                if servidor.get('port', config.get('MYSQL_PORT')):
+                    extra['port'] = servidor.get('port', config.get('MYSQL_PORT'))
+                if servidor.get('unix_socket', config.get('MYSQL_UNIX_SOCKET')):
+                    extra['unix_socket'] = servidor.get('unix_socket', config.get('MYSQL_UNIX_SOCKET'))
+                conexion = MySQLdb.connect(host=servidor.get('host', config['MYSQL_HOST']),
+                                           user=servidor.get('user', config['MYSQL_USER']),
+                                           passwd=servidor.get('password', config['MYSQL_PASSWORD']),
+                                           db=config['MYSQL_DB'], charset=config['MYSQL_CHARSET'], **extra)
+                if config['MYSQL_ZONA_HORARIA']:
+                    # CURRENT_TIMESTAMP y las columnas TIMESTAMP se leen en la zona de la sesión
+                    cursor = conexion.cursor()
+                    try:
+                        cursor.execute('SET time_zone = %s', (config['MYSQL_ZONA_HORARIA'],))
+                    finally:
+                        cursor.close()
+                return conexion
+            return conectar
+
+        def nuevo_pool(servidor):
+            return PoolConexiones(fabrica(servidor),
+                                  minimo=config['MYSQL_POOL_MIN'],
+                                  maximo=config['MYSQL_POOL_MAX'],
+                                  timeout=config['MYSQL_POOL_TIMEOUT'],
+                                  reciclar=config['MYSQL_POOL_RECICLAR'],
+                                  verificar=config['MYSQL_POOL_PING'])
+
+        self.config = config
+        self._nuevo_pool = nuevo_pool
+        self.pool = nuevo_pool({})
+        for servidor in config['MYSQL_REPLICAS']:
+            self.agregar_replica(servidor)
+        self._paralelo = ThreadPoolExecutor(max_workers=config['MYSQL_PARALELO_HILOS'],
+                                            thread_name_prefix='mysql-paralelo')
+        app.after_request(self._marcar_escritura)
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def connection(self):
+        if 'mysql_conexion' not in g:
+            g.mysql_conexion_cruda = self.pool.obtener()
+            g.mysql_conexion = (self.envolver(g.mysql_conexion_cruda) if self.envolver
+                                else g.mysql_conexion_cruda)
+        return g.mysql_conexion
+
+    def agregar_replica(self, servidor):
+        """Registra una réplica con las mismas claves que los elementos de MYSQL_REPLICAS"""
+        nombre = f"{servidor.get('host', self.config['MYSQL_HOST'])}:" \
+                 f"{servidor.get('port', servidor.get('unix_socket', 3306))}"
+        self.replicas.append(Replica(nombre, self._nuevo_pool(servidor)))
+
+    @property
+    def lectura(self):
+        """Conexión para las lecturas de la vista; ver la documentación de la clase"""
+        if 'mysql_lectura' not in g:
+            elegida = None
+            if g.get('mysql_en_replica') and self.replicas and not self._pegajoso():
+                elegida = self._obtener_replica()
+            if elegida is None:
+                g.mysql_lectura = self.connection
+            else:
+                g.mysql_replica = elegida
+                g.mysql_lectura = self.envolver(elegida[1]) if self.envolver else elegida[1]
+        return g.mysql_lectura
+
+    def en_replica(self, vista):
+        """Decorador: la vista solo lee, así que mysql.lectura puede ir a una réplica"""
+        @wraps(vista)
+        def envuelta(*args, **kwargs):
+            g.mysql_en_replica = True
+            try:
+                return vista(*args, **kwargs)
+            except ERRORES_CONEXION as error:
+                if 'mysql_replica' not in g:
+                    raise
+                replica, conexion = g.pop('mysql_replica')
+                g.pop('mysql_lectura', None)
+                self._abandonar_replica(replica, conexion, error)
+                # Solo lee, así que repetirla en la principal no duplica nada: lo que
+                # escribe (p. ej. la auditoría de las exportaciones) va fuera de la vista
+                g.mysql_en_replica = False
+                return vista(*args, **kwargs)
+        return envuelta
+
+    def liberar(self):
+        """
+        Devuelve ya la conexión principal del contexto, p. ej. antes de una
+        espera larga que no usa la BD; `mysql.connection` pide otra si se
+        vuelve a usar. No debe quedar una transacción abierta.
+        """
+        if g.get('mysql_lectura') is g.get('mysql_conexion'):
+            g.pop('mysql_lectura', None)
+        g.pop('mysql_conexion', None)
+        conexion = g.pop('mysql_conexion_cruda', None)
+        if conexion is not None:
+            self.pool.devolver(conexion)
+
+    def en_paralelo(self, tareas, espera_max=None, lectura=False):
+        """
+        Ejecuta a la vez las `tareas` ({nombre: función(conexion)}), cada una
+        con una conexión propia, y devuelve ({nombre: resultado},
+        {nombre: excepción}): quien llama decide qué hacer si algo falla.
+        Con lectura=True, en una vista @mysql.en_replica las conexiones salen
+        de las réplicas igual que mysql.lectura. Lo que no termina en
+        `espera_max` segundos (MYSQL_PARALELO_ESPERA) queda como TimeoutError
+        y su conexión vuelve al pool cuando la consulta acaba. Las tareas solo
+        leen: cada conexión se devuelve con rollback.
+        """
+        if espera_max is None:
+            espera_max = self.config['MYSQL_PARALELO_ESPERA']
+        # La sesión solo se puede leer desde el hilo de la petición
+        en_replica = bool(lectura and has_request_context() and g.get('mysql_en_replica')
+                          and self.replicas and not self._pegajoso())
+        futuros = {nombre: self._paralelo.submit(self._ejecutar_tarea, tarea, en_replica)
+                   for nombre, tarea in tareas.items()}
+        terminados, _ = wait(futuros.values(), timeout=espera_max)
+
+        resultados, errores = {}, {}
+        for nombre, futuro in futuros.items():
+            if futuro not in terminados:
+                # Si aún no empezó, ni siquiera pide conexión
+                futuro.cancel()
+                self.tareas_vencidas += 1
+                errores[nombre] = TimeoutError(f'{nombre}: sin respuesta tras {espera_max}s')
+            elif futuro.exception() is not None:
+                self.tareas_fallidas += 1
+                errores[nombre] = futuro.exception()
+            else:
+                resultados[nombre] = futuro.result()
+        self.tareas_paralelas += len(futuros)
+        return resultados, errores
+
+    def _ejecutar_tarea(self, tarea, en_replica):
+        elegida = self._obtener_replica() if en_replica else None
+        if elegida is not None:
+            replica, conexion = elegida
+            try:
+                resultado = tarea(self.envolver(conexion) if self.envolver else conexion)
+            except ERRORES_CONEXION as error:
+                # Se repite abajo en la principal
+                self._abandonar_replica(replica, conexion, error)
+            except BaseException:
+                replica.pool.devolver(conexion)
+                raise
+            else:
+                replica.pool.devolver(conexion)
+                return resultado
+        conexion = self.pool.obtener()
+        try:
+            return tarea(self.envolver(conexion) if self.envolver else conexion)
+        finally:
+            self.pool.devolver(conexion)
+
+    def _abandonar_replica(self, replica, conexion, error):
+        """Cierra la conexión de una réplica que falló a mitad de una lectura"""
+        # Si ni responde al ping se da por caída; si no, falló solo esa consulta
+        caida = not replica.pool._viva(conexion)
+        replica.pool.devolver(conexion, descartar=True)
+        if caida:
+            self._marcar_caida(replica)
+        replica.reintentos += 1
+        logger.warning('Lectura fallida en la réplica %s (%s); se repite en la principal',
+                       replica.nombre, error)
+
+    def metricas_paralelo(self):
+        return {
+            'hilos': self.config['MYSQL_PARALELO_HILOS'],
+            'tareas': self.tareas_paralelas,
+            'fallidas': self.tareas_fallidas,
+            'vencidas': self.tareas_vencidas,
+        }
+
+    def descartar(self):
+        """Cierra las conexiones del contexto al terminar en vez de devolverlas al pool"""
+        g.mysql_descartar = True
+
+    def metricas_replicas(self):
+        return [replica.metricas() for replica in self.replicas]
+
+    def _pegajoso(self):
+        escritura = session.get('mysql_escritura')
+        return escritura is not None and time.time() - escritura < self.config['MYSQL_REPLICA_PEGAJOSO']
+
+    def _marcar_escritura(self, respuesta):
+        # Tras una petición que usó la principal para escribir, la sesión lee de ella un rato
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and 'mysql_conexion' in g:
+            session['mysql_escritura'] = time.time()
+        return respuesta
+
+    def _obtener_replica(self):
+        """(réplica, conexión) de la siguiente réplica sana en turno, o None"""
+        retraso_max = self.config['MYSQL_REPLICA_RETRASO_MAX']
+        inicio = next(self._turno)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(inicio + i) % len(self.replicas)]
+            ahora = time.monotonic()
+            if replica.caida_hasta > ahora:
+                continue
+            medida_vigente = (replica.medido_en is not None and
+                              ahora - replica.medido_en < self.config['MYSQL_REPLICA_VERIFICAR'])
+            if retraso_max is not None and medida_vigente and not self._retraso_aceptable(replica):
+                replica.rechazos_retraso += 1
+                continue
+            try:
+                conexion = replica.pool.obtener()
+            except ErrorPool:
+                # Saturada, no caída: se usa otra réplica o la principal solo esta vez
+                continue
+            except MySQLdb.Error:
+                self._marcar_caida(replica)
+                continue
+            if retraso_max is not None and not medida_vigente:
+                try:
+                    replica.retraso = retraso_replica(conexion)
+                    replica.medido_en = ahora
+                except SinPrivilegioReplica as error:
+                    # Sin medir el retraso no se le puede leer: cuenta como caída
+                    if not replica.sin_privilegio:
+                        replica.sin_privilegio = True
+                        logger.warning('No se puede medir el retraso de la réplica %s (%s): '
+                                       'otorga REPLICATION CLIENT a su usuario o usa '
+                                       'MYSQL_REPLICA_RETRASO_MAX = None', replica.nombre, error)
+                    replica.pool.devolver(conexion)
+                    self._marcar_caida(replica)
+                    continue
+                except MySQLdb.Error:
+                    replica.pool.devolver(conexion, descartar=True)
+                    self._marcar_caida(replica)
+                    continue
+            if retraso_max is not None and not self._retraso_aceptable(replica):
+                replica.rechazos_retraso += 1
+                replica.pool.devolver(conexion)
+                continue
+            replica.lecturas += 1
+            return replica, conexion
+        return None
+
+    def _marcar_caida(self, replica):
+        replica.fallos += 1
+        replica.caida_hasta = time.monotonic() + self.config['MYSQL_REPLICA_REINTENTO']
+
+    def _retraso_aceptable(self, replica):
+        return replica.retraso is not None and replica.retraso <= self.config['MYSQL_REPLICA_RETRASO_MAX']
+
+    def teardown(self, exception):
+        descartar = g.pop('mysql_descartar', False)
+        g.pop('mysql_lectura', None)
+        elegida = g.pop('mysql_replica', None)
+        if elegida is not None:
+            replica, conexion = elegida
+            replica.pool.devolver(conexion, descartar=descartar)
+        g.pop('mysql_conexion', None)
+        conexion = g.pop('mysql_conexion_cruda', None)
+        if conexion is not None:
+            self.pool.devolver(conexion, descartar=descartar)
@@ -0,0 +1,176 @@
+-- Esquema de clinica_vital usado por app.py
+-- Después de este archivo se aplican indices.sql, estadisticas.sql, busqueda.sql,
+-- auditoria.sql y sincronizacion.sql
+
+CREATE TABLE roles (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  nombre VARCHAR(50) NOT NULL UNIQUE,
+  descripcion VARCHAR(255) DEFAULT NULL,
+  fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE usuarios (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  username VARCHAR(50) NOT NULL UNIQUE,
+  email VARCHAR(100) NOT NULL UNIQUE,
+  password VARCHAR(255) NOT NULL,
+  rol_id INT NOT NULL,
+  nombre_completo VARCHAR(150) NOT NULL,
+  telefono VARCHAR(20) DEFAULT NULL,
+  fecha_nacimiento DATE DEFAULT NULL,
+  activo TINYINT(1) DEFAULT 1,
+  fecha_registro TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  KEY idx_usuario_rol (rol_id),
+  CONSTRAINT usuarios_ibfk_1 FOREIGN KEY (rol_id) REFERENCES roles (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE especialidades (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  nombre VARCHAR(100) NOT NULL UNIQUE,
+  descripcion TEXT DEFAULT NULL,
+  activo TINYINT(1) DEFAULT 1
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE doctores (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  usuario_id INT NOT NULL UNIQUE,
+  especialidad_id INT NOT NULL,
+  numero_licencia VARCHAR(50) NOT NULL UNIQUE,
+  anos_experiencia INT DEFAULT NULL,
+  KEY especialidad_id (especialidad_id),
+  CONSTRAINT doctores_ibfk_1 FOREIGN KEY (usuario_id) REFERENCES usuarios (id) ON DELETE CASCADE,
+  CONSTRAINT doctores_ibfk_2 FOREIGN KEY (especialidad_id) REFERENCES especialidades (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE pacientes (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  usuario_id INT NOT NULL UNIQUE,
+  tipo_sangre VARCHAR(5) DEFAULT NULL,
+  alergias TEXT DEFAULT NULL,
+  contacto_emergencia VARCHAR(150) DEFAULT NULL,
+  telefono_emergencia VARCHAR(20) DEFAULT NULL,
+  CONSTRAINT pacientes_ibfk_1 FOREIGN KEY (usuario_id) REFERENCES usuarios (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE permisos (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  rol_id INT NOT NULL,
+  modulo VARCHAR(50) NOT NULL,
+  puede_ver TINYINT(1) NOT NULL DEFAULT 0,
+  puede_crear TINYINT(1) NOT NULL DEFAULT 0,
+  puede_editar TINYINT(1) NOT NULL DEFAULT 0,
+  puede_eliminar TINYINT(1) NOT NULL DEFAULT 0,
+  UNIQUE KEY unique_rol_modulo (rol_id, modulo),
+  CONSTRAINT permisos_ibfk_1 FOREIGN KEY (rol_id) REFERENCES roles (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE citas (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  paciente_id INT NOT NULL,
+  doctor_id INT NOT NULL,
+  fecha_hora DATETIME NOT NULL,
+  duracion_minutos INT DEFAULT 30,
+  motivo VARCHAR(255) DEFAULT NULL,
+  estado ENUM('programada','confirmada','completada','cancelada') DEFAULT 'programada',
+  observaciones TEXT DEFAULT NULL,
+  creada_por INT NOT NULL,
+  fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  KEY creada_por (creada_por),
+  KEY idx_citas_fecha (fecha_hora),
+  KEY idx_citas_doctor (doctor_id),
+  KEY idx_citas_paciente (paciente_id),
+  CONSTRAINT citas_ibfk_1 FOREIGN KEY (paciente_id) REFERENCES pacientes (id),
+  CONSTRAINT citas_ibfk_2 FOREIGN KEY (doctor_id) REFERENCES doctores (id),
+  CONSTRAINT citas_ibfk_3 FOREIGN KEY (creada_por) REFERENCES usuarios (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE historias_clinicas (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  paciente_id INT NOT NULL,
+  doctor_id INT NOT NULL,
+  fecha_consulta TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  motivo_consulta TEXT NOT NULL,
+  sintomas TEXT DEFAULT NULL,
+  diagnostico TEXT DEFAULT NULL,
+  observaciones TEXT DEFAULT NULL,
+  presion_arterial VARCHAR(20) DEFAULT NULL,
+  temperatura DECIMAL(4,2) DEFAULT NULL,
+  peso DECIMAL(5,2) DEFAULT NULL,
+  altura DECIMAL(5,2) DEFAULT NULL,
+  KEY idx_paciente (paciente_id),
+  KEY idx_doctor (doctor_id),
+  KEY idx_fecha (fecha_consulta),
+  CONSTRAINT historias_clinicas_ibfk_1 FOREIGN KEY (paciente_id) REFERENCES pacientes (id),
+  CONSTRAINT historias_clinicas_ibfk_2 FOREIGN KEY (doctor_id) REFERENCES doctores (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE recetas (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  historia_clinica_id INT DEFAULT NULL,
+  paciente_id INT NOT NULL,
+  doctor_id INT NOT NULL,
+  fecha_emision TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  fecha_vencimiento DATE DEFAULT NULL,
+  instrucciones_generales TEXT DEFAULT NULL,
+  activa TINYINT(1) DEFAULT 1,
+  KEY historia_clinica_id (historia_clinica_id),
+  KEY doctor_id (doctor_id),
+  KEY idx_recetas_paciente (paciente_id),
+  CONSTRAINT recetas_ibfk_1 FOREIGN KEY (historia_clinica_id) REFERENCES historias_clinicas (id),
+  CONSTRAINT recetas_ibfk_2 FOREIGN KEY (paciente_id) REFERENCES pacientes (id),
+  CONSTRAINT recetas_ibfk_3 FOREIGN KEY (doctor_id) REFERENCES doctores (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE medicamentos_receta (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  receta_id INT NOT NULL,
+  nombre_medicamento VARCHAR(200) NOT NULL,
+  dosis VARCHAR(100) NOT NULL,
+  frecuencia VARCHAR(100) NOT NULL,
+  duracion VARCHAR(100) NOT NULL,
+  instrucciones_especiales TEXT DEFAULT NULL,
+  KEY receta_id (receta_id),
+  CONSTRAINT medicamentos_receta_ibfk_1 FOREIGN KEY (receta_id) REFERENCES recetas (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE auditoria (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  usuario_id INT NOT NULL,
+  accion VARCHAR(100) NOT NULL,
+  modulo VARCHAR(50) NOT NULL,
+  registro_id INT DEFAULT NULL,
+  detalles TEXT DEFAULT NULL,
+  ip_address VARCHAR(45) DEFAULT NULL,
+  fecha_accion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  KEY idx_auditoria_usuario (usuario_id),
+  KEY idx_auditoria_fecha (fecha_accion),
+  CONSTRAINT auditoria_ibfk_1 FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Datos base
+
+INSERT INTO roles (id, nombre, descripcion) VALUES
+  (1, 'admin', 'Administrador del sistema con acceso total'),
+  (2, 'doctor', 'Médico que puede diagnosticar y recetar'),
+  (3, 'secretaria', 'Personal administrativo que gestiona citas'),
+  (4, 'paciente', 'Usuario que consulta su información médica');
+
+INSERT INTO especialidades (id, nombre, descripcion) VALUES
+  (1, 'Medicina General', 'Atención médica general'),
+  (2, 'Cardiología', 'Especialista en corazón y sistema cardiovascular'),
+  (3, 'Pediatría', 'Especialista en niños y adolescentes'),
+  (4, 'Ginecología', 'Especialista en salud femenina'),
+  (5, 'Dermatología', 'Especialista en piel'),
+  (6, 'Odontología', 'Especialista en salud dental');
+
+-- (rol_id, modulo, ver, crear, editar, eliminar)
+INSERT INTO permisos (rol_id, modulo, puede_ver, puede_crear, puede_editar, puede_eliminar) VALUES
+  (1, 'citas', 1, 1, 1, 1),
+  (1, 'historias_clinicas', 1, 0, 0, 0),
+  (1, 'recetas', 1, 0, 0, 0),
+  (2, 'citas', 1, 0, 0, 0),
+  (2, 'historias_clinicas', 1, 1, 1, 0),
+  (2, 'recetas', 1, 1, 1, 0),
+  (3, 'citas', 1, 1, 1, 1),
+  (4, 'mi_historia_clinica', 1, 0, 0, 0),
+  (4, 'mis_recetas', 1, 0, 0, 0);
@@ -0,0 +1,8 @@
+-- Contadores diarios del dashboard de administración (estadisticas.py)
+CREATE TABLE estadisticas_diarias (
+  fecha DATE NOT NULL,
+  clave VARCHAR(50) NOT NULL,
+  valor INT NOT NULL DEFAULT 0,
+  reconciliado_en DATETIME NOT NULL,
+  PRIMARY KEY (fecha, clave)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,9 @@
+-- Índices compuestos usados por las consultas de app.py
+
+-- Paginación por cursor: (filtro, fecha, id) para recorrer en orden sin filesort
+CREATE INDEX idx_historias_doctor_fecha ON historias_clinicas (doctor_id, fecha_consulta, id);
+CREATE INDEX idx_historias_paciente_fecha ON historias_clinicas (paciente_id, fecha_consulta, id);
+CREATE INDEX idx_recetas_paciente_fecha ON recetas (paciente_id, activa, fecha_emision, id);
+
+-- Agenda: choques y turnos libres por doctor en orden de fecha
+CREATE INDEX idx_citas_doctor_fecha ON citas (doctor_id, fecha_hora);
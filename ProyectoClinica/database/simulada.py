@@ -0,0 +1,99 @@
+"""
+Base de datos simulada en memoria para ejecutar la app sin MySQL.
+Responde cada consulta según reglas (expresión regular -> filas) y
+guarda todas las sentencias ejecutadas.
+"""
+import itertools
+import re
+
+
+class CursorSimulado:
+    def __init__(self, bd):
+        self.bd = bd
+        self._filas = []
+        self.description = None
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, query, args=None):
+        self.bd.ejecutadas.append((query, args))
+        filas, columnas = self.bd.responder(query, args)
+        self._filas = list(filas)
+        self.rowcount = len(self._filas)
+        self.description = [(c, None, None, None, None, None, None) for c in columnas] or None
+        if query.lstrip().upper().startswith('INSERT'):
+            self.lastrowid = next(self.bd.ids)
+            self.rowcount = 1
+        return self.rowcount
+
+    def executemany(self, query, args):
+        args = list(args)
+        self.bd.ejecutadas.append((query, args))
+        self.lastrowid = next(self.bd.ids)
+        self.rowcount = len(args)
+        return self.rowcount
+
+    def fetchone(self):
+        return self._filas.pop(0) if self._filas else None
+
+    def fetchall(self):
+        filas, self._filas = self._filas, []
+        return filas
+
+    def fetchmany(self, tamano=1):
+        filas, self._filas = self._filas[:tamano], self._filas[tamano:]
+        return filas
+
+    def __iter__(self):
+        while self._filas:
+            yield self._filas.pop(0)
+
+    def close(self):
+        pass
+
+
+class ConexionSimulada:
+    def __init__(self, bd):
+        self.bd = bd
+
+    def cursor(self, *args, **kwargs):
+        return CursorSimulado(self.bd)
+
+    def commit(self):
+        self.bd.commits += 1
+
+    def rollback(self):
+        pass
+
+    def ping(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BDSimulada:
+    """
+    `reglas` es una lista de (patrón, filas, columnas). `filas` puede ser
+    una lista o una función (query, args) -> lista. La primera regla cuyo
+    patrón aparece en la consulta decide la respuesta; si ninguna coincide
+    se devuelve un resultado vacío.
+    """
+
+    def __init__(self, reglas=()):
+        self.reglas = [(re.compile(p, re.IGNORECASE | re.DOTALL), f, c) for p, f, c in reglas]
+        self.ejecutadas = []
+        self.commits = 0
+        self.ids = itertools.count(1000)
+
+    def agregar_regla(self, patron, filas, columnas=()):
+        self.reglas.insert(0, (re.compile(patron, re.IGNORECASE | re.DOTALL), filas, columnas))
+
+    def responder(self, query, args):
+        for patron, filas, columnas in self.reglas:
+            if patron.search(query):
+                return (filas(query, args) if callable(filas) else filas), columnas
+        return [], ()
+
+    def conectar(self):
+        return ConexionSimulada(self)
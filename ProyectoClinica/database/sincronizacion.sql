@@ -0,0 +1,22 @@
+-- Versiones compartidas entre los procesos de la app (versiones.py).
+-- Cada escritura que deja vieja una caché en memoria incrementa su clave;
+-- los procesos comparan el valor con el que cargaron.
+CREATE TABLE versiones (
+  clave VARCHAR(100) NOT NULL PRIMARY KEY,
+  valor BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Última modificación de cada cuenta (identidad.RegistroCambios): cualquier
+-- UPDATE de la fila la actualiza, así las sesiones abiertas ven al momento
+-- que la cuenta se desactivó o cambió de rol
+ALTER TABLE usuarios
+  ADD COLUMN actualizado_en TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+    ON UPDATE CURRENT_TIMESTAMP(6),
+  ADD KEY idx_usuarios_actualizado (actualizado_en);
+
+-- Última modificación de cada cita (agenda_en_vivo.AgendaDelDia): cada proceso
+-- trae cada pocos segundos las citas modificadas desde su revisión anterior
+ALTER TABLE citas
+  ADD COLUMN actualizado_en TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+    ON UPDATE CURRENT_TIMESTAMP(6),
+  ADD KEY idx_citas_actualizado (actualizado_en);
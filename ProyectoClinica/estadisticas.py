@@ -0,0 +1,196 @@
+"""
+Contadores diarios precalculados para el dashboard de administración.
+
+Las peticiones solo reconcilian el día de hoy; los días pasados que no
+quedaron cerrados se completan fuera de ellas:
+
+Uso: python estadisticas.py [DESDE] [HASTA]   # YYYY-MM-DD, por defecto los últimos 90 días
+"""
+import sys
+from datetime import date, timedelta
+
+from fechas import ventana_rango, filtro_ventana
+
+USUARIOS_ACTIVOS = 'usuarios_activos'
+CITAS = 'citas'
+CONSULTAS = 'consultas'
+
+# Consulta de origen para reconciliar cada contador en un día [inicio, fin)
+CONSULTAS_ORIGEN = {
+    # Los usuarios activos no dependen del día: es una foto del total que
+    # solo se toma para hoy
+    USUARIOS_ACTIVOS: ("SELECT COUNT(*) FROM usuarios WHERE activo = TRUE", False),
+    CITAS: ("SELECT COUNT(*) FROM citas WHERE " + filtro_ventana('fecha_hora'), True),
+    CONSULTAS: ("SELECT COUNT(*) FROM historias_clinicas WHERE "
+                + filtro_ventana('fecha_consulta'), True),
+}
+
+
+class Estadisticas:
+    """
+    Contadores por (fecha, clave) en la tabla estadisticas_diarias.
+    Las escrituras los incrementan al momento; la lectura reconcilia
+    contra las tablas de origen los días que faltan o cuya última
+    reconciliación tiene más de `reconciliar_cada` segundos.
+
+    `paralelo` es opcional, con la forma de MySQLPool.en_paralelo: si se
+    indica, las consultas de origen de un día se ejecutan a la vez.
+    """
+
+    def __init__(self, reloj, reconciliar_cada=900, historial_max_dias=90, paralelo=None):
+        self.reloj = reloj
+        self.reconciliar_cada = reconciliar_cada
+        self.historial_max_dias = historial_max_dias
+        self.paralelo = paralelo
+
+    def incrementar(self, conexion, clave, fecha, delta=1):
+        """
+        Suma `delta` al contador de ese día si ya existe. Si la fila no
+        existe se deja así: la primera lectura del día la reconcilia.
+        """
+        cursor = conexion.cursor()
+        cursor.execute("""
+            UPDATE estadisticas_diarias SET valor = valor + %s
+            WHERE fecha = %s AND clave = %s
+        """, (delta, fecha, clave))
+        conexion.commit()
+        cursor.close()
+
+    def claves(self, fecha):
+        """Contadores que se pueden reconciliar para ese día"""
+        hoy = self.reloj().date()
+        return [clave for clave, (_, por_dia) in CONSULTAS_ORIGEN.items()
+                if por_dia or fecha == hoy]
+
+    def reconciliar(self, conexion, fecha):
+        """
+        Recalcula los contadores de un día contra las tablas de origen y los
+        guarda con `conexion`. La foto de usuarios activos solo se toma si
+        `fecha` es hoy; en otro día se conserva la que haya.
+        En paralelo, un contador cuya consulta falla o se demora queda fuera
+        del resultado y se reintenta en la próxima lectura; solo se lanza el
+        error si fallan todos.
+        """
+        ventana = ventana_rango(fecha, fecha)
+        tareas = {}
+        for clave in self.claves(fecha):
+            query, por_dia = CONSULTAS_ORIGEN[clave]
+            tareas[clave] = _contar(query, ventana if por_dia else ())
+        if self.paralelo:
+            valores, errores = self.paralelo(tareas)
+            if not valores:
+                raise next(iter(errores.values()))
+        else:
+            valores = {clave: contar(conexion) for clave, contar in tareas.items()}
+
+        cursor = conexion.cursor()
+        cursor.executemany("""
+            REPLACE INTO estadisticas_diarias (fecha, clave, valor, reconciliado_en)
+            VALUES (%s, %s, %s, %s)
+        """, [(fecha, clave, valor, self.reloj()) for clave, valor in valores.items()])
+        conexion.commit()
+        cursor.close()
+        return valores
+
+    def _leer(self, conexion, desde, hasta):
+        """
+        Una sola lectura de los días entre desde y hasta. Devuelve
+        ({fecha: {clave: valor}}, días vigentes): un día pasado está vigente
+        si se reconcilió después de terminar; hoy, si se reconcilió hace
+        menos de `reconciliar_cada` segundos.
+        """
+        cursor = conexion.cursor()
+        cursor.execute("""
+            SELECT fecha, clave, valor, reconciliado_en
+            FROM estadisticas_diarias
+            WHERE fecha >= %s AND fecha <= %s
+        """, (desde, hasta))
+        filas = cursor.fetchall()
+        cursor.close()
+
+        ahora = self.reloj()
+        hoy = ahora.date()
+        dias = {}
+        vigentes = set()
+        for fecha, clave, valor, reconciliado_en in filas:
+            dias.setdefault(fecha, {})[clave] = valor
+            if fecha < hoy and reconciliado_en.date() > fecha:
+                vigentes.add(fecha)
+            elif fecha == hoy and (ahora - reconciliado_en).total_seconds() < self.reconciliar_cada:
+                vigentes.add(fecha)
+        # Un día al que le falta algún contador sigue pendiente
+        for fecha, contadores in dias.items():
+            if not contadores.keys() >= set(self.claves(fecha)):
+                vigentes.discard(fecha)
+        return dias, vigentes
+
+    def historial(self, conexion, desde, hasta, obtener_escritura=None):
+        """
+        Devuelve {fecha: {clave: valor}} para cada día entre desde y hasta,
+        sin pasar de hoy, con una sola lectura. Solo hoy se reconcilia aquí;
+        los días pasados se entregan como estén guardados y los pendientes
+        los completa rellenar().
+        Si `conexion` es de solo lectura (réplica), `obtener_escritura`
+        entrega la conexión principal para reconciliar.
+        """
+        hoy = self.reloj().date()
+        hasta = min(hasta, hoy)
+        if (hasta - desde).days >= self.historial_max_dias:
+            desde = hasta - timedelta(days=self.historial_max_dias - 1)
+        if desde > hasta:
+            return {}
+
+        dias, vigentes = self._leer(conexion, desde, hasta)
+        resultado = {}
+        fecha = desde
+        while fecha <= hasta:
+            contadores = dias.get(fecha, {})
+            if fecha == hoy and fecha not in vigentes:
+                # Lo que no se pudo reconciliar conserva el valor guardado, si lo hay
+                contadores = {**contadores, **self.reconciliar(
+                    obtener_escritura() if obtener_escritura else conexion, fecha)}
+            resultado[fecha] = contadores
+            fecha += timedelta(days=1)
+        return resultado
+
+    def rellenar(self, conexion, desde, hasta):
+        """Reconcilia los días pasados entre desde y hasta que no quedaron cerrados; devuelve cuántos"""
+        hasta = min(hasta, self.reloj().date() - timedelta(days=1))
+        _, vigentes = self._leer(conexion, desde, hasta)
+        total = 0
+        fecha = desde
+        while fecha <= hasta:
+            if fecha not in vigentes:
+                self.reconciliar(conexion, fecha)
+                total += 1
+            fecha += timedelta(days=1)
+        return total
+
+    def del_dia(self, conexion, fecha=None, obtener_escritura=None):
+        fecha = fecha or self.reloj().date()
+        return self.historial(conexion, fecha, fecha, obtener_escritura)[fecha]
+
+
+def _contar(query, args):
+    """Tarea que ejecuta un COUNT(*) en la conexión que recibe"""
+    def contar(conexion):
+        cursor = conexion.cursor()
+        cursor.execute(query, args)
+        valor = cursor.fetchone()[0]
+        cursor.close()
+        return valor
+    return contar
+
+
+if __name__ == '__main__':
+    import app as clinica
+
+    app = clinica.crear_app()
+    mysql, contadores = clinica.mysql, clinica.estadisticas
+
+    ayer = contadores.reloj().date() - timedelta(days=1)
+    hasta = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else ayer
+    desde = (date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1
+             else hasta - timedelta(days=contadores.historial_max_dias - 1))
+    with app.app_context():
+        print(f"📊 {contadores.rellenar(mysql.connection, desde, hasta)} días reconciliados")
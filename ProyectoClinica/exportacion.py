@@ -0,0 +1,93 @@
+"""
+Exportación en streaming (CSV / NDJSON) con cursores del lado del servidor
+"""
+import csv
+import io
+import json
+
+from MySQLdb.cursors import SSCursor
+
+# formato -> mimetype de la respuesta
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _escritor_csv(buffer, columnas):
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    return escritor.writerow
+
+
+def _escritor_ndjson(buffer, columnas):
+    def escribir(fila):
+        buffer.write(json.dumps(dict(zip(columnas, fila)), default=str, ensure_ascii=False))
+        buffer.write('\n')
+    return escribir
+
+
+ESCRITORES = {'csv': _escritor_csv, 'ndjson': _escritor_ndjson}
+
+
+def exportar(conexion, query, params, formato, tamano_lote=1000, tamano_bloque=64 * 1024,
+             net_write_timeout=None, al_cortar=None, filas_previas=(), columnas=None,
+             al_empezar=None):
+    """
+    Generador de bloques de texto con el resultado de `query`.
+    Lee con SSCursor de a `tamano_lote` filas, así que la memoria no
+    depende del tamaño del resultado. Si el cliente corta la descarga se
+    llama `al_cortar` en vez de leer el resto de filas: la conexión queda
+    con un resultado pendiente y debe cerrarse, no volver al pool.
+    `filas_previas` (p. ej. auditoría archivada) se escriben antes que el
+    resultado y deben tener sus mismas columnas: con `columnas` el
+    encabezado y esas filas salen antes de ejecutar la consulta, que así no
+    queda con el resultado a medio leer mientras se envían. Al terminar, la sesión
+    vuelve al net_write_timeout por defecto antes de que la conexión
+    regrese al pool. `al_empezar` se llama una vez, al empezar a generar y
+    antes de abrir el resultado: con un SSCursor pendiente la conexión no
+    admite otra sentencia.
+    """
+    if al_empezar:
+        al_empezar()
+    cursor = conexion.cursor(SSCursor)
+    completo = False
+    try:
+        buffer = io.StringIO()
+        escribir = None
+        if columnas is not None:
+            escribir = ESCRITORES[formato](buffer, columnas)
+            for fila in filas_previas:
+                escribir(fila)
+                if buffer.tell() >= tamano_bloque:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        if net_write_timeout:
+            # MySQL aborta el envío si el cliente tarda más que esto en leer
+            cursor.execute("SET SESSION net_write_timeout = %s", (net_write_timeout,))
+        cursor.execute(query, params)
+        if escribir is None:
+            escribir = ESCRITORES[formato](buffer, [col[0] for col in cursor.description])
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                break
+            for fila in filas:
+                escribir(fila)
+            if buffer.tell() >= tamano_bloque:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        completo = True
+    finally:
+        if completo:
+            cursor.close()
+            if net_write_timeout:
+                restaurar = conexion.cursor()
+                restaurar.execute("SET SESSION net_write_timeout = DEFAULT")
+                restaurar.close()
+        elif al_cortar:
+            al_cortar()
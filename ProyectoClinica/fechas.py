@@ -0,0 +1,39 @@
+"""
+Ventanas de fechas para consultas que usan índices
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+
+def ahora(zona):
+    """
+    Fecha y hora actual en la zona horaria de la clínica, sin tzinfo (como la
+    guarda MySQL). Con zona None es la hora local del servidor.
+    """
+    if zona is None:
+        return datetime.now()
+    return datetime.now(ZoneInfo(zona)).replace(tzinfo=None)
+
+
+def ventana_rango(desde, hasta):
+    """
+    Devuelve (inicio, fin) semiabierto [inicio, fin) que cubre los días
+    `desde` a `hasta`, ambos incluidos.
+    """
+    inicio = datetime.combine(desde, time.min)
+    fin = datetime.combine(hasta + timedelta(days=1), time.min)
+    return inicio, fin
+
+
+def ventana_dia(zona, dia=None):
+    """Devuelve (inicio, fin) del día indicado, por defecto hoy en la clínica"""
+    dia = dia or ahora(zona).date()
+    return ventana_rango(dia, dia)
+
+
+def filtro_ventana(columna):
+    """
+    Condición SQL sobre la columna sin envolverla en funciones,
+    para que MySQL pueda hacer un range scan sobre su índice.
+    """
+    return f"{columna} >= %s AND {columna} < %s"
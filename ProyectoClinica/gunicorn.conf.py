@@ -0,0 +1,63 @@
+"""
+Configuración de gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('CLINICA_BIND', '0.0.0.0:8000')
+
+# Un worker por núcleo menos uno, con hilos: cada conexión SSE de la agenda en
+# vivo ocupa un hilo mientras el navegador la mantiene abierta
+nucleos = multiprocessing.cpu_count()
+workers = int(os.environ.get('CLINICA_WORKERS', max(1, nucleos - 1)))
+worker_class = 'gthread'
+threads = int(os.environ.get('CLINICA_THREADS', 16))
+
+# Cada worker importa y calienta la app por su cuenta: el pool de conexiones y
+# los hilos de auditoría y de contraseñas no sobreviven a un fork
+preload_app = False
+
+# Los hilos de hash de todos los workers suman a lo sumo núcleos - 1, para que
+# los logins en ráfaga no dejen sin CPU al resto de las peticiones; con más
+# workers que eso cada uno conserva un hilo
+os.environ.setdefault('CLINICA_CLAVES_HILOS', str(max(1, (nucleos - 1) // workers)))
+# Las pantallas con la agenda en vivo ocupan a lo sumo la mitad de los hilos
+os.environ.setdefault('CLINICA_AGENDA_EN_VIVO_MAX', str(max(1, threads // 2)))
+# Lecturas en paralelo (mysql.en_paralelo) a la vez por worker
+paralelo = int(os.environ.setdefault('CLINICA_MYSQL_PARALELO_HILOS', '4'))
+# El pool de cada worker debe alcanzar para todos sus hilos y, además, para las
+# lecturas en paralelo que piden conexión mientras su petición retiene la suya
+os.environ.setdefault('CLINICA_MYSQL_POOL_MAX', str(threads + paralelo))
+# Cada worker vuelca sus histogramas de /admin/metricas aquí y el que atiende el
+# scrape suma los de todos; si no se indica uno, el directorio es de este master
+# y se borra al salir
+metricas_propio = 'CLINICA_METRICAS_DIR' not in os.environ
+if metricas_propio:
+    os.environ['CLINICA_METRICAS_DIR'] = tempfile.mkdtemp(prefix='clinica-metricas-')
+metricas_dir = os.environ['CLINICA_METRICAS_DIR']
+
+
+def child_exit(server, worker):
+    # Un worker reciclado o caído deja de sumar en /admin/metricas
+    try:
+        os.remove(os.path.join(metricas_dir, f'{worker.pid}.json'))
+    except FileNotFoundError:
+        pass
+
+
+def on_exit(server):
+    if metricas_propio:
+        shutil.rmtree(metricas_dir, ignore_errors=True)
+
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar workers de a poco para acotar el crecimiento de memoria de las cachés
+max_requests = 20000
+max_requests_jitter = 2000
+
+accesslog = '-'
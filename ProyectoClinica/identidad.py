@@ -0,0 +1,130 @@
+"""
+Identidad del usuario autenticado para cada petición
+"""
+import threading
+import time
+
+# Consulta única que resuelve el usuario y su entidad según el rol; leido_en es la
+# hora de la BD con la que se comparan los cambios de RegistroCambios
+QUERY_IDENTIDAD = """
+    SELECT u.id, u.username, u.password, u.rol_id, u.nombre_completo, r.nombre as rol,
+           d.id as doctor_id, p.id as paciente_id, UNIX_TIMESTAMP(NOW(6)) as leido_en
+    FROM usuarios u
+    JOIN roles r ON u.rol_id = r.id
+    LEFT JOIN doctores d ON d.usuario_id = u.id
+    LEFT JOIN pacientes p ON p.usuario_id = u.id
+    WHERE {condicion} AND u.activo = TRUE
+"""
+
+
+class Identidad:
+    """Datos del usuario en sesión, incluyendo doctor_id o paciente_id"""
+
+    def __init__(self, usuario_id, rol, rol_id, doctor_id=None, paciente_id=None):
+        self.usuario_id = usuario_id
+        self.rol = rol
+        self.rol_id = rol_id
+        self.doctor_id = doctor_id
+        self.paciente_id = paciente_id
+
+    @classmethod
+    def desde_sesion(cls, session):
+        return cls(session['usuario_id'], session.get('rol'), session.get('rol_id'),
+                   session.get('doctor_id'), session.get('paciente_id'))
+
+
+def guardar_en_sesion(session, user):
+    """Copia a la sesión una fila obtenida con QUERY_IDENTIDAD"""
+    session['usuario_id'] = user[0]
+    session['username'] = user[1]
+    session['rol_id'] = user[3]
+    session['nombre_completo'] = user[4]
+    session['rol'] = user[5]
+    session['doctor_id'] = user[6]
+    session['paciente_id'] = user[7]
+    session['identidad_ts'] = float(user[8])
+
+
+# Segundos de holgura: un cambio que se confirma tarde puede llevar un
+# actualizado_en anterior a la última revisión o a la lectura de la sesión
+MARGEN = 10
+
+QUERY_AHORA = "SELECT UNIX_TIMESTAMP(NOW(6))"
+
+QUERY_CAMBIOS = """
+    SELECT id, UNIX_TIMESTAMP(actualizado_en)
+    FROM usuarios
+    WHERE actualizado_en >= FROM_UNIXTIME(%s)
+"""
+
+QUERY_MARCAR = "UPDATE usuarios SET actualizado_en = NOW(6) WHERE id = %s"
+
+
+class RegistroCambios:
+    """
+    Cuentas modificadas según usuarios.actualizado_en (database/sincronizacion.sql),
+    que cambia con cualquier UPDATE de la fila: desactivarla, cambiar su rol.
+    Cada proceso relee los cambios cada `intervalo` segundos y recuerda los
+    de las últimas `retencion`; las sesiones leídas antes de un cambio, o de
+    lo que el registro alcanza a recordar, vuelven a resolver la identidad.
+    """
+
+    def __init__(self, intervalo=5, retencion=3600):
+        self.intervalo = intervalo
+        self.retencion = retencion
+        self._cambios = {}
+        # Hora de la BD de la última lectura y desde cuándo se conocen los cambios
+        self._marca = None
+        self._base = None
+        self._revisado_en = None
+        self._lock = threading.Lock()
+        self._revision = threading.Lock()
+
+    def vigente(self):
+        return (self._revisado_en is not None
+                and time.monotonic() - self._revisado_en < self.intervalo)
+
+    def cargar(self, conexion):
+        """Lee los cambios desde la última lectura (la primera vez, los de `retencion`)"""
+        cursor = conexion.cursor()
+        cursor.execute(QUERY_AHORA)
+        ahora = float(cursor.fetchone()[0])
+        desde = ahora - self.retencion if self._marca is None else self._marca - MARGEN
+        cursor.execute(QUERY_CAMBIOS, (desde,))
+        cambios = {usuario_id: float(marca) for usuario_id, marca in cursor.fetchall()}
+        cursor.close()
+
+        corte = ahora - self.retencion
+        with self._lock:
+            self._cambios.update(cambios)
+            if self._base is None or self._base < corte:
+                self._cambios = {u: m for u, m in self._cambios.items() if m >= corte}
+                self._base = corte
+            self._marca = ahora
+            self._revisado_en = time.monotonic()
+
+    def revisar(self, obtener_conexion):
+        """Relee los cambios si pasó el intervalo; mientras un hilo lee, los demás siguen"""
+        if self.vigente() or not self._revision.acquire(blocking=False):
+            return
+        try:
+            if not self.vigente():
+                self.cargar(obtener_conexion())
+        finally:
+            self._revision.release()
+
+    def cambiado_desde(self, usuario_id, desde):
+        """Indica si la identidad leída en `desde` (hora de la BD) puede estar vieja"""
+        if desde is None or self._base is None or desde < self._base:
+            return True
+        cambio = self._cambios.get(usuario_id)
+        return cambio is not None and cambio >= desde - MARGEN
+
+    def marcar(self, conexion, usuario_id):
+        """
+        Marca la cuenta como modificada cuando el cambio no toca su fila en
+        usuarios (p. ej. su registro en doctores); confirma quien llama.
+        """
+        cursor = conexion.cursor()
+        cursor.execute(QUERY_MARCAR, (usuario_id,))
+        cursor.close()
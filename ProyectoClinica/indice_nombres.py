@@ -0,0 +1,163 @@
+"""
+Búsqueda de pacientes y doctores por prefijo de las palabras del nombre,
+sin acentos, con un índice en MySQL.
+
+Cada palabra normalizada de nombre_completo se guarda en nombres_palabras
+junto al id del paciente o del doctor; la llave primaria (entidad,
+palabra, registro_id) resuelve cada prefijo con un rango del índice.
+El registro de pacientes indexa en la misma transacción en que inserta;
+para datos cargados por fuera:
+
+Uso: python indice_nombres.py   # reconstruye el índice completo
+"""
+import unicodedata
+
+PACIENTE = 'paciente'
+DOCTOR = 'doctor'
+
+PALABRA_LARGO_MAX = 60
+TERMINOS_MAX = 5
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos: 'José Pérez' -> 'jose perez'"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def palabras(nombre):
+    """Palabras normalizadas y sin repetir de un nombre"""
+    return sorted({palabra[:PALABRA_LARGO_MAX] for palabra in normalizar(nombre).split()})
+
+
+QUERY_INSERTAR = """
+    INSERT INTO nombres_palabras (entidad, palabra, registro_id)
+    VALUES (%s, %s, %s)
+"""
+
+
+def indexar(cursor, entidad, registro_id, nombre):
+    """Agrega el nombre al índice; el commit lo hace quien llama"""
+    filas = [(entidad, palabra, registro_id) for palabra in palabras(nombre)]
+    if filas:
+        cursor.executemany(QUERY_INSERTAR, filas)
+
+
+# Registros activos con una palabra que empieza por el primer término y, por
+# cada término adicional, otra palabra que empieza por él. Los filtros, el
+# orden y la paginación van en la misma consulta, sin tope previo de
+# candidatos, para que hay_mas y las páginas siguientes sean exactos
+QUERY_BUSCAR = {
+    PACIENTE: """
+        SELECT DISTINCT p.id, u.nombre_completo
+        FROM nombres_palabras n
+        JOIN pacientes p ON p.id = n.registro_id
+        JOIN usuarios u ON p.usuario_id = u.id
+        WHERE n.entidad = %s AND n.palabra LIKE %s{adicionales}
+          AND u.activo = TRUE{filtros}
+        ORDER BY u.nombre_completo, p.id
+        LIMIT %s OFFSET %s
+    """,
+    DOCTOR: """
+        SELECT DISTINCT d.id, u.nombre_completo, e.nombre as especialidad, e.id as especialidad_id
+        FROM nombres_palabras n
+        JOIN doctores d ON d.id = n.registro_id
+        JOIN usuarios u ON d.usuario_id = u.id
+        JOIN especialidades e ON d.especialidad_id = e.id
+        WHERE n.entidad = %s AND n.palabra LIKE %s{adicionales}
+          AND u.activo = TRUE{filtros}
+        ORDER BY u.nombre_completo, d.id
+        LIMIT %s OFFSET %s
+    """,
+}
+
+QUERY_ADICIONAL = """
+          AND EXISTS (SELECT 1 FROM nombres_palabras n{i}
+                      WHERE n{i}.entidad = n.entidad AND n{i}.registro_id = n.registro_id
+                        AND n{i}.palabra LIKE %s)"""
+
+
+def prefijo(termino):
+    """Patrón LIKE que busca `termino` al principio, con los comodines escapados"""
+    return termino.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def buscar(conexion, entidad, texto, limite=20, desplazamiento=0, filtros=None):
+    """
+    Devuelve ([(id, nombre, *extra), ...], hay_mas) con los registros activos
+    cuyo nombre tiene una palabra que empieza por cada término buscado.
+    `filtros` mapea condiciones SQL extra (p. ej. 'd.especialidad_id = %s')
+    a su parámetro.
+    """
+    # Empezar por el término más largo, que suele ser el más selectivo
+    terminos = sorted({t[:PALABRA_LARGO_MAX] for t in normalizar(texto).split()},
+                      key=len, reverse=True)[:TERMINOS_MAX]
+    if not terminos:
+        return [], False
+    filtros = filtros or {}
+
+    query = QUERY_BUSCAR[entidad].format(
+        adicionales=''.join(QUERY_ADICIONAL.format(i=i) for i in range(1, len(terminos))),
+        filtros=''.join(f' AND {condicion}' for condicion in filtros))
+
+    cursor = conexion.cursor()
+    try:
+        cursor.execute(query, (entidad, *map(prefijo, terminos), *filtros.values(),
+                               limite + 1, desplazamiento))
+        registros = cursor.fetchall()
+    finally:
+        cursor.close()
+    return registros[:limite], len(registros) > limite
+
+
+# Nombre de cada paciente y doctor para reconstruir el índice
+QUERY_NOMBRES = {
+    PACIENTE: """
+        SELECT p.id, u.nombre_completo
+        FROM pacientes p
+        JOIN usuarios u ON p.usuario_id = u.id
+        WHERE p.id > %s
+        ORDER BY p.id
+        LIMIT %s
+    """,
+    DOCTOR: """
+        SELECT d.id, u.nombre_completo
+        FROM doctores d
+        JOIN usuarios u ON d.usuario_id = u.id
+        WHERE d.id > %s
+        ORDER BY d.id
+        LIMIT %s
+    """,
+}
+
+
+def reconstruir(conexion, lote=1000):
+    """Vacía nombres_palabras y vuelve a indexar pacientes y doctores, de a `lote`"""
+    cursor = conexion.cursor()
+    cursor.execute("TRUNCATE TABLE nombres_palabras")
+    total = 0
+    for entidad, query in QUERY_NOMBRES.items():
+        ultimo = 0
+        while True:
+            cursor.execute(query, (ultimo, lote))
+            filas = cursor.fetchall()
+            if not filas:
+                break
+            indice = [(entidad, palabra, registro_id) for registro_id, nombre in filas
+                      for palabra in palabras(nombre)]
+            if indice:
+                cursor.executemany(QUERY_INSERTAR, indice)
+            conexion.commit()
+            ultimo = filas[-1][0]
+            total += len(filas)
+    cursor.close()
+    return total
+
+
+if __name__ == '__main__':
+    from app import crear_app, mysql
+
+    app = crear_app()
+
+    with app.app_context():
+        print(f"🔎 {reconstruir(mysql.connection)} pacientes y doctores indexados")
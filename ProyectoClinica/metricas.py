@@ -0,0 +1,254 @@
+"""
+Instrumentación por petición: consultas, tiempo de BD, render y latencia
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import g, request, has_app_context, has_request_context, before_render_template, template_rendered
+
+logger = logging.getLogger('clinica.consultas_lentas')
+
+# Límites superiores (segundos) de los buckets de tiempo
+BUCKETS_TIEMPO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites superiores de los buckets de cantidad de consultas
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * (len(buckets) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.conteos[bisect.bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def sumar(self, conteos, suma, total):
+        for i, conteo in enumerate(conteos):
+            self.conteos[i] += conteo
+        self.suma += suma
+        self.total += total
+
+    def prometheus(self, nombre, etiquetas):
+        lineas = []
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+        lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {self.total}')
+        lineas.append(f'{nombre}_sum{{{etiquetas}}} {self.suma:.6f}')
+        lineas.append(f'{nombre}_count{{{etiquetas}}} {self.total}')
+        return lineas
+
+
+# (nombre de la métrica, buckets, descripción)
+SERIES = (
+    ('clinica_consultas_por_peticion', BUCKETS_CONSULTAS, 'Sentencias SQL ejecutadas por petición'),
+    ('clinica_bd_segundos', BUCKETS_TIEMPO, 'Tiempo en cursor.execute por petición'),
+    ('clinica_render_segundos', BUCKETS_TIEMPO, 'Tiempo en render_template por petición'),
+    ('clinica_peticion_segundos', BUCKETS_TIEMPO, 'Latencia total de la petición'),
+)
+
+
+class CursorInstrumentado:
+    """Envuelve un cursor MySQLdb midiendo cada execute / executemany"""
+
+    def __init__(self, cursor, metricas):
+        self._cursor = cursor
+        self._metricas = metricas
+
+    def execute(self, query, args=None):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            self._metricas.registrar_consulta(query, args, time.perf_counter() - inicio)
+
+    def executemany(self, query, args):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            self._metricas.registrar_consulta(query, args, time.perf_counter() - inicio, lote=True)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class ConexionInstrumentada:
+    """Envuelve una conexión para que sus cursores queden instrumentados"""
+
+    def __init__(self, conexion, metricas):
+        self._conexion = conexion
+        self._metricas = metricas
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self._conexion.cursor(*args, **kwargs), self._metricas)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion, nombre)
+
+
+def forma_parametros(args, lote=False):
+    """Describe los parámetros sin exponer sus valores (pueden ser datos clínicos)"""
+    if args is None:
+        return '()'
+    if lote:
+        args = list(args)
+        return f'{len(args)} x {forma_parametros(args[0]) if args else "()"}'
+    if isinstance(args, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in args.items()) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in args) + ')'
+
+
+class Metricas:
+    """
+    Registro de histogramas por endpoint. init_app conecta los hooks de
+    petición y las señales de plantillas; envolver() instrumenta conexiones.
+
+    Cada worker de gunicorn tiene su propio registro. Con METRICAS_DIR, cada
+    uno vuelca el suyo en <pid>.json a lo sumo cada METRICAS_VOLCADO segundos
+    y la exportación suma los de todos los workers vivos; sin directorio se
+    exporta solo el del proceso que atiende, con la etiqueta pid.
+    """
+
+    def __init__(self, app=None):
+        self._series = {}
+        self._lock = threading.Lock()
+        self.umbral_lento = 0.2
+        self.directorio = None
+        self.volcado = 5
+        self._volcado_en = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICAS_CONSULTA_LENTA_MS', 200)
+        app.config.setdefault('METRICAS_DIR', None)
+        app.config.setdefault('METRICAS_VOLCADO', 5)
+        self.umbral_lento = app.config['METRICAS_CONSULTA_LENTA_MS'] / 1000
+        self.directorio = app.config['METRICAS_DIR']
+        self.volcado = app.config['METRICAS_VOLCADO']
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+        app.before_request(self._inicio_peticion)
+        app.teardown_request(self._fin_peticion)
+        before_render_template.connect(self._inicio_render, app)
+        template_rendered.connect(self._fin_render, app)
+
+    def envolver(self, conexion):
+        return ConexionInstrumentada(conexion, self)
+
+    # --- hooks ---
+
+    def _inicio_peticion(self):
+        g.metricas = {'inicio': time.perf_counter(), 'consultas': 0, 'bd': 0.0, 'render': 0.0}
+
+    def _inicio_render(self, sender, template, context, **extra):
+        if 'metricas' in g:
+            g.metricas['render_inicio'] = time.perf_counter()
+
+    def _fin_render(self, sender, template, context, **extra):
+        datos = g.get('metricas')
+        if datos and 'render_inicio' in datos:
+            datos['render'] += time.perf_counter() - datos.pop('render_inicio')
+
+    def _fin_peticion(self, exception=None):
+        datos = g.pop('metricas', None)
+        if datos is None:
+            return
+        endpoint = request.endpoint or 'desconocido'
+        if endpoint == 'static':
+            return
+        valores = (datos['consultas'], datos['bd'], datos['render'],
+                   time.perf_counter() - datos['inicio'])
+        with self._lock:
+            series = self._series.get(endpoint)
+            if series is None:
+                series = self._series[endpoint] = [Histograma(b) for _, b, _ in SERIES]
+            for histograma, valor in zip(series, valores):
+                histograma.observar(valor)
+        if self.directorio and time.monotonic() - self._volcado_en >= self.volcado:
+            self.volcar()
+
+    def registrar_consulta(self, query, args, segundos, lote=False):
+        datos = g.get('metricas') if has_app_context() else None
+        if datos is not None:
+            datos['consultas'] += 1
+            datos['bd'] += segundos
+        if segundos >= self.umbral_lento:
+            logger.warning('Consulta lenta (%.1f ms) en %s: %s | parámetros %s',
+                           segundos * 1000, request.endpoint if has_request_context() else '-',
+                           ' '.join(query.split()), forma_parametros(args, lote))
+
+    # --- exportación ---
+
+    def volcar(self):
+        """Escribe el registro de este proceso en METRICAS_DIR/<pid>.json"""
+        self._volcado_en = time.monotonic()
+        with self._lock:
+            datos = {endpoint: [[h.conteos, h.suma, h.total] for h in series]
+                     for endpoint, series in self._series.items()}
+        ruta = os.path.join(self.directorio, f'{os.getpid()}.json')
+        temporal = f'{ruta}.{threading.get_ident()}.tmp'
+        with open(temporal, 'w') as archivo:
+            json.dump(datos, archivo)
+        # Quien lee nunca ve un archivo a medio escribir
+        os.replace(temporal, ruta)
+
+    def _combinadas(self):
+        """{endpoint: [Histograma, ...]} sumando los volcados de todos los workers"""
+        self.volcar()
+        combinadas = {}
+        for ruta in glob.glob(os.path.join(self.directorio, '*.json')):
+            try:
+                with open(ruta) as archivo:
+                    datos = json.load(archivo)
+            except (OSError, ValueError):
+                # El worker terminó y child_exit lo borró mientras se listaba
+                continue
+            for endpoint, valores in datos.items():
+                series = combinadas.get(endpoint)
+                if series is None:
+                    series = combinadas[endpoint] = [Histograma(b) for _, b, _ in SERIES]
+                for histograma, (conteos, suma, total) in zip(series, valores):
+                    histograma.sumar(conteos, suma, total)
+        return combinadas
+
+    def prometheus(self, extras=None):
+        """
+        Texto en formato de exposición de Prometheus. `extras` es un dict
+        {nombre_metrica: {etiqueta: valor}} de gauges adicionales; son del
+        proceso que atiende y llevan su pid.
+        """
+        pid = os.getpid()
+        if self.directorio:
+            todas, etiqueta_pid = self._combinadas(), ''
+        else:
+            with self._lock:
+                todas = {endpoint: list(series) for endpoint, series in self._series.items()}
+            etiqueta_pid = f',pid="{pid}"'
+        lineas = []
+        with self._lock:
+            for i, (nombre, _, ayuda) in enumerate(SERIES):
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} histogram')
+                for endpoint, series in sorted(todas.items()):
+                    lineas.extend(series[i].prometheus(nombre, f'endpoint="{endpoint}"{etiqueta_pid}'))
+        for nombre, valores in (extras or {}).items():
+            lineas.append(f'# TYPE {nombre} gauge')
+            for etiqueta, valor in valores.items():
+                lineas.append(f'{nombre}{{tipo="{etiqueta}",pid="{pid}"}} {valor}')
+        return '\n'.join(lineas) + '\n'
+
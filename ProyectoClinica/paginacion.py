@@ -0,0 +1,49 @@
+"""
+Paginación por cursor (keyset) sobre listados ordenados por (fecha, id)
+"""
+import base64
+import binascii
+from datetime import datetime
+
+
+def codificar_cursor(fecha, id_):
+    texto = f"{fecha.isoformat()}|{id_}"
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(valor):
+    """Devuelve (fecha, id); lanza ValueError si el cursor no es válido"""
+    relleno = '=' * (-len(valor) % 4)
+    try:
+        fecha, id_ = base64.urlsafe_b64decode(valor + relleno).decode().split('|')
+        return datetime.fromisoformat(fecha), int(id_)
+    except (UnicodeDecodeError, TypeError, binascii.Error) as e:
+        raise ValueError(f'Cursor inválido: {valor}') from e
+
+
+def consultar_pagina(cursor, query, params, columna_fecha, columna_id, cursor_pagina, tamano):
+    """
+    Ejecuta `query`, que debe contener {filtro_cursor} dentro del WHERE y
+    ordenar por (columna_fecha DESC, columna_id DESC) sin LIMIT.
+    Devuelve (filas, siguiente_cursor); siguiente_cursor es None en la última página.
+    """
+    params = list(params)
+    filtro = ''
+    if cursor_pagina:
+        fecha, id_ = decodificar_cursor(cursor_pagina)
+        # Forma expandida de (fecha, id) < (%s, %s) para que MySQL use el índice compuesto
+        filtro = (f"AND ({columna_fecha} < %s OR "
+                  f"({columna_fecha} = %s AND {columna_id} < %s))")
+        params += [fecha, fecha, id_]
+
+    cursor.execute(query.format(filtro_cursor=filtro) + " LIMIT %s", params + [tamano + 1])
+    filas = cursor.fetchall()
+
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        nombres = [col[0] for col in cursor.description]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(ultima[nombres.index(columna_fecha.split('.')[-1])],
+                                     ultima[nombres.index(columna_id.split('.')[-1])])
+    return filas, siguiente
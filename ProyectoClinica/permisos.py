@@ -0,0 +1,100 @@
+"""
+Caché en memoria de la matriz de permisos
+"""
+import threading
+import time
+
+import versiones
+
+# Clave de la tabla versiones que invalidar() incrementa
+VERSION = 'permisos'
+
+
+class CachePermisos:
+    """
+    Guarda la tabla permisos indexada por (rol_id, modulo).
+    Se carga completa al arrancar. invalidar() incrementa la versión
+    'permisos' en la BD y cada proceso la compara, a lo sumo cada `ttl`
+    segundos, con la que cargó: solo si cambió vuelve a leer la matriz.
+    Así un cambio de permisos llega a todos los workers en `ttl` segundos.
+    """
+
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+        self._matriz = {}
+        self._version = None
+        self._revisado_en = None
+        self._lock = threading.Lock()
+        # Un solo hilo revisa la versión; los demás esperan su resultado
+        self._revision = threading.Lock()
+
+    def cargar(self, conexion):
+        """Lee todos los permisos de la base de datos y reemplaza la matriz"""
+        version = versiones.leer(conexion, [VERSION])[VERSION]
+        cursor = conexion.cursor()
+        cursor.execute("""
+            SELECT rol_id, modulo, puede_ver, puede_crear, puede_editar, puede_eliminar
+            FROM permisos
+        """)
+        filas = cursor.fetchall()
+        cursor.close()
+
+        matriz = {(fila[0], fila[1]): tuple(fila[2:]) for fila in filas}
+        with self._lock:
+            self._matriz = matriz
+            self._version = version
+            self._revisado_en = time.monotonic()
+            self.recargas += 1
+
+    def vigente(self):
+        """Indica si la matriz está cargada y su versión se revisó hace menos de `ttl`"""
+        return (self._revisado_en is not None
+                and time.monotonic() - self._revisado_en < self.ttl)
+
+    def obtener(self, rol_id, modulo, obtener_conexion):
+        """
+        Devuelve (puede_ver, puede_crear, puede_editar, puede_eliminar)
+        o None si el rol no tiene permisos para el módulo.
+        `obtener_conexion` solo se llama si hay que revisar la versión.
+        """
+        if self.vigente():
+            with self._lock:
+                self.aciertos += 1
+        else:
+            with self._lock:
+                self.fallos += 1
+            self._revisar(obtener_conexion)
+        return self._matriz.get((rol_id, modulo))
+
+    def _revisar(self, obtener_conexion):
+        with self._revision:
+            if self.vigente():
+                return
+            conexion = obtener_conexion()
+            if self._version is None or versiones.leer(conexion, [VERSION])[VERSION] != self._version:
+                self.cargar(conexion)
+            else:
+                with self._lock:
+                    self._revisado_en = time.monotonic()
+
+    def invalidar(self, conexion):
+        """
+        Debe llamarse después de confirmar un cambio en la tabla permisos:
+        este proceso recarga en la próxima consulta y los demás al revisar.
+        """
+        versiones.incrementar(conexion, VERSION)
+        with self._lock:
+            self._revisado_en = None
+
+    def estadisticas(self):
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'recargas': self.recargas,
+            'entradas': len(self._matriz),
+            'ttl': self.ttl,
+            'vigente': self.vigente(),
+        }
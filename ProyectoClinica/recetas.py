@@ -0,0 +1,139 @@
+"""
+Creación de recetas en una sola transacción
+"""
+from datetime import date
+
+import MySQLdb
+
+from auditoria import QUERY_INSERTAR as QUERY_AUDITORIA
+
+QUERY_RECETA = """
+    INSERT INTO recetas
+    (historia_clinica_id, paciente_id, doctor_id, instrucciones_generales, fecha_vencimiento)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+QUERY_MEDICAMENTO = """
+    INSERT INTO medicamentos_receta
+    (receta_id, nombre_medicamento, dosis, frecuencia, duracion)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+
+QUERY_HISTORIAS = "SELECT id, paciente_id FROM historias_clinicas WHERE id IN ({marcadores})"
+
+
+class ErrorReceta(ValueError):
+    """Los datos de la receta no son válidos; no se escribió nada"""
+
+    def __init__(self, mensaje, indice=None):
+        super().__init__(mensaje)
+        # Posición de la receta en el lote, si el error es de una en particular
+        self.indice = indice
+
+
+def validar_receta(paciente_id, historia_id, fecha_vencimiento, hoy=None):
+    """
+    Convierte los campos de una receta tal como llegan del formulario o del
+    JSON: paciente_id entero, historia_id entero o vacío y fecha_vencimiento
+    YYYY-MM-DD o vacía, no anterior a `hoy`. Devuelve los tres ya convertidos.
+    """
+    def entero(valor, nombre):
+        if isinstance(valor, bool):
+            raise ErrorReceta(f'{nombre} debe ser un número')
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            raise ErrorReceta(f'{nombre} debe ser un número') from None
+
+    paciente_id = entero(paciente_id, 'paciente_id')
+    historia_id = entero(historia_id, 'historia_id') if historia_id not in (None, '') else None
+    if fecha_vencimiento in (None, ''):
+        fecha_vencimiento = None
+    else:
+        try:
+            fecha_vencimiento = date.fromisoformat(fecha_vencimiento)
+        except (TypeError, ValueError):
+            raise ErrorReceta('fecha_vencimiento debe tener el formato YYYY-MM-DD') from None
+        if hoy is not None and fecha_vencimiento < hoy:
+            raise ErrorReceta('La fecha de vencimiento ya pasó')
+    return paciente_id, historia_id, fecha_vencimiento
+
+
+def validar_medicamentos(medicamentos, dosis, frecuencias, duraciones):
+    """
+    Recibe las listas paralelas del formulario y devuelve
+    [(nombre, dosis, frecuencia, duracion), ...] ignorando filas vacías.
+    """
+    if not len(medicamentos) == len(dosis) == len(frecuencias) == len(duraciones):
+        raise ErrorReceta('Las listas de medicamento, dosis, frecuencia y duración no coinciden')
+
+    filas = []
+    for i, nombre in enumerate(medicamentos):
+        if not nombre:  # Solo si hay medicamento
+            continue
+        if not (dosis[i] and frecuencias[i] and duraciones[i]):
+            raise ErrorReceta(f'Faltan dosis, frecuencia o duración para {nombre}')
+        filas.append((nombre, dosis[i], frecuencias[i], duraciones[i]))
+
+    if not filas:
+        raise ErrorReceta('La receta debe tener al menos un medicamento')
+    return filas
+
+
+def crear_recetas(conexion, recetas, doctor_id, usuario_id, ip, fecha):
+    """
+    Inserta varias recetas con sus medicamentos y su auditoría en una
+    transacción. Cada receta es un dict con paciente_id, historia_id,
+    instrucciones, fecha_vencimiento y medicamentos (ya validados).
+    `fecha` es la hora de la clínica para la auditoría.
+    Devuelve los ids creados; si algo falla no queda nada escrito. Una
+    historia de otro paciente o un paciente inexistente lanzan ErrorReceta
+    con el índice de la receta.
+    """
+    cursor = conexion.cursor()
+    try:
+        # La historia, si se indica, debe ser del mismo paciente: una consulta para todo el lote
+        historias = {receta['historia_id'] for receta in recetas if receta.get('historia_id') is not None}
+        if historias:
+            cursor.execute(QUERY_HISTORIAS.format(marcadores=', '.join(['%s'] * len(historias))),
+                           list(historias))
+            pacientes = dict(cursor.fetchall())
+            for i, receta in enumerate(recetas):
+                historia_id = receta.get('historia_id')
+                if historia_id is not None and pacientes.get(historia_id) != receta['paciente_id']:
+                    raise ErrorReceta(f'La historia clínica {historia_id} no existe o es de otro paciente', i)
+
+        ids = []
+        lineas = []
+        for i, receta in enumerate(recetas):
+            try:
+                cursor.execute(QUERY_RECETA, (
+                    receta.get('historia_id'), receta['paciente_id'], doctor_id,
+                    receta.get('instrucciones'), receta.get('fecha_vencimiento')
+                ))
+            except MySQLdb.IntegrityError:
+                # Llave foránea: el paciente no existe
+                raise ErrorReceta(f"El paciente {receta['paciente_id']} no existe", i) from None
+            receta_id = cursor.lastrowid
+            ids.append(receta_id)
+            lineas.extend((receta_id, *med) for med in receta['medicamentos'])
+
+        # Un único INSERT multi-fila para todos los medicamentos y otro para la auditoría
+        cursor.executemany(QUERY_MEDICAMENTO, lineas)
+        cursor.executemany(QUERY_AUDITORIA, [
+            (usuario_id, 'crear', 'recetas', receta_id, None, ip, fecha.replace(microsecond=0))
+            for receta_id in ids
+        ])
+        conexion.commit()
+        return ids
+    except Exception:
+        conexion.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def crear_receta(conexion, receta, doctor_id, usuario_id, ip, fecha):
+    """Crea una receta; ver crear_recetas"""
+    return crear_recetas(conexion, [receta], doctor_id, usuario_id, ip, fecha)[0]
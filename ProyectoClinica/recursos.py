@@ -0,0 +1,243 @@
+"""
+Recursos estáticos con huella en el nombre, minificados y precomprimidos.
+
+`python recursos.py` copia cada archivo de static/ a static/build/ con el
+hash de su contenido en el nombre (css/dashboard.3f9a0c1d2e.css), minifica
+CSS y JS y guarda al lado sus versiones .gz y .br. Un archivo con huella no
+cambia nunca, así que se sirve con Cache-Control immutable por un año.
+
+Con el manifiesto generado, url_for('static', filename='css/dashboard.css')
+devuelve la URL con huella sin tocar las plantillas. Sin manifiesto, o con
+la app en modo debug, todo sale de static/ como siempre.
+
+Uso: python recursos.py   # en cada despliegue, antes de arrancar los workers
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    # Opcional: sin el paquete brotli solo se generan las versiones .gz
+    brotli = None
+
+CARPETA = 'build'
+MANIFIESTO = 'manifiesto.json'
+
+# Extensiones que vale la pena comprimir; imágenes y fuentes ya vienen comprimidas
+COMPRIMIBLES = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+
+# Cadenas y comentarios primero, para no tocar lo que hay dentro de una cadena
+_CADENAS_CSS = r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+_TOKENS_CSS = re.compile(f'({_CADENAS_CSS})' + r'|/\*.*?\*/', re.S)
+_URL_CSS = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+# Cadenas, plantillas y comentarios de JS. Una / es una expresión regular si
+# viene después de un operador o de un paréntesis/llave que abre (como JSMin)
+_TOKENS_JS = re.compile(r'''("(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)'''
+                        r'''|(/\*.*?\*/|//[^\n]*)'''
+                        r'''|((?<=[(,=:\[!&|?{};])\s*/(?![/*])(?:\\.|\[(?:\\.|[^\]\\])*\]|[^/\\\n])+/[a-z]*)''',
+                        re.S)
+
+
+def minificar_css(texto):
+    """Quita comentarios y espacios sobrantes (no alrededor de +, - ni paréntesis: calc y @media)"""
+    sin_comentarios = _TOKENS_CSS.sub(lambda coincidencia: coincidencia.group(1) or ' ', texto)
+    partes = re.split(f'({_CADENAS_CSS})', sin_comentarios)
+    for i in range(0, len(partes), 2):
+        parte = re.sub(r'\s+', ' ', partes[i])
+        parte = re.sub(r'\s*([{};,>])\s*', r'\1', parte)
+        partes[i] = re.sub(r':\s+', ':', parte).replace(';}', '}')
+    return ''.join(partes).strip()
+
+
+def minificar_js(texto):
+    """
+    Quita comentarios, sangría, espacios repetidos y líneas vacías; cadenas,
+    plantillas y expresiones regulares quedan intactas. Los saltos de línea
+    se conservan para no depender de la inserción automática de punto y coma.
+    """
+    partes, desde = [], 0
+
+    def codigo(fragmento):
+        fragmento = re.sub(r'[ \t]+', ' ', fragmento)
+        return re.sub(r' ?\n[\s]*', '\n', fragmento)
+
+    for token in _TOKENS_JS.finditer(texto):
+        fragmento = codigo(texto[desde:token.start()])
+        # Sin el comentario quedarían dos saltos seguidos
+        if partes and partes[-1].endswith('\n') and fragmento.startswith('\n'):
+            fragmento = fragmento[1:]
+        partes.append(fragmento)
+        cadena, comentario, regex = token.groups()
+        if comentario is None:
+            partes.append(cadena if cadena is not None else regex)
+        elif comentario.startswith('/*'):
+            partes.append(' ')
+        desde = token.end()
+    partes.append(codigo(texto[desde:]))
+    return ''.join(partes).strip()
+
+
+MINIFICADORES = {'.css': minificar_css, '.js': minificar_js}
+
+
+def _compresores():
+    compresores = [('gzip', '.gz', lambda datos: gzip.compress(datos, 9, mtime=0))]
+    if brotli is not None:
+        compresores.insert(0, ('br', '.br', lambda datos: brotli.compress(datos, quality=11)))
+    return compresores
+
+
+def _reescribir_urls(css, relativa, manifiesto):
+    """url(...) relativas de una hoja de estilos -> nombres con huella"""
+    carpeta = posixpath.dirname(relativa)
+
+    def reemplazo(coincidencia):
+        comillas, url = coincidencia.groups()
+        ruta = url.split('?', 1)[0].split('#', 1)[0]
+        if re.match(r'^[a-z]+:|^/|^data:', url):
+            return coincidencia.group(0)
+        destino = manifiesto.get(posixpath.normpath(posixpath.join(carpeta, ruta)))
+        if destino is None:
+            return coincidencia.group(0)
+        nuevo = posixpath.relpath(destino['archivo'], carpeta) + url[len(ruta):]
+        return f'url({comillas}{nuevo}{comillas})'
+
+    return _URL_CSS.sub(reemplazo, css)
+
+
+def construir(origen, destino=None):
+    """
+    Genera en `destino` (static/build) los archivos con huella, sus versiones
+    comprimidas y el manifiesto {original: {'archivo', 'codificaciones'}}.
+    Se conservan los archivos del manifiesto anterior para las páginas que
+    aún los piden durante un despliegue; los más viejos se borran.
+    """
+    destino = destino or os.path.join(origen, CARPETA)
+    anterior = _leer(os.path.join(destino, MANIFIESTO)) or {}
+
+    originales = []
+    for raiz, carpetas, archivos in os.walk(origen):
+        carpetas[:] = sorted(c for c in carpetas if os.path.join(raiz, c) != destino)
+        originales += [os.path.relpath(os.path.join(raiz, archivo), origen).replace(os.sep, '/')
+                       for archivo in sorted(archivos)]
+    # Las hojas de estilo al final: sus url(...) apuntan a nombres ya generados
+    originales.sort(key=lambda relativa: relativa.endswith('.css'))
+
+    manifiesto = {}
+    for relativa in originales:
+        base, extension = posixpath.splitext(relativa)
+        with open(os.path.join(origen, relativa), 'rb') as archivo:
+            datos = archivo.read()
+        if extension in MINIFICADORES:
+            texto = MINIFICADORES[extension](datos.decode('utf-8'))
+            if extension == '.css':
+                texto = _reescribir_urls(texto, relativa, manifiesto)
+            datos = texto.encode('utf-8')
+
+        nombre = f'{base}.{hashlib.sha256(datos).hexdigest()[:10]}{extension}'
+        _escribir(os.path.join(destino, nombre), datos)
+        codificaciones = []
+        if extension in COMPRIMIBLES:
+            for codificacion, sufijo, comprimir in _compresores():
+                comprimido = comprimir(datos)
+                if len(comprimido) < len(datos):
+                    _escribir(os.path.join(destino, nombre + sufijo), comprimido)
+                    codificaciones.append(codificacion)
+        manifiesto[relativa] = {'archivo': nombre, 'codificaciones': codificaciones}
+
+    _escribir(os.path.join(destino, MANIFIESTO),
+              json.dumps(manifiesto, indent=2, sort_keys=True).encode('utf-8'))
+
+    vigentes = {MANIFIESTO}
+    for entrada in (*manifiesto.values(), *anterior.values()):
+        vigentes.add(entrada['archivo'])
+        vigentes.update(entrada['archivo'] + sufijo for _, sufijo, _ in _compresores())
+    for raiz, _, archivos in os.walk(destino):
+        for archivo in archivos:
+            ruta = os.path.join(raiz, archivo)
+            if os.path.relpath(ruta, destino).replace(os.sep, '/') not in vigentes:
+                os.remove(ruta)
+    return manifiesto
+
+
+def _escribir(ruta, datos):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta + '.tmp', 'wb') as archivo:
+        archivo.write(datos)
+    os.replace(ruta + '.tmp', ruta)
+
+
+def _leer(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+class Recursos:
+    """
+    Conecta el manifiesto de static/build con la app: url_for('static', ...)
+    resuelve los nombres con huella y la ruta static entrega la versión .br
+    o .gz que acepte el navegador, con Content-Encoding y Cache-Control
+    immutable. En producción conviene que el servidor web sirva /static/build
+    directamente (gzip_static / brotli_static en nginx).
+    """
+
+    def __init__(self, app=None):
+        self.manifiesto = {}
+        self._codificaciones = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RECURSOS_MAX_AGE', 365 * 24 * 3600)
+        self.app = app
+        self.directorio = os.path.join(app.static_folder, CARPETA)
+        self.manifiesto = _leer(os.path.join(self.directorio, MANIFIESTO)) or {}
+        self._codificaciones = {entrada['archivo']: entrada['codificaciones']
+                                for entrada in self.manifiesto.values()}
+        app.url_defaults(self._con_huella)
+        app.view_functions['static'] = self.servir
+
+    def _con_huella(self, endpoint, values):
+        # En debug se editan los originales: el build puede estar desactualizado
+        if endpoint != 'static' or self.app.debug:
+            return
+        entrada = self.manifiesto.get(values.get('filename'))
+        if entrada is not None:
+            values['filename'] = f"{CARPETA}/{entrada['archivo']}"
+
+    def servir(self, filename):
+        nombre = filename[len(CARPETA) + 1:] if filename.startswith(CARPETA + '/') else None
+        if nombre not in self._codificaciones:
+            return self.app.send_static_file(filename)
+
+        mimetype = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+        codificacion = next((c for c in self._codificaciones[nombre] if c in request.accept_encodings),
+                            None)
+        sufijo = {'br': '.br', 'gzip': '.gz', None: ''}[codificacion]
+        respuesta = send_from_directory(self.directorio, nombre + sufijo, mimetype=mimetype,
+                                        max_age=self.app.config['RECURSOS_MAX_AGE'])
+        if codificacion:
+            respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.cache_control.public = True
+        respuesta.cache_control.immutable = True
+        respuesta.vary.add('Accept-Encoding')
+        return respuesta
+
+
+if __name__ == '__main__':
+    estaticos = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    generado = construir(estaticos)
+    print(f"📦 {len(generado)} recursos con huella en static/{CARPETA}"
+          + ('' if brotli else ' (sin brotli: pip install brotli para generar .br)'))
@@ -0,0 +1,409 @@
+"""
+Informes de uso de la clínica sobre una copia columnar de citas e
+historias clínicas.
+
+La copia es un conjunto de arreglos NumPy (.npy, un archivo por columna)
+en REPORTES_DIR con un manifiesto que indica la versión vigente. Las filas
+se guardan ordenadas por fecha: un rango de fechas, lo ya ocurrido y cada
+mes son tramos contiguos que se ubican con búsqueda binaria.
+refrescar() agrega las filas con id mayor que el último copiado y vuelve a
+leer las citas desde hace REPORTES_VENTANA_CAMBIOS días, que son las que
+todavía cambian de estado; cada REPORTES_RECONSTRUIR_DIAS días se copia
+todo de nuevo. Los informes se calculan en memoria con operaciones
+vectoriales, sin consultar la BD.
+
+Uso: python reportes.py              # refresco incremental (cron, cada pocos minutos)
+     python reportes.py --completo   # copia completa
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, time as hora, timedelta
+
+import numpy as np
+from MySQLdb.cursors import SSCursor
+
+# Códigos de citas.estado en la columna 'estado'
+ESTADOS = ('programada', 'confirmada', 'completada', 'cancelada')
+PROGRAMADA, CONFIRMADA, COMPLETADA, CANCELADA = range(len(ESTADOS))
+_CODIGOS = {estado: codigo for codigo, estado in enumerate(ESTADOS)}
+
+MANIFIESTO = 'instantanea.json'
+
+# tabla -> {columna: dtype}, en el orden de las columnas de su consulta.
+# La columna de fecha de cada tabla es la que define su orden.
+FECHA = {'citas': 'inicio', 'historias': 'fecha'}
+TABLAS = {
+    'citas': {'id': np.int64, 'doctor_id': np.int32, 'inicio': 'datetime64[m]',
+              'duracion': np.int16, 'estado': np.int8},
+    'historias': {'id': np.int64, 'doctor_id': np.int32, 'fecha': 'datetime64[m]'},
+}
+
+QUERY_CITAS = """
+    SELECT id, doctor_id, fecha_hora, COALESCE(duracion_minutos, %s), estado
+    FROM citas
+    WHERE id > %s
+    ORDER BY id
+"""
+
+# Citas ya copiadas que aún pueden cambiar: las de la ventana reciente y las futuras
+QUERY_CITAS_CAMBIOS = """
+    SELECT id, doctor_id, fecha_hora, COALESCE(duracion_minutos, %s), estado
+    FROM citas
+    WHERE fecha_hora >= %s AND id <= %s
+"""
+
+QUERY_HISTORIAS = """
+    SELECT id, doctor_id, fecha_consulta
+    FROM historias_clinicas
+    WHERE id > %s
+    ORDER BY id
+"""
+
+QUERY_DOCTORES = """
+    SELECT d.id, u.nombre_completo, d.especialidad_id
+    FROM doctores d
+    JOIN usuarios u ON d.usuario_id = u.id
+"""
+
+QUERY_ESPECIALIDADES = "SELECT id, nombre FROM especialidades"
+
+
+def _columnas(tabla, filas):
+    """Lote de filas de la consulta de `tabla` -> {columna: arreglo}"""
+    tipos = TABLAS[tabla]
+    if not filas:
+        return {nombre: np.empty(0, dtype=tipo) for nombre, tipo in tipos.items()}
+    valores = dict(zip(tipos, zip(*filas)))
+    if 'estado' in valores:
+        # estado admite NULL; la columna tiene 'programada' por defecto
+        valores['estado'] = [_CODIGOS.get(estado, PROGRAMADA) for estado in valores['estado']]
+    return {nombre: np.array(valores[nombre], dtype=tipo) for nombre, tipo in tipos.items()}
+
+
+def _leer(conexion, tabla, query, params, tamano_lote):
+    """Ejecuta `query` con un cursor de servidor y concatena los lotes por columna"""
+    partes = []
+    cursor = conexion.cursor(SSCursor)
+    cursor.execute(query, params)
+    while True:
+        filas = cursor.fetchmany(tamano_lote)
+        if not filas:
+            break
+        partes.append(_columnas(tabla, filas))
+    cursor.close()
+    if not partes:
+        return _columnas(tabla, [])
+    return {nombre: np.concatenate([parte[nombre] for parte in partes]) for nombre in TABLAS[tabla]}
+
+
+def _unir_ordenado(tabla, actual, nuevas):
+    """Agrega `nuevas` y reordena por fecha (estable: a igual fecha, por id)"""
+    unidas = {nombre: np.concatenate([actual[nombre], nuevas[nombre]]) for nombre in actual}
+    orden = np.argsort(unidas[FECHA[tabla]], kind='stable')
+    return {nombre: arreglo[orden] for nombre, arreglo in unidas.items()}
+
+
+def _aplicar_cambios(citas, cambios):
+    """Sobrescribe en `citas` las filas releídas en `cambios`; devuelve cuántas encontró"""
+    por_id = np.argsort(citas['id'])
+    ids = citas['id'][por_id]
+    posiciones = np.minimum(np.searchsorted(ids, cambios['id']), len(ids) - 1)
+    existe = ids[posiciones] == cambios['id']
+    destino = por_id[posiciones[existe]]
+    for nombre in citas:
+        if nombre != 'id':
+            citas[nombre][destino] = cambios[nombre][existe]
+    return int(existe.sum())
+
+
+def _ultimo_id(columnas):
+    return int(columnas['id'].max()) if len(columnas['id']) else 0
+
+
+def refrescar(directorio, conexion, hoy, duracion_defecto=30, ventana_cambios=30,
+              reconstruir_dias=7, completo=False, tamano_lote=50000):
+    """
+    Actualiza la instantánea de `directorio` y devuelve su manifiesto.
+    La nueva versión se escribe en archivos aparte y el manifiesto se
+    reemplaza al final, así que los lectores ven la versión anterior
+    completa o la nueva completa.
+    """
+    anterior = leer_manifiesto(directorio)
+    if anterior is not None and not completo:
+        reconstruida = datetime.fromisoformat(anterior['reconstruida'])
+        completo = datetime.combine(hoy, hora.min) - reconstruida >= timedelta(days=reconstruir_dias)
+
+    if anterior is None or completo:
+        citas = _columnas('citas', [])
+        historias = _columnas('historias', [])
+        reconstruida = datetime.combine(hoy, hora.min)
+    else:
+        citas = cargar_tabla(directorio, anterior, 'citas', copiar=True)
+        historias = cargar_tabla(directorio, anterior, 'historias', copiar=True)
+        reconstruida = datetime.fromisoformat(anterior['reconstruida'])
+
+    ultima_cita = _ultimo_id(citas)
+    cambiadas = 0
+    if ultima_cita:
+        desde = datetime.combine(hoy - timedelta(days=ventana_cambios), hora.min)
+        cambios = _leer(conexion, 'citas', QUERY_CITAS_CAMBIOS,
+                        (duracion_defecto, desde, ultima_cita), tamano_lote)
+        cambiadas = _aplicar_cambios(citas, cambios)
+    citas = _unir_ordenado('citas', citas, _leer(conexion, 'citas', QUERY_CITAS,
+                                                 (duracion_defecto, ultima_cita), tamano_lote))
+    historias = _unir_ordenado('historias', historias,
+                               _leer(conexion, 'historias', QUERY_HISTORIAS,
+                                     (_ultimo_id(historias),), tamano_lote))
+
+    cursor = conexion.cursor()
+    cursor.execute(QUERY_DOCTORES)
+    doctores = [list(fila) for fila in cursor.fetchall()]
+    cursor.execute(QUERY_ESPECIALIDADES)
+    especialidades = [list(fila) for fila in cursor.fetchall()]
+    cursor.close()
+
+    version = (anterior['version'] + 1) if anterior else 1
+    os.makedirs(directorio, exist_ok=True)
+    for tabla, columnas in (('citas', citas), ('historias', historias)):
+        for nombre, arreglo in columnas.items():
+            np.save(_ruta_columna(directorio, version, tabla, nombre), arreglo)
+
+    manifiesto = {
+        'version': version,
+        'generada': datetime.now().replace(microsecond=0).isoformat(),
+        'reconstruida': reconstruida.isoformat(),
+        'filas': {'citas': len(citas['id']), 'historias': len(historias['id'])},
+        'citas_cambiadas': cambiadas,
+        'doctores': doctores,
+        'especialidades': especialidades,
+    }
+    temporal = os.path.join(directorio, MANIFIESTO + '.tmp')
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, ensure_ascii=False)
+    os.replace(temporal, os.path.join(directorio, MANIFIESTO))
+
+    # Se conserva la versión anterior por si un proceso la está cargando
+    for ruta in glob.glob(os.path.join(directorio, 'v*_*.npy')):
+        if int(os.path.basename(ruta)[1:].split('_', 1)[0]) < version - 1:
+            try:
+                os.remove(ruta)
+            except OSError:
+                # En Windows no se borra un archivo mapeado; se reintenta en el próximo refresco
+                pass
+    return manifiesto
+
+
+def _ruta_columna(directorio, version, tabla, columna):
+    return os.path.join(directorio, f'v{version}_{tabla}.{columna}.npy')
+
+
+def leer_manifiesto(directorio):
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def cargar_tabla(directorio, manifiesto, tabla, copiar=False):
+    """{columna: arreglo}; sin `copiar` los arreglos se mapean en memoria de solo lectura"""
+    return {nombre: np.load(_ruta_columna(directorio, manifiesto['version'], tabla, nombre),
+                            mmap_mode=None if copiar else 'r')
+            for nombre in TABLAS[tabla]}
+
+
+class Instantanea:
+    """
+    Columnas de una versión más el índice denso de doctor de cada fila
+    (posición en `doctores`; len(doctores) si el doctor no está en la lista)
+    y la especialidad de cada doctor con la misma convención.
+    """
+
+    def __init__(self, directorio, manifiesto):
+        self.manifiesto = manifiesto
+        self.citas = cargar_tabla(directorio, manifiesto, 'citas')
+        self.historias = cargar_tabla(directorio, manifiesto, 'historias')
+        self.doctores = manifiesto['doctores']
+        self.especialidades = manifiesto['especialidades']
+
+        n = len(self.doctores)
+        ids = [doctor[0] for doctor in self.doctores]
+        tope = max([*ids, int(self.citas['doctor_id'].max(initial=0)),
+                    int(self.historias['doctor_id'].max(initial=0))]) + 1
+        indice = np.full(tope, n, dtype=np.int32)
+        indice[ids] = np.arange(n, dtype=np.int32)
+        self.doctor_cita = indice[self.citas['doctor_id']]
+        self.doctor_historia = indice[self.historias['doctor_id']]
+
+        posicion = {id_: i for i, (id_, _) in enumerate(self.especialidades)}
+        self.especialidad_doctor = np.array(
+            [posicion.get(doctor[2], len(self.especialidades)) for doctor in self.doctores]
+            + [len(self.especialidades)], dtype=np.int32)
+
+
+def _tasa(parte, total):
+    return np.divide(parte, total, out=np.zeros(len(total)), where=total > 0)
+
+
+def _tramos(fechas, desde, hasta, cortes):
+    """
+    Sobre `fechas` ordenadas: (a, b) del rango [desde, hasta) y la
+    posición relativa a `a` de cada fecha de `cortes`
+    """
+    a, b = np.searchsorted(fechas, [desde, hasta])
+    return a, b, np.searchsorted(fechas[a:b], cortes)
+
+
+class Reportes:
+    """
+    Lee la instantánea de `directorio` y calcula los informes. Cada
+    `verificar_cada` segundos revisa si el manifiesto cambió y, si es así,
+    carga la nueva versión. La jornada (horas y días laborales) es la de la
+    agenda y define los minutos disponibles de cada doctor.
+    """
+
+    def __init__(self, directorio, reloj, hora_inicio=8, hora_fin=18,
+                 dias_laborales=(0, 1, 2, 3, 4), verificar_cada=30):
+        self.directorio = directorio
+        self.reloj = reloj
+        self.minutos_jornada = (hora_fin - hora_inicio) * 60
+        self.dias_semana = [dia in dias_laborales for dia in range(7)]
+        self.verificar_cada = verificar_cada
+        self._instantanea = None
+        self._modificada = None
+        self._verificada = 0.0
+        self._lock = threading.Lock()
+
+    def instantanea(self):
+        """Instantánea vigente o None si todavía no se generó ninguna"""
+        if time.monotonic() - self._verificada >= self.verificar_cada:
+            with self._lock:
+                self._verificada = time.monotonic()
+                try:
+                    modificada = os.stat(os.path.join(self.directorio, MANIFIESTO)).st_mtime_ns
+                except FileNotFoundError:
+                    return self._instantanea
+                if modificada != self._modificada:
+                    self._instantanea = Instantanea(self.directorio, leer_manifiesto(self.directorio))
+                    self._modificada = modificada
+        return self._instantanea
+
+    def informe(self, desde, hasta):
+        """
+        Uso de la clínica entre las fechas `desde` y `hasta` (incluidas):
+        por doctor (ocupación, cancelaciones, inasistencias), por
+        especialidad y por mes. Una cita cuenta como inasistencia si ya pasó
+        y sigue programada o confirmada. None si no hay instantánea.
+        """
+        inst = self.instantanea()
+        if inst is None:
+            return None
+        inicio = np.datetime64(desde, 'm')
+        fin = np.datetime64(hasta + timedelta(days=1), 'm')
+        ahora = np.datetime64(self.reloj(), 'm')
+        meses = np.arange(np.datetime64(desde, 'M'), np.datetime64(hasta, 'M') + 1)
+        # Límites entre meses y entre lo ya ocurrido y lo futuro, como posiciones en el tramo
+        cortes = np.concatenate([meses[1:].astype('datetime64[m]'), [ahora]])
+        n, m, e = len(inst.doctores), len(inst.especialidades), len(ESTADOS)
+
+        a, b, posiciones = _tramos(inst.citas['inicio'], inicio, fin, cortes)
+        limites_mes, pasadas_hasta = posiciones[:-1], posiciones[-1]
+        estado = inst.citas['estado'][a:b].astype(np.int32)
+        doctor = inst.doctor_cita[a:b]
+        mes = np.repeat(np.arange(len(meses)), np.diff(limites_mes, prepend=0, append=b - a))
+
+        # Una sola pasada por combinación: (doctor, estado) y (mes, estado), todas y solo pasadas
+        doctor_estado = doctor * e + estado
+        mes_estado = mes * e + estado
+        por_doctor = np.bincount(doctor_estado, minlength=(n + 1) * e).reshape(n + 1, e)
+        pasadas_doctor = np.bincount(doctor_estado[:pasadas_hasta],
+                                     minlength=(n + 1) * e).reshape(n + 1, e)
+        por_mes = np.bincount(mes_estado, minlength=len(meses) * e).reshape(-1, e)
+        pasadas_mes = np.bincount(mes_estado[:pasadas_hasta],
+                                  minlength=len(meses) * e).reshape(-1, e)
+        minutos = np.bincount(doctor, weights=np.where(estado == CANCELADA, 0,
+                                                       inst.citas['duracion'][a:b]),
+                              minlength=n + 1)
+
+        ha, hb, limites_consultas = _tramos(inst.historias['fecha'], inicio, fin,
+                                            meses[1:].astype('datetime64[m]'))
+        consultas = np.bincount(inst.doctor_historia[ha:hb], minlength=n + 1)
+        consultas_mes = np.diff(limites_consultas, prepend=0, append=hb - ha)
+
+        citas = por_doctor.sum(axis=1)
+        canceladas = por_doctor[:, CANCELADA]
+        inasistencias = pasadas_doctor[:, PROGRAMADA] + pasadas_doctor[:, CONFIRMADA]
+        pasadas = pasadas_doctor.sum(axis=1) - pasadas_doctor[:, CANCELADA]
+        disponibles = int(np.busday_count(np.datetime64(desde, 'D'), np.datetime64(hasta, 'D') + 1,
+                                          weekmask=self.dias_semana)) * self.minutos_jornada
+        ocupacion = minutos / disponibles if disponibles else np.zeros(n + 1)
+        tasa_cancelacion = _tasa(canceladas, citas)
+        tasa_inasistencia = _tasa(inasistencias, pasadas)
+
+        doctores = [{
+            'id': doctor_id, 'nombre': nombre, 'especialidad_id': especialidad_id,
+            'citas': int(citas[i]), 'completadas': int(por_doctor[i, COMPLETADA]),
+            'canceladas': int(canceladas[i]), 'inasistencias': int(inasistencias[i]),
+            'consultas': int(consultas[i]),
+            'tasa_cancelacion': round(float(tasa_cancelacion[i]), 4),
+            'tasa_inasistencia': round(float(tasa_inasistencia[i]), 4),
+            'ocupacion': round(float(ocupacion[i]), 4),
+        } for i, (doctor_id, nombre, especialidad_id) in enumerate(inst.doctores)
+            if citas[i] or consultas[i]]
+        doctores.sort(key=lambda d: (-d['citas'], d['nombre']))
+
+        citas_especialidad = np.bincount(inst.especialidad_doctor, weights=citas, minlength=m + 1)
+        consultas_especialidad = np.bincount(inst.especialidad_doctor, weights=consultas,
+                                             minlength=m + 1)
+        especialidades = sorted(({
+            'id': especialidad_id, 'nombre': nombre,
+            'citas': int(citas_especialidad[i]), 'consultas': int(consultas_especialidad[i]),
+        } for i, (especialidad_id, nombre) in enumerate(inst.especialidades)),
+            key=lambda x: (-x['citas'], x['nombre']))
+
+        tendencia = [{
+            'mes': str(meses[i]), 'citas': int(por_mes[i].sum()), 'consultas': int(consultas_mes[i]),
+            'canceladas': int(por_mes[i, CANCELADA]),
+            'inasistencias': int(pasadas_mes[i, PROGRAMADA] + pasadas_mes[i, CONFIRMADA]),
+        } for i in range(len(meses))]
+
+        total_inasistencias = int(inasistencias.sum())
+        total_pasadas = int(pasadas.sum())
+        return {
+            'generada': inst.manifiesto['generada'],
+            'filas': inst.manifiesto['filas'],
+            'totales': {
+                'citas': int(b - a),
+                'consultas': int(hb - ha),
+                'canceladas': int(canceladas.sum()),
+                'inasistencias': total_inasistencias,
+                'tasa_cancelacion': round(int(canceladas.sum()) / (b - a), 4) if b > a else 0.0,
+                'tasa_inasistencia': round(total_inasistencias / total_pasadas, 4)
+                                     if total_pasadas else 0.0,
+            },
+            'doctores': doctores,
+            'especialidades': especialidades,
+            'meses': tendencia,
+        }
+
+
+if __name__ == '__main__':
+    from app import crear_app, mysql, ahora
+
+    app = crear_app()
+
+    with app.app_context():
+        inicio = time.perf_counter()
+        manifiesto = refrescar(app.config['REPORTES_DIR'], mysql.connection,
+                               ahora(app.config['CLINICA_ZONA_HORARIA']).date(),
+                               duracion_defecto=app.config['AGENDA_DURACION'],
+                               ventana_cambios=app.config['REPORTES_VENTANA_CAMBIOS'],
+                               reconstruir_dias=app.config['REPORTES_RECONSTRUIR_DIAS'],
+                               completo='--completo' in sys.argv)
+        print(f"📊 Instantánea v{manifiesto['version']}: {manifiesto['filas']['citas']} citas, "
+              f"{manifiesto['filas']['historias']} historias, "
+              f"{manifiesto['citas_cambiadas']} citas releídas en {time.perf_counter() - inicio:.1f}s")
@@ -0,0 +1,45 @@
+// Citas de hoy en vivo: escucha /api/citas/hoy/eventos y actualiza solo las filas que cambian.
+// Uso: <tbody data-eventos="..." data-version="marca" data-plantilla="id-de-template">
+// con filas data-cita-id / data-hora y elementos data-campo dentro del <template>.
+document.querySelectorAll('[data-eventos]').forEach((lista) => {
+    const plantilla = document.getElementById(lista.dataset.plantilla);
+    const url = `${lista.dataset.eventos}?desde=${encodeURIComponent(lista.dataset.version)}`;
+    const fuente = new EventSource(url);
+
+    const valor = (cita, campo) => {
+        if (campo === 'hora') return String(cita.fecha_hora).slice(11, 16);
+        if (campo === 'motivo') return cita.motivo || 'Consulta general';
+        return cita[campo] ?? '';
+    };
+
+    const dibujar = (cita) => {
+        const fila = plantilla.content.firstElementChild.cloneNode(true);
+        fila.dataset.citaId = cita.id;
+        fila.dataset.hora = cita.fecha_hora;
+        fila.querySelectorAll('[data-campo]').forEach((el) => {
+            el.textContent = valor(cita, el.dataset.campo);
+            if (el.dataset.campo === 'estado') el.classList.add(`status-${cita.estado}`);
+        });
+        return fila;
+    };
+
+    fuente.addEventListener('citas', (event) => {
+        const datos = JSON.parse(event.data);
+        // El worker no conoce los cambios desde nuestra marca: manda el día completo
+        if (datos.completa) lista.querySelectorAll('[data-cita-id]').forEach((el) => el.remove());
+        datos.eliminadas.forEach((id) => lista.querySelector(`[data-cita-id="${id}"]`)?.remove());
+        datos.citas.forEach((cita) => {
+            lista.querySelector(`[data-cita-id="${cita.id}"]`)?.remove();
+            const siguiente = [...lista.querySelectorAll('[data-cita-id]')]
+                .find((el) => el.dataset.hora > String(cita.fecha_hora));
+            lista.insertBefore(dibujar(cita), siguiente || null);
+        });
+        lista.querySelector('[data-vacia]')?.toggleAttribute('hidden', !!lista.querySelector('[data-cita-id]'));
+    });
+
+    // La pantalla quedó de otro día: recargar la página completa
+    fuente.addEventListener('recargar', () => {
+        fuente.close();
+        window.location.reload();
+    });
+});
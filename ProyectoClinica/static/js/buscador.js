@@ -0,0 +1,38 @@
+// Autocompletado para el formulario de citas.
+// Uso: <input data-buscar="/api/pacientes/buscar" data-destino="paciente_id"> + <datalist>
+// data-filtro="especialidad_id" agrega a la búsqueda el valor de ese campo
+document.querySelectorAll('input[data-buscar]').forEach((campo) => {
+    const destino = document.getElementById(campo.dataset.destino);
+    const lista = document.createElement('datalist');
+    lista.id = campo.id + '-opciones';
+    campo.setAttribute('list', lista.id);
+    campo.after(lista);
+
+    let espera = null;
+    let opciones = {};
+
+    campo.addEventListener('input', () => {
+        // El id se fija solo si el texto coincide con una opción sugerida
+        destino.value = opciones[campo.value] || '';
+        clearTimeout(espera);
+        if (campo.value.trim().length < 2) return;
+
+        espera = setTimeout(async () => {
+            const parametros = new URLSearchParams({q: campo.value});
+            const filtro = campo.dataset.filtro && document.getElementById(campo.dataset.filtro);
+            if (filtro && filtro.value) parametros.set(campo.dataset.filtro, filtro.value);
+            const respuesta = await fetch(`${campo.dataset.buscar}?${parametros}`);
+            if (!respuesta.ok) return;
+            const datos = await respuesta.json();
+            opciones = {};
+            lista.innerHTML = '';
+            datos.resultados.forEach((r) => {
+                const texto = r.especialidad ? `${r.nombre} (${r.especialidad})` : r.nombre;
+                opciones[texto] = r.id;
+                const opcion = document.createElement('option');
+                opcion.value = texto;
+                lista.appendChild(opcion);
+            });
+        }, 200);
+    });
+})
@@ -0,0 +1,14 @@
+// Paginación "cargar más": pide el fragmento siguiente y lo inserta en lugar del botón
+document.addEventListener('click', async (event) => {
+    const boton = event.target.closest('.btn-cargar-mas');
+    if (!boton) return;
+
+    boton.disabled = true;
+    const respuesta = await fetch(boton.dataset.url, { headers: { 'X-Requested-With': 'fetch' } });
+    if (!respuesta.ok) {
+        boton.disabled = false;
+        return;
+    }
+    boton.insertAdjacentHTML('beforebegin', await respuesta.text());
+    boton.remove();
+})
@@ -0,0 +1,73 @@
+"""
+Mide el arranque en frío de la app: importar app.py y crear la app,
+calentar() y la primera petición, cada uno en un intérprete nuevo y contra
+la base de datos simulada (database/simulada.py), sin MySQL.
+
+Uso: python verificar_arranque.py [repeticiones]
+Sale con código 1 si la mediana de algún paso excede su presupuesto.
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+# Segundos por paso (mediana de las repeticiones)
+PRESUPUESTOS = {
+    'crear_app': 1.5,
+    'calentar': 1.0,
+    'primera_peticion': 0.3,
+}
+
+REPETICIONES = 5
+
+# Se ejecuta en cada proceso hijo; imprime los tiempos en JSON
+MEDIR = """
+import json, time
+inicio = time.perf_counter()
+# Importa app.py y crea la app con crear_app({'TESTING': True})
+from verificar_presupuestos import app, base_simulada, cliente_con_sesion
+import app as modulo
+tiempos = {'crear_app': time.perf_counter() - inicio}
+
+bd = base_simulada()
+modulo.mysql.pool.conectar = bd.conectar
+
+inicio = time.perf_counter()
+modulo.calentar(app)
+tiempos['calentar'] = time.perf_counter() - inicio
+
+cliente = cliente_con_sesion('doctor')
+inicio = time.perf_counter()
+estado = cliente.get('/doctor/dashboard').status_code
+tiempos['primera_peticion'] = time.perf_counter() - inicio
+
+modulo.escritor_auditoria.detener()
+print(json.dumps({'tiempos': tiempos, 'estado': estado}))
+"""
+
+
+def medir():
+    salida = subprocess.run([sys.executable, '-c', MEDIR], capture_output=True, text=True, check=True)
+    resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+    if resultado['estado'] >= 500:
+        raise RuntimeError(f"la primera petición respondió {resultado['estado']}")
+    return resultado['tiempos']
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else REPETICIONES
+    muestras = [medir() for _ in range(repeticiones)]
+
+    fallos = 0
+    for paso, maximo in PRESUPUESTOS.items():
+        mediana = statistics.median(muestra[paso] for muestra in muestras)
+        if mediana > maximo:
+            fallos += 1
+            print(f"❌ {paso}: {mediana * 1000:.0f} ms (presupuesto {maximo * 1000:.0f} ms)")
+        else:
+            print(f"✅ {paso}: {mediana * 1000:.0f}/{maximo * 1000:.0f} ms")
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
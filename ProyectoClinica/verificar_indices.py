@@ -0,0 +1,62 @@
+"""
+Ejecuta EXPLAIN sobre las consultas de "hoy" de los dashboards y falla
+si alguna recorre completa la tabla citas, historias_clinicas o auditoria.
+
+Uso: python verificar_indices.py
+Conviene correrlo con datos de volumen realista: con tablas casi vacías
+MySQL puede preferir un full scan aunque el índice sea utilizable.
+"""
+import sys
+import time
+
+from app import crear_app, mysql, ventana_hoy, QUERY_CITAS_HOY, QUERY_CITAS_CAMBIADAS, QUERY_EXPORTAR_AUDITORIA
+from estadisticas import CONSULTAS_ORIGEN, CITAS, CONSULTAS
+
+TABLAS_VIGILADAS = {'c', 'citas', 'historias_clinicas', 'a', 'auditoria'}
+
+
+def consultas_a_verificar():
+    hoy = ventana_hoy()
+    return [
+        ('agenda del día (dashboards)', QUERY_CITAS_HOY, hoy),
+        ('agenda en vivo (cambios)', QUERY_CITAS_CAMBIADAS, (time.time() - 60,)),
+        ('estadisticas (citas)', CONSULTAS_ORIGEN[CITAS][0], hoy),
+        ('estadisticas (consultas)', CONSULTAS_ORIGEN[CONSULTAS][0], hoy),
+        ('exportar_auditoria', QUERY_EXPORTAR_AUDITORIA.format(filtros=''), hoy),
+        ('exportar_auditoria (usuario)',
+         QUERY_EXPORTAR_AUDITORIA.format(filtros=' AND a.usuario_id = %s'), (*hoy, 1)),
+        ('exportar_auditoria (módulo)',
+         QUERY_EXPORTAR_AUDITORIA.format(filtros=' AND a.modulo = %s'), (*hoy, 'citas')),
+    ]
+
+
+def full_scans(cursor, query, params):
+    """Devuelve las tablas vigiladas que EXPLAIN resuelve con type = ALL"""
+    cursor.execute("EXPLAIN " + query, params)
+    columnas = [col[0] for col in cursor.description]
+    encontrados = []
+    for fila in cursor.fetchall():
+        plan = dict(zip(columnas, fila))
+        if plan['table'] in TABLAS_VIGILADAS and plan['type'] == 'ALL':
+            encontrados.append(plan['table'])
+    return encontrados
+
+
+def main():
+    errores = 0
+    app = crear_app()
+    with app.app_context():
+        cursor = mysql.connection.cursor()
+        for nombre, query, params in consultas_a_verificar():
+            tablas = full_scans(cursor, query, params)
+            if tablas:
+                errores += 1
+                print(f"❌ {nombre}: full scan sobre {', '.join(tablas)}")
+            else:
+                print(f"✅ {nombre}: usa índice")
+        cursor.close()
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+Verifica que cada endpoint ejecute como máximo un número dado de
+sentencias SQL, para detectar regresiones N+1. Corre la app contra la
+base de datos simulada (database/simulada.py), sin MySQL.
+
+Uso: python verificar_presupuestos.py
+Sale con código 1 y muestra el SQL ejecutado si algún presupuesto se excede.
+"""
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as hora, timedelta
+
+from werkzeug.security import generate_password_hash
+
+import app as clinica
+from app import mysql, cache_vistas, ahora
+from database.simulada import BDSimulada
+
+app = clinica.crear_app({'TESTING': True})
+
+# Clave de todos los usuarios simulados
+CLAVE = 'clave123'
+
+HOY = ahora(app.config['CLINICA_ZONA_HORARIA']).date()
+MANANA = HOY + timedelta(days=1)
+
+MEDICAMENTO = {'nombre': 'Ibuprofeno', 'dosis': '400 mg', 'frecuencia': 'cada 8 horas',
+               'duracion': '5 días'}
+
+# (rol, método, url, máximo de sentencias[, opciones]) medido en frío: antes de
+# cada petición el proceso queda como recién arrancado (solo lo que carga
+# calentar()), sin páginas en caché ni índices de agenda. Opciones:
+# - datos / json: cuerpo del POST; la petición no debe terminar con un flash
+#   de error, así una validación fallida no pasa por "barata"
+# - config: valores de app.config solo para esa petición
+# Las páginas de cache_vistas cuentan la lectura de sus sellos, y las escrituras
+# que las invalidan, el incremento.
+PRESUPUESTOS = [
+    (None, 'POST', '/login', 1, {'datos': {'username': 'doctor1', 'password': CLAVE}}),
+    ('doctor', 'GET', '/doctor/dashboard', 1),
+    ('doctor', 'GET', '/doctor/historias-clinicas', 1),
+    ('doctor', 'GET', '/doctor/historias-clinicas/mas', 1),
+    ('doctor', 'GET', '/doctor/historias-clinicas/buscar?q=dolor', 3),
+    ('doctor', 'GET', '/doctor/historias-clinicas/exportar', 3),
+    ('doctor', 'GET', '/doctor/historia-clinica/crear/1', 1),
+    ('doctor', 'POST', '/doctor/historia-clinica/crear/1', 4,
+     {'datos': {'motivo': 'Dolor de cabeza', 'sintomas': 'Dolor y mareo', 'diagnostico': 'Migraña'}}),
+    ('doctor', 'GET', '/doctor/receta/crear/1', 0),
+    ('doctor', 'POST', '/doctor/receta/crear/1', 4,
+     {'datos': {'medicamento[]': MEDICAMENTO['nombre'], 'dosis[]': MEDICAMENTO['dosis'],
+                'frecuencia[]': MEDICAMENTO['frecuencia'], 'duracion[]': MEDICAMENTO['duracion']}}),
+    ('doctor', 'POST', '/doctor/recetas/lote', 6,
+     {'json': {'recetas': [{'paciente_id': 1, 'historia_id': 1, 'medicamentos': [MEDICAMENTO]},
+                           {'paciente_id': 2, 'medicamentos': [MEDICAMENTO, MEDICAMENTO]}]}}),
+    ('paciente', 'GET', '/paciente/dashboard', 2),
+    ('paciente', 'GET', '/paciente/mi-historia', 1),
+    ('paciente', 'GET', '/paciente/mis-recetas', 2),
+    ('paciente', 'GET', '/paciente/mi-historia/exportar', 3),
+    ('paciente', 'GET', '/paciente/mis-recetas/exportar?formato=ndjson', 3),
+    ('secretaria', 'GET', '/secretaria/dashboard', 0),
+    ('secretaria', 'GET', '/secretaria/cita/crear', 0),
+    ('secretaria', 'POST', '/secretaria/cita/crear', 6,
+     {'datos': {'paciente_id': '1', 'doctor_id': '1', 'duracion': '30', 'motivo': 'Control',
+                'fecha_hora': datetime.combine(MANANA, hora(10)).isoformat(timespec='minutes')}}),
+    ('secretaria', 'GET', '/api/pacientes/buscar?q=an', 1),
+    ('secretaria', 'GET', '/api/doctores/buscar?q=an%20do&especialidad_id=1', 1),
+    ('secretaria', 'GET', '/api/agenda/libres?doctor_id=1', 1),
+    ('secretaria', 'GET', '/api/agenda/libres?especialidad_id=1', 2),
+    ('admin', 'GET', '/admin/dashboard', 1),
+    ('admin', 'GET', f'/admin/estadisticas?desde={HOY - timedelta(days=7)}&hasta={HOY + timedelta(days=30)}', 1),
+    ('admin', 'GET', '/admin/auditoria/exportar', 3),
+    ('admin', 'GET', '/admin/reportes', 0),
+    ('admin', 'POST', '/admin/permisos/cache', 1),
+    # registrar_auditoria() en modo síncrono: el INSERT va en la petición
+    ('admin', 'GET', '/logout', 1, {'config': {'AUDITORIA_MODO': 'sincrono'}}),
+]
+
+# usuario_id, rol_id y entidad de cada rol en la sesión simulada
+SESIONES = {
+    'admin': {'usuario_id': 1, 'rol_id': 1},
+    'doctor': {'usuario_id': 2, 'rol_id': 2, 'doctor_id': 1},
+    'secretaria': {'usuario_id': 3, 'rol_id': 3},
+    'paciente': {'usuario_id': 4, 'rol_id': 4, 'paciente_id': 1},
+}
+
+MODULOS = ('citas', 'historias_clinicas', 'recetas', 'mi_historia_clinica', 'mis_recetas')
+
+# Columnas de las tablas según database/database.sql, para armar filas con forma real
+COLUMNAS_CITAS = ('id', 'paciente_id', 'doctor_id', 'fecha_hora', 'duracion_minutos', 'motivo',
+                  'estado', 'observaciones', 'creada_por', 'fecha_creacion', 'actualizado_en')
+COLUMNAS_HISTORIAS = ('id', 'paciente_id', 'doctor_id', 'fecha_consulta', 'motivo_consulta',
+                      'sintomas', 'diagnostico', 'observaciones', 'presion_arterial',
+                      'temperatura', 'peso', 'altura')
+COLUMNAS_RECETAS = ('id', 'historia_clinica_id', 'paciente_id', 'doctor_id', 'fecha_emision',
+                    'fecha_vencimiento', 'instrucciones_generales', 'activa')
+COLUMNAS_EXPORTAR_RECETAS = ('receta_id', 'fecha_emision', 'fecha_vencimiento',
+                             'instrucciones_generales', 'doctor_nombre', 'nombre_medicamento',
+                             'dosis', 'frecuencia', 'duracion', 'instrucciones_especiales')
+COLUMNAS_EXPORTAR_AUDITORIA = ('id', 'fecha_accion', 'usuario_id', 'username', 'accion',
+                               'modulo', 'registro_id', 'detalles', 'ip_address')
+
+FILAS = 3
+
+
+def base_simulada():
+    """BDSimulada con unas pocas filas de cada tabla, con la forma de las reales"""
+    reloj = ahora(app.config['CLINICA_ZONA_HORARIA'])
+    hoy, manana = reloj.date(), reloj.date() + timedelta(days=1)
+    hashes = {}
+
+    def identidad(query, args):
+        # Por username en el login y por id al revisar la sesión
+        clave = args[0]
+        for rol, sesion in SESIONES.items():
+            if clave in (sesion['usuario_id'], f'{rol}1'):
+                if CLAVE not in hashes:
+                    hashes[CLAVE] = generate_password_hash(CLAVE, app.config['CLAVES_METODO'])
+                return [(sesion['usuario_id'], f'{rol}1', hashes[CLAVE], sesion['rol_id'],
+                         rol.capitalize(), rol, sesion.get('doctor_id'), sesion.get('paciente_id'),
+                         time.time())]
+        return []
+
+    def estadisticas_hoy(query, args):
+        return [(hoy, clave, 0, ahora(app.config['CLINICA_ZONA_HORARIA']))
+                for clave in ('usuarios_activos', 'citas', 'consultas')]
+
+    def cita(i, dia):
+        return (i, i, 1, datetime.combine(dia, hora(9 + i)), 30, f'Motivo {i}', 'programada',
+                None, 3, reloj, reloj)
+
+    def historia(i):
+        return (i, 1, 1, reloj - timedelta(days=i), f'Dolor {i}', 'Dolor', 'Diagnóstico',
+                None, '120/80', 36.5, 70.0, 1.70)
+
+    def receta(i):
+        return (i, None, 1, 1, reloj - timedelta(days=i), manana, 'Tomar con agua', 1)
+
+    nombres = ('Paciente Uno', 'Doctor Uno', 'Medicina General')
+    return BDSimulada([
+        (r'FROM usuarios u\s+JOIN roles', identidad, ()),
+        (r'SELECT UNIX_TIMESTAMP\(NOW\(6\)\)$', lambda query, args: [(time.time(),)], ()),
+        # Buscadores del formulario de citas (indice_nombres.buscar)
+        (r'JOIN pacientes p ON p\.id = n\.registro_id', [(1, nombres[0])], ()),
+        (r'JOIN doctores d ON d\.id = n\.registro_id', [(1, nombres[1], nombres[2], 1)], ()),
+        # Catálogos que carga calentar()
+        (r'SELECT id, nombre FROM roles$', [(sesion['rol_id'], rol) for rol, sesion in SESIONES.items()], ()),
+        (r'SELECT id, nombre\s+FROM especialidades', [(1, nombres[2])], ()),
+        (r'FROM permisos', [(rol['rol_id'], modulo, 1, 1, 1, 1)
+                            for rol in SESIONES.values() for modulo in MODULOS], ()),
+        (r'FROM estadisticas_diarias', estadisticas_hoy, ()),
+        (r'SELECT termino, COUNT\(\*\)', [('dolor', 1)], ()),
+        (r'SELECT COUNT\(\*\)', [(FILAS,)], ()),
+        # Agenda del día (SELECT_CITAS): cambios desde la última revisión, el día completo
+        # y las próximas citas del paciente
+        (r'c\.actualizado_en >= FROM_UNIXTIME',
+         [cita(FILAS + 1, hoy) + nombres], COLUMNAS_CITAS + ('paciente_nombre', 'doctor_nombre', 'especialidad')),
+        (r'FROM citas c\s+JOIN pacientes', [cita(i, hoy) + nombres for i in range(1, FILAS + 1)],
+         COLUMNAS_CITAS + ('paciente_nombre', 'doctor_nombre', 'especialidad')),
+        (r'FROM citas c\s+JOIN doctores', [cita(i, manana) + nombres[1:] for i in range(1, FILAS + 1)],
+         COLUMNAS_CITAS + ('doctor_nombre', 'especialidad')),
+        (r'SELECT id, paciente_id FROM historias_clinicas', [(1, 1)], ()),
+        # Índice de la agenda: una cita mañana a las 9 por cada doctor pedido
+        (r'SELECT doctor_id, id, fecha_hora, COALESCE',
+         lambda query, args: [(doctor_id, doctor_id, datetime.combine(manana, hora(9)), 30)
+                              for doctor_id in args[1:-1]], ()),
+        (r'FROM doctores WHERE id = %s FOR UPDATE', lambda query, args: [(args[0],)], ()),
+        (r'FROM doctores d\s+JOIN usuarios u ON d.usuario_id = u.id\s+WHERE d.especialidad_id',
+         [(1,), (2,)], ()),
+        (r'hc\.\*, u\.nombre_completo as paciente_nombre',
+         [historia(i) + nombres[:1] for i in range(1, FILAS + 1)],
+         COLUMNAS_HISTORIAS + ('paciente_nombre',)),
+        (r'hc\.\*, u\.nombre_completo as doctor_nombre',
+         [historia(i) + nombres[1:] for i in range(1, FILAS + 1)],
+         COLUMNAS_HISTORIAS + ('doctor_nombre', 'especialidad')),
+        (r'SELECT r\.\*', [receta(i) + nombres[1:2] for i in range(1, FILAS + 1)],
+         COLUMNAS_RECETAS + ('doctor_nombre',)),
+        (r'FROM recetas r', [receta(i)[:1] + receta(i)[4:7] + (nombres[1],) + tuple(MEDICAMENTO.values())
+                             + (None,) for i in range(1, FILAS + 1)], COLUMNAS_EXPORTAR_RECETAS),
+        (r'FROM auditoria a', [(i, reloj, 1, 'admin1', 'login', 'sistema', None, None, '127.0.0.1')
+                               for i in range(1, FILAS + 1)], COLUMNAS_EXPORTAR_AUDITORIA),
+        (r'FROM pacientes p\s+JOIN usuarios u ON p.usuario_id = u.id\s+WHERE p.id',
+         [('Paciente Uno', None, 'O+', None)], ()),
+    ])
+
+
+def enfriar():
+    """Deja el proceso como recién arrancado: lo que carga calentar() y nada más"""
+    cache_vistas.vaciar()
+    clinica.agenda.invalidar()
+    clinica.calentar(app)
+
+
+@contextmanager
+def configuracion(valores):
+    """Cambia app.config mientras dura el bloque"""
+    anteriores = {clave: app.config[clave] for clave in valores}
+    app.config.update(valores)
+    try:
+        yield
+    finally:
+        app.config.update(anteriores)
+
+
+@contextmanager
+def contar_consultas():
+    """Acumula en una lista el SQL que ejecutan las conexiones de las peticiones"""
+    consultas = []
+    envolver_original = mysql.envolver
+
+    class Cursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def execute(self, query, args=None):
+            consultas.append(' '.join(query.split()))
+            return self._cursor.execute(query, args)
+
+        def executemany(self, query, args):
+            consultas.append(' '.join(query.split()) + ' [lote]')
+            return self._cursor.executemany(query, args)
+
+        def __getattr__(self, nombre):
+            return getattr(self._cursor, nombre)
+
+    class Conexion:
+        def __init__(self, conexion):
+            self._conexion = conexion
+
+        def cursor(self, *args, **kwargs):
+            return Cursor(self._conexion.cursor(*args, **kwargs))
+
+        def __getattr__(self, nombre):
+            return getattr(self._conexion, nombre)
+
+    def envolver(conexion):
+        if envolver_original:
+            conexion = envolver_original(conexion)
+        return Conexion(conexion)
+
+    mysql.envolver = envolver
+    try:
+        yield consultas
+    finally:
+        mysql.envolver = envolver_original
+
+
+def cliente_con_sesion(rol):
+    cliente = app.test_client()
+    if rol is None:
+        return cliente
+    with cliente.session_transaction() as sesion:
+        sesion.update(SESIONES[rol])
+        sesion['rol'] = rol
+        sesion['nombre_completo'] = rol.capitalize()
+        sesion['identidad_ts'] = time.time()
+    return cliente
+
+
+def errores_flash(cliente):
+    with cliente.session_transaction() as sesion:
+        return [mensaje for categoria, mensaje in sesion.get('_flashes', [])
+                if categoria in ('danger', 'warning')]
+
+
+def main():
+    bd = base_simulada()
+    app.config['TESTING'] = True
+    mysql.pool.conectar = bd.conectar
+
+    fallos = 0
+    for rol, metodo, url, maximo, *opciones in PRESUPUESTOS:
+        opciones = opciones[0] if opciones else {}
+        cliente = cliente_con_sesion(rol)
+        enfriar()
+        with configuracion(opciones.get('config', {})), contar_consultas() as consultas:
+            respuesta = cliente.open(url, method=metodo, data=opciones.get('datos'),
+                                     json=opciones.get('json'))
+            # Las exportaciones consultan mientras se consume la respuesta
+            respuesta.get_data()
+
+        errores = errores_flash(cliente) if metodo == 'POST' else []
+        if respuesta.status_code >= 400 or errores:
+            fallos += 1
+            print(f"❌ {metodo} {url}: respondió {respuesta.status_code} {' '.join(errores)}")
+        elif len(consultas) > maximo:
+            fallos += 1
+            print(f"❌ {metodo} {url}: {len(consultas)} consultas (presupuesto {maximo})")
+            for sql in consultas:
+                print(f"     {sql}")
+        else:
+            print(f"✅ {metodo} {url}: {len(consultas)}/{maximo} consultas")
+
+    clinica.escritor_auditoria.detener()
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
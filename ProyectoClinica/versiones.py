@@ -0,0 +1,31 @@
+"""
+Contadores de versión compartidos entre procesos (database/sincronizacion.sql)
+"""
+
+QUERY_LEER = "SELECT clave, valor FROM versiones WHERE clave IN ({marcadores})"
+
+QUERY_INCREMENTAR = """
+    INSERT INTO versiones (clave, valor) VALUES (%s, 1)
+    ON DUPLICATE KEY UPDATE valor = valor + 1
+"""
+
+
+def leer(conexion, claves):
+    """{clave: valor} de las claves pedidas; las que nunca cambiaron valen 0"""
+    claves = list(claves)
+    if not claves:
+        return {}
+    cursor = conexion.cursor()
+    cursor.execute(QUERY_LEER.format(marcadores=', '.join(['%s'] * len(claves))), claves)
+    valores = dict(cursor.fetchall())
+    cursor.close()
+    return {clave: valores.get(clave, 0) for clave in claves}
+
+
+def incrementar(conexion, *claves):
+    """Incrementa las claves y confirma; se llama después de confirmar la escritura"""
+    cursor = conexion.cursor()
+    # Siempre en el mismo orden, para que dos escrituras simultáneas no se bloqueen entre sí
+    cursor.executemany(QUERY_INCREMENTAR, [(clave,) for clave in sorted(set(claves))])
+    conexion.commit()
+    cursor.close()
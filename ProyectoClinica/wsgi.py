@@ -0,0 +1,41 @@
+"""
+Punto de entrada para producción.
+
+La configuración se toma de un archivo Python (CLINICA_CONFIG=/ruta/config.py)
+y de variables CLINICA_<CLAVE> con valores JSON, por ejemplo:
+
+    CLINICA_SECRET_KEY='"..."' CLINICA_MYSQL_HOST='"10.0.0.1"' \
+        gunicorn -c gunicorn.conf.py wsgi:app
+
+Antes de arrancar, `python recursos.py` genera los estáticos con huella.
+Cada worker importa este módulo, crea su app y la calienta antes de aceptar
+conexiones.
+"""
+import os
+
+from app import crear_app, calentar
+from configuracion import CLAVE_DESARROLLO
+
+
+def app_produccion(config=None):
+    """
+    Crea la app con crear_app(config), comprueba que no use la clave de
+    desarrollo y la calienta antes de que el worker acepte conexiones.
+    """
+    app = crear_app(config)
+    if app.config['SECRET_KEY'] == CLAVE_DESARROLLO and not (app.debug or app.testing):
+        raise RuntimeError('Define CLINICA_SECRET_KEY (o SECRET_KEY en CLINICA_CONFIG) para producción')
+    tiempos = calentar(app)
+    app.logger.info('App caliente en %.2fs: %s', sum(tiempos.values()), tiempos)
+    return app
+
+
+app = app_produccion()
+
+
+if __name__ == '__main__':
+    # Sin gunicorn (por ejemplo en Windows): un proceso con varios hilos
+    from waitress import serve
+
+    serve(app, host=os.environ.get('CLINICA_HOST', '0.0.0.0'),
+          port=int(os.environ.get('CLINICA_PORT', 8000)), threads=16)